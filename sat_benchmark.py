@@ -0,0 +1,452 @@
+# This program measures how the SAT solvers scale with the size of random k-SAT formulas.
+# It generates reproducible families of instances from one seed: uniform random k-SAT
+# over a sweep of variable counts and clause/variable ratios around the 3-SAT phase
+# transition (4.26), and optionally planted instances that are satisfiable by
+# construction. Every instance is solved by each solver script in its own subprocess,
+# sat_solver_h_MOM.py and sat_solver_without_heuristics.py by default, with a wall-time
+# timeout. The runtime, the numbers of conflicts and decisions (if the solver reports them
+# with --stats) and the peak resident memory of the process (polled from /proc) are recorded per run.
+# SAT answers are checked against the formula. Per solver, family, size and ratio the
+# program prints the number of solved instances and the median runtime, conflicts,
+# decisions and memory, i.e. the scaling curves, and can write them as JSON and CSV. A
+# summary saved with --save-baseline can be compared with a later run (--baseline), and
+# medians that got worse than the tolerance allows are reported as regressions. Saved
+# baselines only keep the solved counts, conflicts and decisions, which depend on the
+# seed alone, so they can be shared between machines; --with-timings also keeps the
+# runtime and memory for a baseline that is only compared on the machine that made it.
+# Usage: python3 sat_benchmark.py --sizes 50 75 100 --ratios 3.8 4.26 4.6 --instances 5
+
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sat_solver_h_MOM import generate_random_ksat
+from sat_test_script import model_status, parse_solver_output
+
+
+# Default configurations
+default_solvers = ['sat_solver_h_MOM.py', 'sat_solver_without_heuristics.py']
+default_sizes = [50, 75, 100]
+default_ratios = [3.8, 4.0, 4.26, 4.5, 4.8]
+default_timeout = 30.0  # Seconds per run; timeouts count as 2 * timeout for PAR-2
+STATS_SOLVERS = ('sat_solver_h_MOM.py',)  # Solvers that accept --stats and report counters
+COUNTERS = ('conflicts', 'decisions')  # Deterministic for a given instance and solver
+METRICS = ('time', *COUNTERS, 'memory_mb')
+MACHINE_METRICS = ('time', 'memory_mb', 'par2')  # Left out of saved baselines by default
+
+
+def instance_seed(seed, family, num_vars, ratio, number):
+    """Derives the seed of one instance, so every instance can be regenerated on its own
+    and adding sizes or ratios to a sweep does not change the other instances.
+
+    Parameters:
+      seed: Seed of the whole benchmark
+      family: 'uniform' or 'planted'
+      num_vars: Number of variables of the instance
+      ratio: Clause/variable ratio of the instance
+      number: Number of the instance within its size and ratio
+
+    Returns:
+      A 64-bit integer seed
+    """
+    name = f'{seed}-{family}-{num_vars}-{ratio}-{number}'.encode()
+    return int.from_bytes(hashlib.sha256(name).digest()[:8], 'little')
+
+
+def write_dimacs(path, num_vars, clauses, comment=None):
+    """Writes a formula in DIMACS cnf format.
+
+    Parameters:
+      path: Output file path
+      num_vars: Number of variables
+      clauses: Clauses as lists of DIMACS literals, or a 2-D NumPy array
+      comment: Optional comment line
+
+    Returns:
+      None
+    """
+    with open(path, 'w') as cnf_file:
+        if comment:
+            cnf_file.write(f'c {comment}\n')
+        cnf_file.write(f'p cnf {num_vars} {len(clauses)}\n')
+        if hasattr(clauses, 'shape'):
+            import numpy as np
+            np.savetxt(cnf_file, np.column_stack([clauses, np.zeros(len(clauses), dtype=clauses.dtype)]),
+                       fmt='%d')
+        else:
+            cnf_file.writelines(' '.join(map(str, clause)) + ' 0\n' for clause in clauses)
+
+
+def generate_instances(directory, sizes, ratios, instances, seed, k=3, planted=False, backend='python'):
+    """Generates the benchmark families into a directory.
+
+    Parameters:
+      directory: Output directory, created if needed
+      sizes: Variable counts
+      ratios: Clause/variable ratios
+      instances: Number of instances per size, ratio and family
+      seed: Seed of the whole benchmark
+      k: Literals per clause
+      planted: If True, a planted (satisfiable) family is generated as well
+      backend: 'python' or 'numpy', the generator used (see generate_random_ksat)
+
+    Returns:
+      List of instance dictionaries with family, num_vars, ratio, file and expected result
+      (SAT for planted instances, None for uniform ones)
+    """
+    if backend == 'numpy':
+        import sat_numpy
+        generate = sat_numpy.generate_random_ksat
+    else:
+        generate = generate_random_ksat
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    families = ['uniform', 'planted'] if planted else ['uniform']
+    generated = []
+    for family in families:
+        for num_vars in sizes:
+            for ratio in ratios:
+                num_clauses = round(ratio * num_vars)
+                for number in range(instances):
+                    instance = instance_seed(seed, family, num_vars, ratio, number)
+                    path = directory / f'{family}-k{k}-n{num_vars}-r{ratio}-{number:03d}.cnf'
+                    clauses = generate(num_vars, num_clauses, k, instance, family == 'planted')
+                    write_dimacs(path, num_vars, clauses, f'{family} random {k}-SAT, seed {instance}')
+                    expected = 'SAT' if family == 'planted' else None
+                    generated.append({'family': family, 'num_vars': num_vars, 'ratio': ratio,
+                                      'file': str(path), 'expected': expected})
+    return generated
+
+
+def peak_memory_kb(pid):
+    """Returns the peak resident memory (VmHWM) of a running process in kilobytes, None
+    if it is not available (no /proc file system, or the process already exited)."""
+    try:
+        with open(f'/proc/{pid}/status') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def wait_for_solver(process, timeout):
+    """Waits for a solver process, kills it after the timeout and tracks its peak memory.
+    The peak is polled from /proc, because ru_maxrss of a child also counts the memory
+    of this process before the exec; ru_maxrss is only used where /proc is missing.
+
+    Parameters:
+      process: The subprocess.Popen of the solver
+      timeout: Wall-time limit in seconds
+
+    Returns:
+      Peak resident memory in MB, None if it could not be measured
+    """
+    deadline = time.perf_counter() + timeout
+    if not hasattr(os, 'wait4'):
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        return None
+    peak = None
+    interval = 0.001
+    while True:
+        pid, exit_status, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            break
+        if time.perf_counter() >= deadline:
+            process.kill()
+        current = peak_memory_kb(process.pid)
+        if current is not None:
+            peak = max(peak or 0, current)
+        time.sleep(interval)
+        interval = min(interval * 2, 0.01)
+    process.returncode = os.waitstatus_to_exitcode(exit_status)
+    return (peak if peak is not None else usage.ru_maxrss) / 1024  # Kilobytes on Linux
+
+
+def run_solver(solver, file_path, timeout):
+    """Solves one cnf file with a solver script in a subprocess.
+
+    Parameters:
+      solver: Sat solver script
+      file_path: Path to the cnf file
+      timeout: Wall-time limit in seconds, the process is killed after it
+
+    Returns:
+      (result, model, counters, time, peak memory in MB, status) where result is
+      'SAT', 'UNSAT' or None, counters maps the names of COUNTERS to the values the
+      solver reported (None if it did not) and status is 'solved', 'timeout' or 'error'
+    """
+    cmd_input = [sys.executable, solver, str(file_path)]
+    if Path(solver).name in STATS_SOLVERS:
+        cmd_input.append('--stats')
+    with tempfile.TemporaryFile('w+') as output:
+        start = time.perf_counter()
+        process = subprocess.Popen(cmd_input, stdout=output, stderr=subprocess.DEVNULL, text=True,
+                                   env=dict(os.environ, SAT_CACHE='off'))
+        memory_mb = wait_for_solver(process, timeout)
+        file_time = time.perf_counter() - start
+        output.seek(0)
+        stdout = output.read()
+    if file_time >= timeout:
+        return None, None, None, timeout, memory_mb, 'timeout'
+    try:
+        actual_result, model = parse_solver_output(stdout)
+    except ValueError:
+        actual_result, model = None, None
+    counters = dict.fromkeys(COUNTERS)
+    for line in stdout.splitlines():
+        name, _, number = line[2:].partition(':')
+        if line.startswith('c ') and name in counters:
+            counters[name] = int(number)
+    if actual_result == 'UNKNOWN':
+        return None, None, counters, timeout, memory_mb, 'timeout'
+    if process.returncode != 0 or actual_result not in ('SAT', 'UNSAT'):
+        return actual_result, model, counters, file_time, memory_mb, 'error'
+    return actual_result, model, counters, file_time, memory_mb, 'solved'
+
+
+def run_benchmark(solvers, generated, timeout, verify=True):
+    """Runs every solver on every instance, one run at a time so the runs do not compete
+    for cores and memory bandwidth.
+
+    Parameters:
+      solvers: Sat solver scripts
+      generated: Instances from generate_instances
+      timeout: Wall-time limit per run in seconds
+      verify: If True, SAT answers are checked against the formula
+
+    Returns:
+      List of run records (the instance fields plus solver, result, status, time,
+      conflicts, decisions and memory_mb)
+    """
+    records = []
+    answers = {}
+    for instance in generated:
+        for solver in solvers:
+            result, model, counters, file_time, memory_mb, status = run_solver(solver, instance['file'],
+                                                                               timeout)
+            expected = instance['expected']
+            if status == 'solved' and expected is not None and result != expected:
+                status = 'wrong'
+            if verify:
+                status = model_status(instance['file'], model, status, result)
+            if status == 'solved':
+                answers.setdefault(instance['file'], set()).add(result)
+            records.append(dict(instance, solver=Path(solver).name, result=result, status=status,
+                                time=file_time, memory_mb=memory_mb, **counters))
+            print(f"c {Path(solver).name} {Path(instance['file']).name}: {status} {result or ''} "
+                  f"{file_time:.3f}s", file=sys.stderr, flush=True)
+    # Uniform instances have no expected result, but the solvers must agree on it
+    for record in records:
+        if record['status'] == 'solved' and len(answers[record['file']]) > 1:
+            record['status'] = 'wrong'
+    return records
+
+
+def median(values):
+    """Returns the median of the values that are not None, None if there are none."""
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def scaling_curves(records, timeout):
+    """Aggregates the runs per solver, family, size and ratio.
+
+    Parameters:
+      records: Run records from run_benchmark
+      timeout: Wall-time limit in seconds, used for PAR-2
+
+    Returns:
+      List of point dictionaries with solver, family, num_vars, ratio, cases, solved,
+      failures, the medians of time, conflicts, decisions and memory_mb over solved
+      runs, and PAR-2
+    """
+    groups = {}
+    for record in records:
+        key = (record['solver'], record['family'], record['num_vars'], record['ratio'])
+        groups.setdefault(key, []).append(record)
+    points = []
+    for (solver, family, num_vars, ratio), group in sorted(groups.items()):
+        solved = [record for record in group if record['status'] == 'solved']
+        point = {'solver': solver, 'family': family, 'num_vars': num_vars, 'ratio': ratio,
+                 'cases': len(group), 'solved': len(solved),
+                 'failures': sorted({record['status'] for record in group} - {'solved', 'timeout'})}
+        for metric in METRICS:
+            point[metric] = median(record[metric] for record in solved)
+        point['par2'] = sum(record['time'] if record['status'] == 'solved' else 2 * timeout
+                            for record in group) / len(group)
+        points.append(point)
+    return points
+
+
+def print_curves(points):
+    """Prints the scaling curves as a table.
+
+    Parameters:
+      points: Points from scaling_curves
+
+    Returns:
+      None
+    """
+    def number(value, digits):
+        return 'n/a' if value is None else f'{value:.{digits}f}'
+
+    print(f"{'solver':<34} {'family':<8} {'vars':>6} {'ratio':>6} {'solved':>7} "
+          f"{'time (s)':>10} {'conflicts':>10} {'decisions':>10} {'rss (MB)':>9} {'par2':>9}")
+    for point in points:
+        solved = f"{point['solved']}/{point['cases']}"
+        print(f"{point['solver']:<34} {point['family']:<8} {point['num_vars']:>6} {point['ratio']:>6} "
+              f"{solved:>7} {number(point['time'], 4):>10} {number(point['conflicts'], 0):>10} "
+              f"{number(point['decisions'], 0):>10} {number(point['memory_mb'], 1):>9} "
+              f"{number(point['par2'], 3):>9}")
+        if point['failures']:
+            print(f"  failed with: {', '.join(point['failures'])}")
+
+
+def compare_baseline(points, baseline, tolerance):
+    """Compares scaling curves with a stored baseline.
+
+    Parameters:
+      points: Points from scaling_curves
+      baseline: Points of an earlier run (the 'curves' of a saved baseline)
+      tolerance: Allowed relative increase, e.g. 0.25 for 25%
+
+    Returns:
+      List of regression messages, empty if there are none
+    """
+    def key(point):
+        return point['solver'], point['family'], point['num_vars'], point['ratio']
+
+    previous = {key(point): point for point in baseline}
+    regressions = []
+    for point in points:
+        old = previous.get(key(point))
+        if old is None:
+            continue
+        name = '{} {} n={} r={}'.format(*key(point))
+        if point['solved'] < old['solved']:
+            regressions.append(f"{name}: solved {point['solved']}/{point['cases']}, "
+                               f"baseline {old['solved']}/{old['cases']}")
+        if point['failures']:
+            regressions.append(f"{name}: failed with {', '.join(point['failures'])}")
+        # Runtime and memory are noisy below a few milliseconds, the counters are exact.
+        # Baselines without timings skip them, old.get() is None.
+        for metric, floor in (('time', 0.05), ('conflicts', 0), ('decisions', 0), ('memory_mb', 1.0)):
+            new_value, old_value = point[metric], old.get(metric)
+            if new_value is None or old_value is None:
+                continue
+            if new_value > old_value * (1 + tolerance) and new_value - old_value > floor:
+                regressions.append(f'{name}: median {metric} {new_value:.4g}, baseline {old_value:.4g}')
+    return regressions
+
+
+def write_csv(csv_path, points):
+    """Writes one row per point of the scaling curves to a CSV file.
+
+    Parameters:
+      csv_path: Output file path
+      points: Points from scaling_curves
+
+    Returns:
+      None
+    """
+    fieldnames = ['solver', 'family', 'num_vars', 'ratio', 'cases', 'solved', *METRICS, 'par2']
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(points)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Random k-SAT scaling benchmark')
+    parser.add_argument('--solvers', nargs='+', default=default_solvers,
+                        help='Sat solver scripts to compare')
+    parser.add_argument('--sizes', nargs='+', type=int, default=default_sizes, help='Variable counts')
+    parser.add_argument('--ratios', nargs='+', type=float, default=default_ratios,
+                        help='Clause/variable ratios')
+    parser.add_argument('--instances', type=int, default=5, help='Instances per size, ratio and family')
+    parser.add_argument('-k', type=int, default=3, help='Literals per clause')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated instances')
+    parser.add_argument('--planted', action='store_true', help='Also generate planted (SAT) instances')
+    parser.add_argument('--backend', choices=('python', 'numpy'), default='python',
+                        help='Generator backend, numpy is much faster for large formulas')
+    parser.add_argument('--out', default='benchmark_instances',
+                        help='Directory of the generated cnf files')
+    parser.add_argument('--generate-only', action='store_true', help='Only write the instances')
+    parser.add_argument('--timeout', type=float, default=default_timeout, help='Seconds per run')
+    parser.add_argument('--no-verify', dest='verify', action='store_false',
+                        help='Do not check the models of SAT answers')
+    parser.add_argument('--json', dest='json_path', help='Write the curves and all runs as JSON')
+    parser.add_argument('--csv', dest='csv_path', help='Write the curves as CSV')
+    parser.add_argument('--save-baseline', metavar='FILE', help='Store the curves as a baseline')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare the curves with a stored baseline')
+    parser.add_argument('--with-timings', action='store_true',
+                        help='Also store runtime and memory in the baseline (only comparable on '
+                             'this machine)')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative slowdown against the baseline')
+    args = parser.parse_args()
+    if args.backend == 'numpy':
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            parser.error('--backend numpy requires NumPy')
+
+    start = time.perf_counter()
+    generated = generate_instances(args.out, args.sizes, args.ratios, args.instances, args.seed,
+                                   args.k, args.planted, args.backend)
+    print(f'Generated {len(generated)} instances in {args.out} '
+          f'({time.perf_counter() - start:.2f} seconds)')
+    if args.generate_only:
+        sys.exit(0)
+
+    records = run_benchmark(args.solvers, generated, args.timeout, args.verify)
+    points = scaling_curves(records, args.timeout)
+    print_curves(points)
+
+    settings = {'sizes': args.sizes, 'ratios': args.ratios, 'instances': args.instances, 'k': args.k,
+                'seed': args.seed, 'planted': args.planted, 'backend': args.backend,
+                'timeout': args.timeout}
+    if args.json_path:
+        with open(args.json_path, 'w') as json_file:
+            json.dump({'settings': settings, 'curves': points, 'runs': records}, json_file, indent=2)
+    if args.csv_path:
+        write_csv(args.csv_path, points)
+    if args.save_baseline:
+        kept = points
+        if not args.with_timings:
+            kept = [{key: value for key, value in point.items() if key not in MACHINE_METRICS}
+                    for point in points]
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump({'settings': settings, 'curves': kept}, baseline_file, indent=2)
+        print(f'Baseline saved to {args.save_baseline}')
+
+    failed = any(point['failures'] for point in points)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['settings'] != settings:
+            print('Warning: the baseline was made with other settings, only matching points are compared')
+        regressions = compare_baseline(points, baseline['curves'], args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} regressions against {args.baseline}:')
+            for message in regressions:
+                print(f' {message}')
+            failed = True
+        else:
+            print(f'No regressions against {args.baseline}')
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,299 @@
+# Content-addressed result cache of the CDCL SAT solver in sat_solver_h_MOM.py.
+# A formula is identified by a canonical hash of its clause set: every clause is sorted
+# and duplicates are dropped before hashing, so the key does not depend on the order of
+# the clauses or of the literals in them. For each key the cache stores the verdict, the
+# model (SAT) or the DRAT proof if one was written (UNSAT), and the parsed clause arena
+# in a compact binary form. A second index maps the hash of the raw file bytes to the
+# canonical key, so a resubmitted or renamed file skips parsing as well as the search,
+# while a reordered copy of a formula is parsed once and then found by its canonical key.
+# A cached model is verified against the cached clauses before it is returned.
+# The cache directory is kept below a size limit by deleting the least recently used
+# entries. It is disabled with --no-cache or by setting SAT_CACHE=off.
+
+
+import hashlib
+import json
+import os
+import shutil
+from array import array
+
+from sat_solver_h_MOM import ClauseArena, verify_model
+
+
+ARENA_MAGIC = b'SATARENA1\n'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sat_solver_h_MOM')
+
+
+def canonical_key(arena, num_vars, num_clauses=None):
+    """Computes the canonical hash of a formula, independent of clause and literal order.
+
+    Parameters:
+      arena: The ClauseArena of the formula
+      num_vars: Number of variables of the formula
+      num_clauses: Only the first num_clauses clauses are hashed, None hashes all
+
+    Returns:
+      The key as a hex string
+    """
+    if num_clauses is None:
+        num_clauses = len(arena)
+    lits = arena.lits
+    # The parser already removed repeated literals, so a sorted clause is canonical.
+    # Clauses are compared as bytes, which is faster than tuples and just as canonical.
+    clauses = {array('i', sorted(lits[start:start + size])).tobytes()
+               for _, start, size in zip(range(num_clauses), arena.offsets, arena.sizes) if size}
+    digest = hashlib.sha256(f'p cnf {num_vars} empty={arena.empty}\n'.encode())
+    # Literal codes start at 2, so a 0 integer ends a clause
+    digest.update(bytes(4).join(sorted(clauses)))
+    return digest.hexdigest()
+
+
+def file_key(path, chunk_size=1 << 20):
+    """Returns the SHA-256 of the raw bytes of a file (compressed files are not unpacked)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as cnf_file:
+        for chunk in iter(lambda: cnf_file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of verdicts, models, proofs and parsed formulas. Every entry is a
+    group of files named after its key in one directory: key.result (JSON verdict),
+    key.model (the model as array('i') bytes), key.drat (proof) and key.arena (the
+    binary ClauseArena). key.alias files map a raw file hash to a canonical key.
+    Files are written to a temporary name and renamed, so concurrent solver
+    processes never read half-written entries. The cache never fails a solve: an
+    entry that cannot be read or parsed is a miss and is removed, and a write that
+    fails is skipped.
+
+    Attributes:
+      directory: The cache directory.
+      max_bytes: Size limit of the directory, least recently used entries are evicted.
+      hits: Number of lookups that returned a verdict.
+    """
+
+    def __init__(self, directory=None, max_mb=512):
+        """Raises OSError if the cache directory cannot be created."""
+        self.directory = directory or os.environ.get('SAT_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def enabled():
+        """Returns False if the cache is turned off with the SAT_CACHE environment variable."""
+        return os.environ.get('SAT_CACHE', '').lower() not in ('off', '0', 'no')
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def _write(self, key, suffix, data):
+        path = self._path(key, suffix)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(temporary, 'wb') as cache_file:
+                cache_file.write(data)
+            os.replace(temporary, path)
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+    def _read(self, key, suffix):
+        try:
+            with open(self._path(key, suffix), 'rb') as cache_file:
+                return cache_file.read()
+        except OSError:
+            return None
+
+    def _touch(self, key):
+        """Marks an entry as used now, for the LRU eviction."""
+        for suffix in ('.result', '.model', '.drat', '.arena'):
+            try:
+                os.utime(self._path(key, suffix))
+            except OSError:
+                pass
+
+    def resolve(self, content_key):
+        """Returns the canonical key stored for a raw file hash, None if unknown."""
+        data = self._read(content_key, '.alias')
+        try:
+            key = data.decode('ascii') if data else None
+        except UnicodeDecodeError:
+            return None
+        # Keys are SHA-256 hex digests, anything else is a damaged alias
+        if key is None or len(key) != 64 or key.strip('0123456789abcdef'):
+            return None
+        return key
+
+    def link(self, content_key, key):
+        """Records the canonical key of a raw file hash."""
+        self._write(content_key, '.alias', key.encode())
+
+    def store_formula(self, key, arena, num_vars):
+        """Stores a parsed formula in binary form (a JSON header line and the raw arrays).
+
+        Parameters:
+          key: The canonical key of the formula
+          arena: The ClauseArena as parsed, before any learned clause is added
+          num_vars: Number of variables of the formula
+
+        Returns:
+          None
+        """
+        if os.path.exists(self._path(key, '.arena')):
+            return
+        header = {'num_vars': num_vars, 'clauses': len(arena), 'lits': len(arena.lits),
+                  'empty': arena.empty, 'itemsize': [arena.offsets.itemsize, arena.lits.itemsize]}
+        self._write(key, '.arena', ARENA_MAGIC + json.dumps(header).encode() + b'\n'
+                    + arena.offsets.tobytes() + arena.sizes.tobytes() + arena.lits.tobytes())
+
+    def load_formula(self, key):
+        """Loads a stored formula.
+
+        Parameters:
+          key: The canonical key of the formula
+
+        Returns:
+          (ClauseArena, num_vars), or None if it is not stored, is damaged (the entry
+          is removed) or was written by a platform with other integer sizes
+        """
+        data = self._read(key, '.arena')
+        if data is None:
+            return None
+        try:
+            formula = self._decode_formula(data)
+        except (ValueError, KeyError, TypeError):
+            formula = None
+        if formula is None:
+            self.remove(key)
+        return formula
+
+    @staticmethod
+    def _decode_formula(data):
+        """Rebuilds (ClauseArena, num_vars) from the bytes of an arena file, None if the
+        bytes do not match their header. Raises ValueError, KeyError or TypeError on a
+        damaged header."""
+        if not data.startswith(ARENA_MAGIC):
+            return None
+        header_end = data.index(b'\n', len(ARENA_MAGIC))
+        header = json.loads(data[len(ARENA_MAGIC):header_end])
+        arena = ClauseArena()
+        if header['itemsize'] != [arena.offsets.itemsize, arena.lits.itemsize]:
+            return None
+        position = header_end + 1
+        for name, count in (('offsets', header['clauses']), ('sizes', header['clauses']),
+                            ('lits', header['lits'])):
+            values = getattr(arena, name)
+            size = count * values.itemsize
+            values.frombytes(data[position:position + size])
+            position += size
+            if len(values) != count:
+                return None  # Truncated file
+        if position != len(data):
+            return None
+        num_lits = len(arena.lits)
+        if any(size < 0 or start + size > num_lits for start, size in zip(arena.offsets, arena.sizes)):
+            return None  # Clauses outside the literal array
+        arena.empty = header['empty']
+        arena.wasted = num_lits - sum(arena.sizes)
+        return arena, header['num_vars']
+
+    def lookup(self, key, proof_path=None):
+        """Looks up the verdict of a formula. A SAT model is verified against the stored
+        formula first, an entry whose model fails is dropped.
+
+        Parameters:
+          key: The canonical key of the formula
+          proof_path: If given, an UNSAT verdict is only returned if a proof was
+          stored, and the proof is copied to this path
+
+        Returns:
+          (True, model) or (False, None), or None on a miss
+        """
+        data = self._read(key, '.result')
+        if data is None:
+            return None
+        try:
+            entry = json.loads(data)
+            if entry['result'] == 'UNSAT':
+                if proof_path is not None:
+                    if not entry['proof']:
+                        return None
+                    shutil.copyfile(self._path(key, '.drat'), proof_path)
+                self._touch(key)
+                self.hits += 1
+                return False, None
+            model = array('i')
+            model.frombytes(self._read(key, '.model') or b'')
+            formula = self.load_formula(key)
+            valid = formula is not None and len(model) == entry['num_vars'] \
+                and verify_model(formula[0], model) is None
+        except (OSError, ValueError, KeyError, TypeError):
+            valid = False  # A damaged entry is a miss
+        if not valid:
+            self.remove(key)
+            return None
+        self._touch(key)
+        self.hits += 1
+        return True, model.tolist()
+
+    def store_result(self, key, result, model=None, proof_path=None):
+        """Stores the verdict of a formula and evicts old entries if the cache is too big.
+
+        Parameters:
+          key: The canonical key of the formula
+          result: True (SAT) or False (UNSAT), UNKNOWN results are not stored
+          model: The model as DIMACS literals if SAT
+          proof_path: Path of the DRAT proof of an UNSAT verdict, None if there is none
+
+        Returns:
+          None
+        """
+        if result:
+            self._write(key, '.model', array('i', model).tobytes())
+        elif proof_path is not None:
+            try:
+                shutil.copyfile(proof_path, self._path(key, '.drat'))
+            except OSError:
+                return  # No entry without its proof
+        entry = {'result': 'SAT' if result else 'UNSAT', 'num_vars': len(model) if result else None,
+                 'proof': not result and proof_path is not None}
+        self._write(key, '.result', json.dumps(entry).encode())
+        self.evict()
+
+    def remove(self, key):
+        """Deletes every file of an entry."""
+        for suffix in ('.result', '.model', '.drat', '.arena'):
+            try:
+                os.remove(self._path(key, suffix))
+            except OSError:
+                pass
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache fits in max_bytes."""
+        entries = {}
+        total = 0
+        try:
+            with os.scandir(self.directory) as scan:
+                for item in scan:
+                    if not item.is_file() or item.name.endswith('.tmp'):
+                        continue
+                    info = item.stat()
+                    key = item.name.split('.', 1)[0]
+                    size, used = entries.get(key, (0, 0.0))
+                    entries[key] = (size + info.st_size, max(used, info.st_mtime))
+                    total += info.st_size
+        except OSError:
+            return
+        for key in sorted(entries, key=lambda key: entries[key][1]):
+            if total <= self.max_bytes:
+                break
+            self.remove(key)
+            try:
+                os.remove(self._path(key, '.alias'))
+            except OSError:
+                pass
+            total -= entries[key][0]
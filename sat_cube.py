@@ -0,0 +1,287 @@
+# Cube-and-conquer mode of the CDCL SAT solver in sat_solver_h_MOM.py.
+# A lookahead phase splits the formula into cubes, short lists of assumption literals
+# that together cover the whole search space, by repeatedly branching on the variable
+# chosen by the MOM scoring of decide_literal. A pool of worker processes then solves the
+# cubes with incremental solvers under assumptions. Idle workers take the next open cube
+# from a shared queue, and a cube that is not solved within a conflict limit is split
+# again and its sub-cubes go back to the queue. The formula is SAT as soon as one cube is
+# SAT and UNSAT once every cube is refuted. Progress is reported as cubes completed out of
+# total cubes. The budgets of sat_solver_h_MOM.py hold for the whole run: the conflicts
+# and propagations of all workers are added up and the peak RSS of every worker is
+# checked, each time a worker reports a cube. With backend='numpy' the lookahead
+# computes the MOM scores with the vectorized code of sat_numpy.py, which picks the same
+# variables.
+
+
+import multiprocessing
+import queue
+import sys
+import time
+from collections import deque
+
+from sat_solver_h_MOM import (Budget, MOMIndex, PropagationEngine, Solver, decide_literal, encode_lit,
+                              peak_rss_mb)
+
+
+class Lookahead:
+    """Splits cubes with MOM branching on a separate propagation engine. The engine only
+    propagates the cube literals, it never learns, so it keeps the original formula.
+
+    Attributes:
+      engine: The PropagationEngine with the original clauses.
+      index: The MOMIndex used to score the branching variables (python backend).
+      formula: The CSRFormula the MOM scores are computed on (numpy backend).
+    """
+
+    def __init__(self, arena, num_vars, backend='python'):
+        self.engine = PropagationEngine(num_vars, arena.copy())
+        self.index = None
+        self.formula = None
+        if backend == 'numpy':
+            import sat_numpy
+            self.formula = sat_numpy.CSRFormula(self.engine.arena)
+        else:
+            self.index = MOMIndex(self.engine)
+
+    def probe(self, cube):
+        """Propagates a cube and picks the variable to split it on.
+
+        Parameters:
+          cube: List of DIMACS literals
+
+        Returns:
+          ('unsat', None) if the cube propagates to a conflict, ('sat', model) if every
+          clause is satisfied by it, otherwise ('split', var)
+        """
+        engine = self.engine
+        if not engine.ok:
+            return 'unsat', None
+        if self.index is not None:
+            self.index.backtrack(engine, 0)
+        engine.backtrack(0)
+        for lit in cube:
+            code = encode_lit(lit)
+            if engine.value[code] == -1:
+                return 'unsat', None
+            if engine.value[code] == 1:
+                engine.new_decision_level()
+            else:
+                engine.decide(code)
+                if engine.propagate() is not None:
+                    return 'unsat', None
+        if self.formula is not None:
+            import sat_numpy
+            code = sat_numpy.decide_literal(self.formula, engine.value)
+        else:
+            code = decide_literal(engine, self.index)
+        if code is None:
+            model = [var if engine.model_value(var) == 1 else -var
+                     for var in range(1, engine.num_vars + 1)]
+            return 'sat', model
+        return 'split', code >> 1
+
+    def split(self, cube, target):
+        """Splits a cube breadth-first until there are at least target open cubes.
+
+        Parameters:
+          cube: List of DIMACS literals to split
+          target: Number of open cubes wanted
+
+        Returns:
+          (open cubes, number of cubes refuted by propagation, model or None). If a
+          model is returned the formula is SAT and the cube lists are meaningless.
+        """
+        frontier = deque([cube])
+        refuted = 0
+        while frontier and len(frontier) < target:
+            current = frontier.popleft()
+            status, value = self.probe(current)
+            if status == 'sat':
+                return [], refuted, value
+            if status == 'unsat':
+                refuted += 1
+                continue
+            frontier.append(current + [value])
+            frontier.append(current + [-value])
+        return list(frontier), refuted, None
+
+
+def cube_worker(arena, num_vars, conflict_limit, tasks, results, backend='python', memory_limit=None):
+    """Solves cubes from the task queue until it gets None. Every cube is solved with
+    one incremental Solver, so learned clauses carry over from cube to cube.
+
+    Parameters:
+      arena: The ClauseArena of the formula (a copy in this process)
+      num_vars: Number of variables of the formula
+      conflict_limit: Conflicts per cube before it is split again
+      tasks: Queue of cubes (lists of DIMACS literals)
+      results: Queue of ('unsat' | 'sat' | 'split' | 'formula_unsat' | 'memory' | 'error',
+      cube, data, usage), usage is (new conflicts, new propagations, peak RSS in MB)
+      of the worker since its last report
+      backend: Backend of the Lookahead that splits cubes again
+      memory_limit: Peak RSS in MB at which the worker stops solving a cube, None for no limit
+
+    Returns:
+      None
+    """
+    try:
+        lookahead = Lookahead(arena, num_vars, backend)
+        solver = Solver(num_vars, arena)
+    except Exception as error:
+        results.put(('error', None, repr(error), (0, 0, 0.0)))
+        return
+    reported = {'conflicts': 0, 'propagations': 0}
+
+    def usage():
+        """The counters of this worker since the last report."""
+        stats = solver.stats()
+        delta = tuple(stats.get(key, 0) - reported[key] for key in ('conflicts', 'propagations'))
+        for key in reported:
+            reported[key] = stats.get(key, 0)
+        return delta + (peak_rss_mb(),)
+
+    while True:
+        cube = tasks.get()
+        if cube is None:
+            return
+        try:
+            budget = Budget(memory_limit=memory_limit) if memory_limit is not None else None
+            result = solver.solve(assumptions=cube, conflict_limit=conflict_limit, budget=budget)
+            if result:
+                results.put(('sat', cube, solver.model(), usage()))
+            elif result is False:
+                results.put(('unsat' if solver.core() else 'formula_unsat', cube, None, usage()))
+            elif solver.stats().get('budget_exhausted') == 'memory':
+                results.put(('memory', cube, None, usage()))
+            else:
+                subcubes, refuted, model = lookahead.split(cube, 2)
+                if model is not None:
+                    results.put(('sat', cube, model, usage()))
+                else:
+                    results.put(('split', cube, (subcubes, refuted), usage()))
+        except Exception as error:
+            results.put(('error', cube, repr(error), (0, 0, 0.0)))
+
+
+def budget_exhausted(limits, stats, out_of_memory=False):
+    """Checks the summed counters of a cube-and-conquer run against its budgets.
+
+    Parameters:
+      limits: Keyword arguments of a Budget, see solve_cubes
+      stats: The stats of solve_cubes with the summed conflicts and propagations
+      out_of_memory: True if a worker stopped at the memory limit
+
+    Returns:
+      The name of the exhausted budget as in Budget.exhausted, None if none ran out
+    """
+    if out_of_memory:
+        return 'memory'
+    if limits.get('conflict_limit') is not None and stats['conflicts'] >= limits['conflict_limit']:
+        return 'conflicts'
+    if (limits.get('propagation_limit') is not None
+            and stats['propagations'] >= limits['propagation_limit']):
+        return 'propagations'
+    return None
+
+
+def solve_cubes(arena, num_vars, workers, initial_cubes=None, conflict_limit=5000, progress=True,
+                budget_limits=None, backend='python'):
+    """Solves a formula with cube-and-conquer.
+
+    Parameters:
+      arena: The ClauseArena of the formula
+      num_vars: Number of variables of the formula
+      workers: Number of worker processes
+      initial_cubes: Number of cubes of the first lookahead split, 8 per worker by default
+      conflict_limit: Conflicts a worker spends on a cube before splitting it again
+      progress: If True, "c cubes: done/total" lines are written to stderr
+      budget_limits: Keyword arguments of a Budget for the whole run (time_limit,
+      conflict_limit, propagation_limit, memory_limit), None for no limits. Conflicts
+      and propagations are summed over the workers, the memory limit holds per worker.
+      backend: 'python' or 'numpy', the backend of the lookahead (see Lookahead)
+
+    Returns:
+      (result, model, stats) with result True, False or None (UNKNOWN, out of budget,
+      stats['budget_exhausted'] names the budget), the model if SAT and a stats
+      dictionary with the cube counts and the summed conflicts and propagations
+    """
+    workers = max(1, workers)
+    limits = budget_limits or {}
+    time_limit = limits.get('time_limit')
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    if initial_cubes is None:
+        initial_cubes = 8 * workers
+    cubes, refuted, model = Lookahead(arena, num_vars, backend).split([], initial_cubes)
+    stats = {'cube_workers': workers, 'initial_cubes': len(cubes) + refuted,
+             'cubes_total': len(cubes) + refuted, 'cubes_done': refuted, 'cubes_resplit': 0,
+             'conflicts': 0, 'propagations': 0}
+    if model is not None:
+        return True, model, stats
+    if not cubes:
+        return False, None, stats
+
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    for cube in cubes:
+        tasks.put(cube)
+    processes = [multiprocessing.Process(target=cube_worker,
+                                         args=(arena, num_vars, conflict_limit, tasks, results, backend,
+                                               limits.get('memory_limit')),
+                                         daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    def report():
+        if progress:
+            print(f"c cubes: {stats['cubes_done']}/{stats['cubes_total']}", file=sys.stderr, flush=True)
+
+    open_cubes = len(cubes)
+    try:
+        while open_cubes:
+            if deadline is not None and time.perf_counter() >= deadline:
+                stats['budget_exhausted'] = 'time'
+                return None, None, stats
+            try:
+                kind, cube, data, (conflicts, propagations, peak_mb) = results.get(timeout=1.0)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError('All cube workers exited with open cubes')
+                continue
+            if kind == 'error':
+                raise RuntimeError(f'Cube worker failed: {data}')
+            stats['conflicts'] += conflicts
+            stats['propagations'] += propagations
+            stats['peak_rss_mb'] = max(stats.get('peak_rss_mb', 0.0), peak_mb)
+            if kind != 'sat':
+                exhausted = budget_exhausted(limits, stats, kind == 'memory')
+                if exhausted is not None:
+                    stats['budget_exhausted'] = exhausted
+                    return None, None, stats
+            if kind == 'sat':
+                stats['cubes_done'] += 1
+                report()
+                return True, data, stats
+            if kind == 'formula_unsat':
+                stats['cubes_done'] = stats['cubes_total']
+                report()
+                return False, None, stats
+            open_cubes -= 1
+            if kind == 'unsat':
+                stats['cubes_done'] += 1
+            else:
+                subcubes, refuted = data
+                stats['cubes_resplit'] += 1
+                stats['cubes_total'] += len(subcubes) + refuted - 1
+                stats['cubes_done'] += refuted
+                for subcube in subcubes:
+                    tasks.put(subcube)
+                open_cubes += len(subcubes)
+            report()
+        return False, None, stats
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
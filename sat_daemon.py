@@ -0,0 +1,633 @@
+# Long-running local service of the CDCL SAT solver in sat_solver_h_MOM.py, for workloads
+# of many small instances where starting a new interpreter per formula costs more than
+# solving it. The daemon listens on a Unix socket (--socket) or a localhost TCP port
+# (--port) and speaks newline-delimited JSON: a client sends requests such as
+#   {"op": "solve", "id": "a", "path": "uf50-01.cnf", "priority": 1, "time_limit": 10}
+#   {"op": "solve", "id": "b", "cnf": "p cnf 2 1\n1 -2 0\n"}
+#   {"op": "cancel", "id": "a"}
+#   {"op": "status"}
+# and gets events back on the same connection as they happen: "queued", "started" and
+# one final "result", "cancelled" or "error" event per job, so the results of many jobs
+# stream back in the order they finish. Jobs wait in an asyncio priority queue (higher
+# priority first, then first come first served) and are dispatched to a pool of warm
+# worker processes that are forked from a server which has the solver modules imported
+# already. Every job has its own budget (the Budget of sat_solver_h_MOM.py) and the
+# daemon kills a worker that overruns its time limit. A running job is cancelled by
+# replacing its worker, and the jobs of a client that disconnects are cancelled.
+# "path" jobs read files as the daemon user: with --path-root only files below that
+# directory are accepted, and a TCP listener refuses path jobs without --path-root.
+# Usage: python3 sat_daemon.py --socket /tmp/sat.sock --workers 4
+
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sat_solver_h_MOM import (HEURISTICS, PHASES, RESTART_POLICIES, Budget, Solver, parse_dimacs,
+                              parse_dimacs_file, peak_rss_mb)
+
+
+LINE_LIMIT = 1 << 30  # Longest request or event line (a CNF text or a model)
+BUDGET_KEYS = ('time_limit', 'conflict_limit', 'propagation_limit', 'memory_limit')
+SOLVER_KEYS = ('heuristic', 'restart', 'phase', 'seed', 'inprocess')
+FINAL_EVENTS = ('result', 'cancelled', 'error')
+
+
+def check_options(request):
+    """Validates the solver options and budgets of a solve request, so a bad value is
+    reported for its job instead of failing inside a worker or the dispatcher.
+
+    Parameters:
+      request: The solve request
+
+    Returns:
+      An error message, None if the options are valid
+    """
+    choices = {'heuristic': HEURISTICS, 'restart': RESTART_POLICIES, 'phase': PHASES}
+    for key, allowed in choices.items():
+        value = request.get(key)
+        if value is not None and (not isinstance(value, str) or value not in allowed):
+            return f"{key} must be one of {', '.join(allowed)}"
+    seed = request.get('seed')
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int)):
+        return 'seed must be an integer'
+    # bool is an int, but "inprocess": true is not a fraction
+    fraction = request.get('inprocess')
+    if fraction is not None and (isinstance(fraction, bool) or not isinstance(fraction, (int, float))
+                                 or not 0 < fraction < 1):
+        return 'inprocess must be a number between 0 and 1 (the share of the search time)'
+    for key in BUDGET_KEYS:
+        value = request.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            return f'{key} must be a non-negative number'
+    return None
+
+
+def solve_job(request):
+    """Solves the formula of one job request in the current process.
+
+    Parameters:
+      request: The solve request: 'cnf' (DIMACS text) or 'path', and optionally the
+      solver options of SOLVER_KEYS, the budgets of BUDGET_KEYS, 'preprocess' and
+      'model' (False leaves the model out of the result)
+
+    Returns:
+      (result, model, stats) with result True, False or None (UNKNOWN)
+    """
+    start = time.perf_counter()
+    if request.get('cnf') is not None:
+        arena, num_vars = parse_dimacs(request['cnf'], as_arena=True)
+    else:
+        arena, num_vars = parse_dimacs_file(request['path'])
+    time_parse = time.perf_counter() - start
+    preprocessor = None
+    if request.get('preprocess'):
+        from sat_preprocess import Preprocessor
+        preprocessor = Preprocessor.from_arena(arena, num_vars)
+        preprocessor.run()
+        arena = preprocessor.to_arena()
+    options = {key: request[key] for key in SOLVER_KEYS if request.get(key) is not None}
+    limits = {key: request[key] for key in BUDGET_KEYS if request.get(key) is not None}
+    solver = Solver(num_vars, arena, **options)
+    result = solver.solve(budget=Budget(**limits) if limits else None)
+    model, stats = solver.model(), solver.stats()
+    if preprocessor is not None:
+        stats.update(preprocessor.stats)
+        if result:
+            model = preprocessor.extend_model(model)
+    stats['time_parse'] = time_parse
+    stats['peak_rss_mb'] = peak_rss_mb()
+    return result, model if request.get('model', True) else None, stats
+
+
+def daemon_worker(connection):
+    """Solves the requests it receives on a pipe until it gets None or the pipe closes.
+
+    Parameters:
+      connection: The worker end of a multiprocessing Pipe, each request is answered
+      with ('result', result, model, stats) or ('error', message); the message never
+      contains the contents of the formula
+
+    Returns:
+      None
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The daemon shuts the workers down
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        try:
+            connection.send(('result',) + solve_job(request))
+        except (OSError, ValueError, EOFError):
+            # Parser messages quote the input, which may be a file the client cannot read
+            connection.send(('error', 'could not read or parse the formula'))
+        except Exception as error:
+            connection.send(('error', f'internal error ({type(error).__name__})'))
+
+
+class WorkerProcess:
+    """A warm solver process and the pipe to it. Requests are sent and answered from a
+    thread of the daemon's executor, so the event loop never blocks on a pipe.
+
+    Attributes:
+      process: The multiprocessing Process running daemon_worker.
+      connection: The daemon end of the pipe.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.process = None
+        self.connection = None
+        self.start()
+
+    def start(self):
+        """Starts a new worker process."""
+        self.connection, child = self.context.Pipe()
+        self.process = self.context.Process(target=daemon_worker, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        """Kills the worker process."""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def restart(self):
+        """Replaces the worker process, e.g. after a cancelled job."""
+        self.stop()
+        self.start()
+
+    def solve(self, request):
+        """Sends a request and waits for its answer; raises EOFError or OSError if the
+        process dies (or is killed) first."""
+        self.connection.send(request)
+        return self.connection.recv()
+
+
+class Job:
+    """One solve request of a client.
+
+    Attributes:
+      id: The job id, unique among the open jobs of its client.
+      request: The solve request as sent by the client.
+      priority: Higher priorities are dispatched first.
+      client: The Client that submitted the job, its events go there.
+      state: 'queued', 'running' or 'done'.
+      cancelled: True once the client cancelled the job.
+      worker: The WorkerProcess running the job, None while queued.
+      submitted: perf_counter time the job was queued.
+      started: perf_counter time the job was dispatched, None while queued.
+    """
+
+    def __init__(self, job_id, request, client):
+        self.id = job_id
+        self.request = request
+        self.priority = int(request.get('priority', 0))
+        self.client = client
+        self.state = 'queued'
+        self.cancelled = False
+        self.worker = None
+        self.submitted = time.perf_counter()
+        self.started = None
+
+
+class Client:
+    """A connection to the daemon.
+
+    Attributes:
+      writer: The asyncio StreamWriter of the connection.
+      jobs: The open jobs of the client by id.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.jobs = {}
+
+    def send(self, event):
+        """Writes one event line, events to a closed connection are dropped."""
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(event).encode() + b'\n')
+
+
+class SolverDaemon:
+    """The job queue and the worker pool of the daemon.
+
+    Attributes:
+      workers: The WorkerProcess objects of the pool.
+      queue: asyncio.PriorityQueue of (-priority, sequence, Job).
+      max_queue: Solve requests are rejected while this many jobs are queued.
+      default_time_limit: Time limit of jobs that do not set one, None for no limit.
+      grace: Seconds past its time limit after which a job's worker is killed.
+      recycle_mb: A worker whose peak RSS grew above this is replaced after its job,
+      so one big formula does not count against the memory limits of later jobs.
+      counters: Numbers of submitted, completed, cancelled, failed and rejected jobs.
+      queued: Number of jobs waiting in the queue (cancelled ones are not counted).
+      allow_paths: False if 'path' jobs are refused (only inline 'cnf' text).
+      path_root: If set, 'path' jobs must name a file below this directory.
+    """
+
+    def __init__(self, workers=1, max_queue=10000, default_time_limit=None, grace=5.0, recycle_mb=1024.0,
+                 allow_paths=True, path_root=None):
+        methods = multiprocessing.get_all_start_methods()
+        if 'forkserver' in methods:
+            # Workers are forked from a server that already imported the solver
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['sat_solver_h_MOM', 'sat_daemon'])
+        else:
+            context = multiprocessing.get_context()
+        self.workers = [WorkerProcess(context) for _ in range(max(1, workers))]
+        self.executor = ThreadPoolExecutor(max_workers=2 * len(self.workers))
+        self.queue = asyncio.PriorityQueue()
+        self.sequence = itertools.count()
+        self.max_queue = max_queue
+        self.default_time_limit = default_time_limit
+        self.grace = grace
+        self.recycle_mb = recycle_mb
+        self.allow_paths = allow_paths
+        self.path_root = None if path_root is None else os.path.realpath(path_root)
+        self.counters = {'submitted': 0, 'completed': 0, 'cancelled': 0, 'failed': 0, 'rejected': 0}
+        self.queued = 0
+        self.running = 0
+        self.tasks = []
+        self.started = time.perf_counter()
+
+    def start(self):
+        """Starts one dispatcher task per worker, must be called in the event loop."""
+        self.tasks = [asyncio.ensure_future(self._dispatch(worker)) for worker in self.workers]
+
+    async def close(self):
+        """Stops the dispatchers and the worker processes."""
+        for task in self.tasks:
+            task.cancel()
+        for worker in self.workers:
+            worker.stop()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def status(self):
+        """Returns the queue, worker and job counters as a dictionary."""
+        return dict(self.counters, queued=self.queued, running=self.running,
+                    workers=len(self.workers), uptime=time.perf_counter() - self.started)
+
+    def check_path(self, path):
+        """Applies the path policy of the daemon to the 'path' of a job.
+
+        Parameters:
+          path: The path sent by the client
+
+        Returns:
+          (resolved path, None) if the job may read it, otherwise (None, error message)
+        """
+        if not self.allow_paths:
+            return None, "'path' jobs are not accepted here, send the formula as 'cnf'"
+        if not isinstance(path, str):
+            return None, "'path' must be a string"
+        if self.path_root is None:
+            return path, None
+        # realpath resolves symlinks and '..', so the root cannot be left
+        resolved = os.path.realpath(os.path.join(self.path_root, path))
+        if os.path.commonpath([resolved, self.path_root]) != self.path_root:
+            return None, "'path' is outside the path root of the daemon"
+        return resolved, None
+
+    def submit(self, client, request):
+        """Queues a solve request of a client.
+
+        Parameters:
+          client: The Client that sent the request
+          request: The solve request
+
+        Returns:
+          None, the 'queued' or 'error' event is sent to the client
+        """
+        job_id = request.get('id')
+        if job_id is None:
+            job_id = f'job-{next(self.sequence)}'
+        if job_id in client.jobs:
+            client.send({'id': job_id, 'event': 'error', 'message': 'job id is already in use'})
+            return
+        if request.get('cnf') is None and request.get('path') is None:
+            client.send({'id': job_id, 'event': 'error', 'message': "a job needs 'cnf' or 'path'"})
+            return
+        message = check_options(request)
+        if message is not None:
+            client.send({'id': job_id, 'event': 'error', 'message': message})
+            return
+        if request.get('cnf') is None:
+            path, message = self.check_path(request['path'])
+            if message is not None:
+                client.send({'id': job_id, 'event': 'error', 'message': message})
+                return
+            request = dict(request, path=path)
+        if self.queued >= self.max_queue:
+            self.counters['rejected'] += 1
+            client.send({'id': job_id, 'event': 'error', 'message': 'queue is full'})
+            return
+        if request.get('time_limit') is None and self.default_time_limit is not None:
+            request = dict(request, time_limit=self.default_time_limit)
+        try:
+            job = Job(job_id, request, client)
+        except (TypeError, ValueError):
+            client.send({'id': job_id, 'event': 'error', 'message': 'priority must be an integer'})
+            return
+        client.jobs[job_id] = job
+        self.counters['submitted'] += 1
+        self.queued += 1
+        self.queue.put_nowait((-job.priority, next(self.sequence), job))
+        client.send({'id': job_id, 'event': 'queued', 'position': self.queued})
+
+    def cancel(self, job):
+        """Cancels a queued job (it is skipped) or a running one (its worker is killed)."""
+        if job.state == 'done' or job.cancelled:
+            return
+        job.cancelled = True
+        if job.state == 'running':
+            job.worker.process.kill()  # The dispatcher sees the dead pipe and replaces it
+        else:
+            self.queued -= 1
+            self.counters['cancelled'] += 1
+            self._finish(job, {'event': 'cancelled'})
+
+    def _finish(self, job, event):
+        """Sends the final event of a job and forgets it."""
+        job.state = 'done'
+        job.client.jobs.pop(job.id, None)
+        job.client.send(dict(event, id=job.id))
+
+    async def _dispatch(self, worker):
+        """Runs the queued jobs on one worker, one at a time."""
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job = await self.queue.get()
+            if job.state == 'done':
+                continue  # Cancelled while queued
+            self.queued -= 1
+            job.state = 'running'
+            job.worker = worker
+            job.started = time.perf_counter()
+            job.client.send({'id': job.id, 'event': 'started'})
+            if not worker.process.is_alive():
+                await loop.run_in_executor(self.executor, worker.restart)
+            self.running += 1
+            future = loop.run_in_executor(self.executor, worker.solve, job.request)
+            time_limit = job.request.get('time_limit')
+            timeout = None if time_limit is None else time_limit + self.grace
+            reply = None
+            timed_out = False
+            try:
+                reply = await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                worker.process.kill()
+                await asyncio.gather(future, return_exceptions=True)
+            except (EOFError, OSError):
+                pass  # Killed by cancel() or crashed
+            finally:
+                self.running -= 1
+            times = {'queue_time': job.started - job.submitted,
+                     'solve_time': time.perf_counter() - job.started}
+            if reply is None or job.cancelled:
+                # cancel() may have killed the worker after it had already replied
+                await loop.run_in_executor(self.executor, worker.restart)
+                if job.cancelled:
+                    self.counters['cancelled'] += 1
+                    self._finish(job, dict(times, event='cancelled'))
+                elif timed_out:
+                    self.counters['completed'] += 1
+                    self._finish(job, dict(times, event='result', result='UNKNOWN', model=None,
+                                           stats={'budget_exhausted': 'time'}))
+                else:
+                    self.counters['failed'] += 1
+                    self._finish(job, dict(times, event='error', message='worker process died'))
+                continue
+            if reply[0] == 'error':
+                self.counters['failed'] += 1
+                self._finish(job, dict(times, event='error', message=reply[1]))
+                continue
+            _, result, model, stats = reply
+            self.counters['completed'] += 1
+            word = 'SAT' if result else 'UNSAT' if result is False else 'UNKNOWN'
+            self._finish(job, dict(times, event='result', result=word, model=model, stats=stats))
+            if stats.get('peak_rss_mb', 0) > self.recycle_mb:
+                await loop.run_in_executor(self.executor, worker.restart)
+
+    async def handle_client(self, reader, writer):
+        """Serves one connection until the client closes it."""
+        client = Client(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    client.send({'event': 'error', 'message': 'request line too long'})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    op = request.get('op', 'solve')
+                except (ValueError, AttributeError):
+                    client.send({'event': 'error', 'message': 'requests are JSON objects, one per line'})
+                    continue
+                if op == 'solve':
+                    self.submit(client, request)
+                elif op == 'cancel':
+                    job = client.jobs.get(request.get('id'))
+                    if job is None:
+                        client.send({'id': request.get('id'), 'event': 'error',
+                                     'message': 'unknown job id'})
+                    else:
+                        self.cancel(job)
+                elif op == 'status':
+                    client.send(dict(self.status(), event='status'))
+                else:
+                    client.send({'event': 'error', 'message': f"unknown op '{op}'"})
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for job in list(client.jobs.values()):
+                self.cancel(job)
+            writer.close()
+
+
+async def serve(args):
+    """Runs the daemon until SIGINT or SIGTERM.
+
+    Parameters:
+      args: The parsed command line arguments
+
+    Returns:
+      None
+    """
+    # Anyone who can reach a TCP port could read the daemon user's files through path jobs
+    allow_paths = bool(args.socket) or args.path_root is not None
+    daemon = SolverDaemon(args.workers, args.max_queue, args.default_time_limit, args.grace,
+                          args.recycle_mb, allow_paths, args.path_root)
+    daemon.start()
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)  # Left over from a daemon that was killed
+        server = await asyncio.start_unix_server(daemon.handle_client, args.socket, limit=LINE_LIMIT)
+        address = args.socket
+    else:
+        server = await asyncio.start_server(daemon.handle_client, args.host, args.port, limit=LINE_LIMIT)
+        address = f'{args.host}:{args.port}'
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    print(f'c sat daemon listening on {address} with {len(daemon.workers)} workers', flush=True)
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        await daemon.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        print(f"c sat daemon stopped: {json.dumps(daemon.counters)}", flush=True)
+
+
+class DaemonClient:
+    """Asyncio client of the daemon. Every submitted job gets a future that is resolved
+    with its final event; the other events are passed to on_event if it is given.
+
+    Example:
+      client = await DaemonClient.connect(socket_path='/tmp/sat.sock')
+      event = await client.solve({'path': 'uf50-218/uf50-01.cnf', 'time_limit': 10})
+      print(event['result'], event['model'])
+      await client.close()
+
+    Attributes:
+      pending: Futures of the open jobs by id.
+      on_event: Callback for every event, None to ignore the intermediate events.
+    """
+
+    def __init__(self, reader, writer, on_event=None):
+        self.reader = reader
+        self.writer = writer
+        self.on_event = on_event
+        self.pending = {}
+        self.statuses = []
+        self.ids = itertools.count()
+        self.reader_task = asyncio.ensure_future(self._read_events())
+
+    @classmethod
+    async def connect(cls, socket_path=None, host='127.0.0.1', port=None, on_event=None):
+        """Opens a connection to a daemon on a Unix socket or a TCP port."""
+        if socket_path:
+            reader, writer = await asyncio.open_unix_connection(socket_path, limit=LINE_LIMIT)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+        return cls(reader, writer, on_event)
+
+    async def _read_events(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                event = json.loads(line)
+                if self.on_event is not None:
+                    self.on_event(event)
+                if event['event'] == 'status' and self.statuses:
+                    self.statuses.pop(0).set_result(event)
+                elif event['event'] in FINAL_EVENTS:
+                    future = self.pending.pop(event.get('id'), None)
+                    if future is not None and not future.done():
+                        future.set_result(event)
+        finally:
+            for future in list(self.pending.values()) + self.statuses:
+                if not future.done():
+                    future.set_exception(ConnectionError('connection to the daemon closed'))
+
+    async def _send(self, request):
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        await self.writer.drain()
+
+    async def submit(self, request):
+        """Submits a job without waiting for it.
+
+        Parameters:
+          request: The solve request (see the header of sat_daemon.py), an id is
+          added if it has none
+
+        Returns:
+          A future resolved with the final event of the job
+        """
+        request = dict(request, op='solve')
+        request.setdefault('id', f'c{next(self.ids)}')
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request['id']] = future
+        await self._send(request)
+        return future
+
+    async def solve(self, request):
+        """Submits a job and returns its final event."""
+        return await (await self.submit(request))
+
+    async def cancel(self, job_id):
+        """Asks the daemon to cancel a job, its future gets the 'cancelled' event."""
+        await self._send({'op': 'cancel', 'id': job_id})
+
+    async def status(self):
+        """Returns the status event of the daemon (queue length and job counters)."""
+        future = asyncio.get_running_loop().create_future()
+        self.statuses.append(future)
+        await self._send({'op': 'status'})
+        return await future
+
+    async def close(self):
+        """Closes the connection, the daemon cancels the open jobs."""
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await asyncio.gather(self.reader_task, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local SAT solver daemon')
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument('--socket', help='Listen on this Unix socket path')
+    address.add_argument('--port', type=int, help='Listen on this TCP port of --host')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='TCP address to listen on (default localhost)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of solver processes')
+    parser.add_argument('--max-queue', type=int, default=10000,
+                        help='Reject jobs while this many are queued')
+    parser.add_argument('--default-time-limit', type=float, default=None, metavar='SECONDS',
+                        help='Time limit of jobs that do not set one')
+    parser.add_argument('--grace', type=float, default=5.0, metavar='SECONDS',
+                        help='Kill a worker this long after the time limit of its job')
+    parser.add_argument('--recycle-mb', type=float, default=1024.0,
+                        help='Replace a worker whose peak RSS grew above this many MB')
+    parser.add_argument('--path-root', default=None, metavar='DIR',
+                        help="Only accept 'path' jobs for files below DIR (required for path jobs "
+                             "with --port)")
+    args = parser.parse_args()
+    if args.socket and not hasattr(asyncio, 'start_unix_server'):
+        parser.error('Unix sockets are not available on this platform, use --port')
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        sys.exit(130)
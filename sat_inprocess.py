@@ -0,0 +1,384 @@
+# Inprocessing of the CDCL SAT solver in sat_solver_h_MOM.py (--inprocess).
+# After a restart, when the search is back at decision level 0, the clause database
+# (original and learned clauses) is simplified with the binary implication graph (BIG):
+# every binary clause (a or b) gives the implications -a -> b and -b -> a.
+# Equivalent literals are the strongly connected components of the BIG, found with
+# Tarjan's algorithm. Every literal of a component is replaced by one representative in
+# all clauses, so the search no longer branches on the other variables; a component
+# with a literal and its negation makes the formula UNSAT. Failed-literal probing then
+# assigns single literals, the roots of the BIG first and then every variable in turn,
+# and propagates them: a literal that leads to a conflict is failed and its negation
+# is learned as a unit. Inprocessing only gets a fixed share of the search time.
+# Substituted variables take the value of their representative when the model is
+# extended, and every clause added or removed is logged to the DRAT proof.
+
+
+import time
+from collections import defaultdict
+
+from sat_solver_h_MOM import decode_lit, encode_lit, normalize_clause
+
+
+def implication_graph(engine):
+    """Builds the binary implication graph of the clauses that are not satisfied at
+    level 0. Must be called at decision level 0 after propagation.
+
+    Parameters:
+      engine: The PropagationEngine with the clauses
+
+    Returns:
+      Dictionary from a literal code to the list of literal codes it implies
+    """
+    value = engine.value
+    lits = engine.arena.lits
+    graph = defaultdict(list)
+    for start, size in zip(engine.arena.offsets, engine.arena.sizes):
+        if size != 2:
+            continue
+        first = lits[start]
+        second = lits[start + 1]
+        if value[first] or value[second]:
+            continue  # Satisfied, or its other literal is already implied
+        graph[first ^ 1].append(second)
+        graph[second ^ 1].append(first)
+    return graph
+
+
+def strongly_connected_components(graph):
+    """Finds the strongly connected components of a graph with Tarjan's algorithm. The
+    depth-first search keeps its own stack, so long implication chains do not hit
+    the recursion limit.
+
+    Parameters:
+      graph: Dictionary from a node to the list of its successors
+
+    Returns:
+      List of the components with more than one node, each a list of nodes
+    """
+    order = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in list(graph):
+        if root in order:
+            continue
+        order[root] = low[root] = len(order)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in order:
+                    order[successor] = low[successor] = len(order)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    break
+                if successor in on_stack and order[successor] < low[node]:
+                    low[node] = order[successor]
+            else:
+                work.pop()
+                if work and low[node] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[node]
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        components.append(component)
+    return components
+
+
+class Inprocessor:
+    """Equivalent-literal substitution and failed-literal probing between restarts.
+
+    Attributes:
+      fraction: Share of the search time inprocessing may use.
+      interval: Conflicts between two inprocessing rounds.
+      representative: Per substituted literal code, the literal code that replaces it.
+      substituted: (literal code, representative code) pairs of the positive literals of
+      the substituted variables, in the order they were substituted.
+      cursor: The last variable probed by the round robin over all variables.
+      started: perf_counter time of the first search.
+      spent: Seconds spent inprocessing so far.
+      next_round: Conflict count from which the next round may run.
+    """
+
+    def __init__(self, fraction=0.1, interval=1000):
+        self.fraction = fraction
+        self.interval = interval
+        self.representative = {}
+        self.substituted = []
+        self.cursor = 0
+        self.started = None
+        self.spent = 0.0
+        self.next_round = interval
+
+    def start(self):
+        """Starts the clock of the time share at the first search."""
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def should_run(self, stats):
+        """Returns True if a round is due and inprocessing is within its time share."""
+        if stats['conflicts'] < self.next_round:
+            return False
+        return self.spent < self.fraction * (time.perf_counter() - self.started)
+
+    def run(self, engine, heuristic, learned_store, stats, assumptions=()):
+        """Runs one round of substitution and probing. Must be called at decision level 0
+        after propagation.
+
+        Parameters:
+          engine: The PropagationEngine with the clauses
+          heuristic: The DecisionHeuristic, told about rewritten clauses
+          learned_store: The LearnedClauseStore, forgets deleted learned clauses
+          stats: The search statistics, the inproc_ counters are added to it
+          assumptions: Literal codes assumed by the current search, their variables
+          are never substituted
+
+        Returns:
+          False if the formula was found UNSAT, otherwise True
+        """
+        start = time.perf_counter()
+        deadline = start + self.fraction * (start - self.started) - self.spent
+        self.next_round = stats['conflicts'] + self.interval
+        for key in ('inproc_rounds', 'inproc_equivalent_vars', 'inproc_probes', 'inproc_failed_literals'):
+            stats.setdefault(key, 0)
+        stats['inproc_rounds'] += 1
+        graph = implication_graph(engine)
+        ok = True
+        mapping = self.equivalences(engine, graph, {code >> 1 for code in assumptions})
+        if mapping is None:
+            ok = False
+        elif mapping:
+            stats['inproc_equivalent_vars'] += len(mapping) // 2
+            ok = self.substitute(engine, heuristic, learned_store, mapping)
+            graph = implication_graph(engine)
+        if ok:
+            ok = self.probe(engine, heuristic, graph, deadline, stats)
+        elapsed = time.perf_counter() - start
+        self.spent += elapsed
+        stats['time_inprocess'] = stats.get('time_inprocess', 0.0) + elapsed
+        return ok
+
+    def equivalences(self, engine, graph, frozen=()):
+        """Picks a representative for every strongly connected component of the BIG. A
+        frozen variable is the representative of its component, and components with
+        two frozen variables are left alone.
+
+        Parameters:
+          engine: The PropagationEngine, its proof gets the lemmas of a contradiction
+          graph: The binary implication graph from implication_graph
+          frozen: Variables that must keep their literals, e.g. the assumptions
+
+        Returns:
+          Dictionary from each literal code to be substituted (both signs) to its
+          representative, or None if a literal is equivalent to its own negation
+          (the formula is UNSAT, engine.ok is cleared)
+        """
+        mapping = {}
+        handled = set()
+        for component in strongly_connected_components(graph):
+            members = set(component)
+            for code in component:
+                if code ^ 1 in members:
+                    # code implies its negation and back: both units are RUP, so is the empty clause
+                    if engine.proof is not None:
+                        engine.proof.add([code ^ 1])
+                    engine.ok = False
+                    return None
+            pinned = [code for code in component if code >> 1 in frozen]
+            if len(pinned) > 1:
+                continue
+            representative = pinned[0] if pinned else min(component)
+            # Every component has a mirror with the negated literals, whose representative
+            # is representative ^ 1 (xor 1 keeps the order of literals of other variables)
+            if representative ^ 1 in handled:
+                continue
+            handled.add(representative)
+            for code in component:
+                if code != representative:
+                    mapping[code] = representative
+                    mapping[code ^ 1] = representative ^ 1
+        return mapping
+
+    def substitute(self, engine, heuristic, learned_store, mapping):
+        """Replaces the literals of mapping by their representatives in every clause.
+        Rewritten clauses keep their index (they never get longer), clauses that become
+        tautologies are deleted. Every new clause is RUP through the implication chains,
+        so all of them are added to the proof before the old ones are deleted. The proof
+        keeps the tautologies, the binary clauses of the equivalences, so clauses added
+        later with representatives in place of substituted literals stay RUP as well.
+
+        Parameters:
+          engine: The PropagationEngine with the clauses
+          heuristic: The DecisionHeuristic, told about the rewritten clauses and the eliminated variables
+          learned_store: The LearnedClauseStore, forgets deleted learned clauses
+          mapping: Literal codes to their representatives, see equivalences
+
+        Returns:
+          False if the formula was found UNSAT, otherwise True
+        """
+        arena = engine.arena
+        lits = arena.lits
+        offsets = arena.offsets
+        sizes = arena.sizes
+        changed = []
+        tautologies = []
+        for index in range(len(arena)):
+            size = sizes[index]
+            if size < 2:
+                continue  # Deleted, or a unit whose literal is assigned at level 0
+            start = offsets[index]
+            old = lits[start:start + size]
+            if not any(code in mapping for code in old):
+                continue
+            new = normalize_clause([mapping.get(code, code) for code in old])
+            if new is None:
+                tautologies.append(index)
+            else:
+                changed.append((index, old, new))
+
+        proof = engine.proof
+        if proof is not None:
+            for _, _, new in changed:
+                proof.add(new)
+            for _, old, _ in changed:
+                proof.delete(old)
+
+        watch_a = engine.watch_a
+        watch_b = engine.watch_b
+        watches = engine.watches
+        rewritten = {index for index, _, _ in changed}
+        for code in {watch for index in rewritten for watch in (watch_a[index], watch_b[index])}:
+            watches[code] = [index for index in watches[code] if index not in rewritten]
+        value = engine.value
+        for index, old, new in changed:
+            start = offsets[index]
+            for position, code in enumerate(new):
+                lits[start + position] = code
+            sizes[index] = len(new)
+            arena.wasted += len(old) - len(new)
+            if len(new) == 1:
+                watch_a[index] = watch_b[index] = 0
+                asserted = new[0]
+            else:
+                # Watch literals that are not false, as PropagationEngine._attach does
+                order = sorted(new, key=lambda code: value[code] == -1)
+                watch_a[index] = order[0]
+                watch_b[index] = order[1]
+                watches[order[0]].append(index)
+                watches[order[1]].append(index)
+                asserted = order[0] if value[order[1]] == -1 else None
+            if asserted is not None:
+                if value[asserted] == -1:
+                    engine.ok = False
+                    return False
+                if value[asserted] == 0:
+                    engine.enqueue(asserted, index)
+
+        proof, engine.proof = engine.proof, None
+        engine.delete_clauses(tautologies)  # Not logged, see above
+        engine.proof = proof
+        for index in tautologies:
+            learned_store.lbd.pop(index, None)
+            learned_store.activity.pop(index, None)
+
+        for code, representative in mapping.items():
+            if not code & 1:
+                self.substituted.append((code, representative))
+        for code, representative in self.representative.items():
+            self.representative[code] = mapping.get(representative, representative)
+        self.representative.update(mapping)
+        heuristic.on_rewrite(engine, {code >> 1 for code in mapping})
+        if engine.propagate() is not None:
+            engine.ok = False
+            return False
+        return True
+
+    def _candidates(self, engine, graph):
+        """Yields the literals to probe: the roots of the BIG (literals that imply others
+        but are implied by none), then both literals of every variable round robin."""
+        implied = set()
+        for successors in graph.values():
+            implied.update(successors)
+        for code in list(graph):
+            if code not in implied:
+                yield code
+        num_vars = engine.num_vars
+        for _ in range(num_vars):
+            self.cursor = self.cursor % num_vars + 1
+            yield 2 * self.cursor
+            yield 2 * self.cursor + 1
+
+    def probe(self, engine, heuristic, graph, deadline, stats):
+        """Failed-literal probing until every candidate is probed or the deadline passes.
+        A literal implied by an earlier probe of the round is skipped: it cannot fail
+        when the probe that implied it did not. The saved phases are left unchanged.
+
+        Parameters:
+          engine: The PropagationEngine with the clauses
+          heuristic: The DecisionHeuristic, told about the backtracks
+          graph: The binary implication graph from implication_graph
+          deadline: perf_counter time at which probing stops
+          stats: The search statistics (inproc_probes, inproc_failed_literals)
+
+        Returns:
+          False if the formula was found UNSAT, otherwise True
+        """
+        value = engine.value
+        representative = self.representative
+        phases = engine.phase[:]
+        implied = set()
+        ok = True
+        for code in self._candidates(engine, graph):
+            if time.perf_counter() >= deadline:
+                break
+            if value[code] or code in implied or code in representative:
+                continue
+            stats['inproc_probes'] += 1
+            engine.decide(code)
+            conflict = engine.propagate()
+            if conflict is None:
+                implied.update(engine.trail[engine.trail_lim[0] + 1:])
+            heuristic.on_backtrack(engine, 0)
+            engine.backtrack(0)
+            if conflict is not None:
+                stats['inproc_failed_literals'] += 1
+                engine.learn([code ^ 1])  # RUP: propagating code gave the conflict
+                if engine.propagate() is not None:
+                    engine.ok = False
+                    ok = False
+                    break
+        engine.phase[:] = phases
+        return ok
+
+    def substitute_lits(self, lits):
+        """Maps DIMACS literals (new clauses or assumptions) to their representatives."""
+        representative = self.representative
+        return [decode_lit(representative.get(code, code)) for code in map(encode_lit, lits)]
+
+    def extend_model(self, model):
+        """Sets the substituted variables of a model from their representatives, the
+        latest substitution first.
+
+        Parameters:
+          model: The model as DIMACS literals, one per variable in order
+
+        Returns:
+          The extended model
+        """
+        model = list(model)
+        for code, representative in reversed(self.substituted):
+            var = code >> 1
+            rep_var = representative >> 1
+            rep_true = (model[rep_var - 1] > 0) != bool(representative & 1)
+            model[var - 1] = var if rep_true else -var
+        return model
@@ -0,0 +1,297 @@
+# This program load-tests the solver daemon of sat_daemon.py. It submits a stream of CNF
+# jobs, the cnf files of the given folders or random 3-SAT formulas generated from a
+# seed, and measures the throughput (jobs per second) and the latency of every job from
+# submission to its result, split into the time it waited in the daemon's queue and the
+# time it was solved. Jobs are sent by --concurrency clients that each keep one job in
+# flight (closed loop), or at a fixed --rate of jobs per second (open loop, Poisson
+# arrivals), which shows how the queue grows once the daemon is saturated. Every SAT
+# model is checked against its formula. With --compare-cold the same jobs are solved
+# by starting sat_solver_h_MOM.py once per job, the cost the daemon avoids. The daemon
+# is reached with --socket or --port, or --spawn WORKERS starts one on a temporary
+# socket for the duration of the test.
+# Usage: python3 sat_loadtest.py --spawn 4 --random 200 --concurrency 8
+
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from sat_daemon import DaemonClient
+from sat_solver_h_MOM import generate_random_3sat, parse_dimacs, parse_dimacs_file, verify_model
+from sat_test_script import collect_instances, percentile
+
+
+def load_jobs(folders, random_jobs, num_vars, ratio, seed):
+    """Builds the job list of the load test.
+
+    Parameters:
+      folders: Folders with cnf files (FOLDER or FOLDER=SAT/UNSAT, as for sat_test_script.py)
+      random_jobs: Number of random 3-SAT jobs to generate
+      num_vars: Number of variables of the random jobs
+      ratio: Clause/variable ratio of the random jobs
+      seed: Seed of the random jobs
+
+    Returns:
+      List of (name, request) pairs; file jobs are sent by path, random jobs as text
+    """
+    jobs = [(str(file_path), {'path': os.path.abspath(file_path)})
+            for _, file_path, _ in collect_instances(folders)]
+    for number in range(random_jobs):
+        text = generate_random_3sat(num_vars, round(ratio * num_vars), seed=seed * 1000003 + number)
+        jobs.append((f'random-{number}', {'cnf': text}))
+    return jobs
+
+
+def check_model(request, model):
+    """Returns True if a model satisfies the formula of a job request."""
+    if request.get('cnf') is not None:
+        arena, _ = parse_dimacs(request['cnf'], as_arena=True)
+    else:
+        arena, _ = parse_dimacs_file(request['path'])
+    return model is not None and verify_model(arena, model) is None
+
+
+async def run_load(client_args, jobs, options, concurrency, rate, seed):
+    """Sends the jobs to the daemon and collects their final events.
+
+    Parameters:
+      client_args: Keyword arguments of DaemonClient.connect
+      jobs: (name, request) pairs from load_jobs
+      options: Extra request fields of every job (budgets, priority, solver options)
+      concurrency: Number of closed-loop clients, each with one job in flight
+      rate: Jobs per second of the open-loop mode, None for the closed loop
+      seed: Seed of the open-loop arrival times
+
+    Returns:
+      (records, wall time) with one record per job: name, request, final event, latency
+    """
+    records = []
+
+    async def send(client, name, request):
+        submitted = time.perf_counter()
+        try:
+            event = await client.solve(dict(request, **options))
+        except ConnectionError as error:
+            event = {'event': 'error', 'message': str(error)}
+        records.append({'name': name, 'request': request, 'event': event,
+                        'latency': time.perf_counter() - submitted})
+
+    start = time.perf_counter()
+    if rate is None:
+        remaining = iter(jobs)
+
+        async def closed_loop():
+            client = await DaemonClient.connect(**client_args)
+            try:
+                for name, request in remaining:
+                    await send(client, name, request)
+            finally:
+                await client.close()
+
+        await asyncio.gather(*(closed_loop() for _ in range(max(1, concurrency))))
+    else:
+        rng = random.Random(seed)
+        client = await DaemonClient.connect(**client_args)
+        try:
+            tasks = []
+            for name, request in jobs:
+                tasks.append(asyncio.ensure_future(send(client, name, request)))
+                await asyncio.sleep(rng.expovariate(rate))
+            await asyncio.gather(*tasks)
+        finally:
+            await client.close()
+    return records, time.perf_counter() - start
+
+
+def run_cold(jobs, options, solver=None):
+    """Solves the jobs one by one with a new solver process each, as a baseline.
+
+    Parameters:
+      jobs: (name, request) pairs from load_jobs
+      options: Extra request fields, time_limit is passed on as --time-limit
+      solver: Sat solver script, sat_solver_h_MOM.py next to this script by default
+
+    Returns:
+      (latencies, wall time)
+    """
+    if solver is None:
+        solver = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sat_solver_h_MOM.py')
+    latencies = []
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        for number, (_, request) in enumerate(jobs):
+            path = request.get('path')
+            if path is None:
+                path = os.path.join(directory, f'{number}.cnf')
+                with open(path, 'w') as cnf_file:
+                    cnf_file.write(request['cnf'])
+            cmd_input = [sys.executable, solver, path]
+            if options.get('time_limit') is not None:
+                cmd_input += ['--time-limit', str(options['time_limit'])]
+            job_start = time.perf_counter()
+            subprocess.run(cmd_input, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           env=dict(os.environ, SAT_CACHE='off'))
+            latencies.append(time.perf_counter() - job_start)
+    return latencies, time.perf_counter() - start
+
+
+def summarize(records, wall_time, verify=True):
+    """Aggregates the job records of a load test.
+
+    Parameters:
+      records: Records from run_load
+      wall_time: Seconds from the first submission to the last result
+      verify: If True, SAT models are checked against their formulas
+
+    Returns:
+      Dictionary with job counts per outcome, throughput and latency percentiles
+    """
+    outcomes = {}
+    bad_models = []
+    for record in records:
+        event = record['event']
+        outcome = event.get('result', event['event'])
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if verify and outcome == 'SAT' and not check_model(record['request'], event.get('model')):
+            bad_models.append(record['name'])
+    latencies = [record['latency'] for record in records]
+    queue_times = [record['event']['queue_time'] for record in records if 'queue_time' in record['event']]
+    solve_times = [record['event']['solve_time'] for record in records if 'solve_time' in record['event']]
+    return {
+        'jobs': len(records),
+        'outcomes': outcomes,
+        'bad_models': sorted(bad_models),
+        'wall_time': wall_time,
+        'throughput': len(records) / wall_time if wall_time else None,
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p90': percentile(latencies, 0.9),
+        'latency_p99': percentile(latencies, 0.99),
+        'latency_max': max(latencies, default=None),
+        'queue_p50': percentile(queue_times, 0.5),
+        'solve_p50': percentile(solve_times, 0.5),
+    }
+
+
+def print_summary(summary, cold=None):
+    """Prints the load test results.
+
+    Parameters:
+      summary: Dictionary from summarize
+      cold: (latencies, wall time) from run_cold, None if not measured
+
+    Returns:
+      None
+    """
+    def seconds(value):
+        return 'n/a' if value is None else f'{value * 1000:.1f} ms'
+
+    outcomes = ', '.join(f'{count} {outcome}' for outcome, count in sorted(summary['outcomes'].items()))
+    print(f"{summary['jobs']} jobs in {summary['wall_time']:.3f} seconds ({outcomes})")
+    print(f"Throughput: {summary['throughput']:.1f} jobs/s")
+    print(f"Latency p50 {seconds(summary['latency_p50'])}, p90 {seconds(summary['latency_p90'])}, "
+          f"p99 {seconds(summary['latency_p99'])}, max {seconds(summary['latency_max'])}")
+    print(f"Median queue time {seconds(summary['queue_p50'])}, "
+          f"median solve time {seconds(summary['solve_p50'])}")
+    if summary['bad_models']:
+        print('Invalid models for the following jobs:')
+        for name in summary['bad_models']:
+            print(f' {name},')
+    if cold is not None:
+        latencies, wall_time = cold
+        print(f'Cold processes: {len(latencies) / wall_time:.1f} jobs/s, '
+              f'latency p50 {seconds(percentile(latencies, 0.5))} '
+              f'({wall_time / summary["wall_time"]:.1f}x the daemon wall time)')
+
+
+async def spawn_daemon(socket_path, workers):
+    """Starts sat_daemon.py on a socket and waits until it accepts connections."""
+    daemon_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sat_daemon.py')
+    process = subprocess.Popen([sys.executable, daemon_script, '--socket', socket_path,
+                                '--workers', str(workers)], stdout=subprocess.DEVNULL)
+    for _ in range(600):
+        if process.poll() is not None:
+            raise RuntimeError(f'sat_daemon.py exited with status {process.returncode}')
+        try:
+            client = await DaemonClient.connect(socket_path=socket_path)
+            await client.status()
+            await client.close()
+            return process
+        except OSError:
+            await asyncio.sleep(0.05)
+    process.terminate()
+    raise RuntimeError('sat_daemon.py did not start')
+
+
+async def main(args):
+    jobs = load_jobs(args.folders, args.random, args.vars, args.ratio, args.seed)
+    if not jobs:
+        print('No jobs, give cnf folders or --random N')
+        return 2
+    options = {key: getattr(args, key) for key in ('time_limit', 'conflict_limit', 'heuristic', 'restart')
+               if getattr(args, key) is not None}
+    options['model'] = args.verify
+    daemon = None
+    with tempfile.TemporaryDirectory() as directory:
+        if args.spawn:
+            args.socket = os.path.join(directory, 'sat.sock')
+            daemon = await spawn_daemon(args.socket, args.spawn)
+        if args.socket:
+            client_args = {'socket_path': args.socket}
+        else:
+            client_args = {'host': args.host, 'port': args.port}
+        try:
+            records, wall_time = await run_load(client_args, jobs, options, args.concurrency, args.rate,
+                                                args.seed)
+        finally:
+            if daemon is not None:
+                daemon.terminate()
+                daemon.wait()
+    summary = summarize(records, wall_time, args.verify)
+    cold = run_cold(jobs, options) if args.compare_cold else None
+    print_summary(summary, cold)
+    if args.json_path:
+        report = dict(summary, latencies=[record['latency'] for record in records])
+        if cold is not None:
+            report['cold'] = {'latencies': cold[0], 'wall_time': cold[1]}
+        with open(args.json_path, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+    failed = summary['bad_models'] or summary['outcomes'].get('error')
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Throughput and latency load test of sat_daemon.py')
+    parser.add_argument('folders', nargs='*', help='Folders with cnf files to submit')
+    address = parser.add_mutually_exclusive_group()
+    address.add_argument('--socket', help='Unix socket of the daemon')
+    address.add_argument('--port', type=int, help='TCP port of the daemon on --host')
+    address.add_argument('--spawn', type=int, metavar='WORKERS',
+                         help='Start a daemon with this many workers for the test')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP address of the daemon')
+    parser.add_argument('--random', type=int, default=0, metavar='N',
+                        help='Also submit N random 3-SAT jobs')
+    parser.add_argument('--vars', type=int, default=50, help='Variables of the random jobs')
+    parser.add_argument('--ratio', type=float, default=4.26,
+                        help='Clause/variable ratio of the random jobs')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random jobs and arrival times')
+    parser.add_argument('--concurrency', type=int, default=4, help='Closed-loop clients')
+    parser.add_argument('--rate', type=float, default=None, help='Open loop: jobs per second')
+    parser.add_argument('--time-limit', type=float, default=None, help='Time limit of every job')
+    parser.add_argument('--conflict-limit', type=int, default=None, help='Conflict limit of every job')
+    parser.add_argument('--heuristic', default=None, help='Decision heuristic of every job')
+    parser.add_argument('--restart', default=None, help='Restart policy of every job')
+    parser.add_argument('--no-verify', dest='verify', action='store_false',
+                        help='Do not request and check the models')
+    parser.add_argument('--compare-cold', action='store_true',
+                        help='Also solve the jobs with one new solver process each')
+    parser.add_argument('--json', dest='json_path', help='Write the results as JSON')
+    args = parser.parse_args()
+    if not (args.socket or args.port or args.spawn):
+        parser.error('give the daemon address with --socket or --port, or --spawn WORKERS')
+    sys.exit(asyncio.run(main(args)))
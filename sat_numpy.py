@@ -0,0 +1,218 @@
+# NumPy backend of the SAT solvers in sat_solver_h_MOM.py and sat_solver_without_heuristics.py.
+# The clauses of a ClauseArena are stored in CSR form: one int32 array with the literal
+# codes of all live clauses and an int64 array with the position where each clause starts.
+# Clause states (true and unassigned literals per clause), the MOM literal counts of the
+# clauses of minimum size, pure literals and model checks are then computed for the whole
+# formula at once with vectorized operations instead of Python loops over the clauses.
+# Random k-SAT formulas for the benchmark suite are generated in bulk as well.
+# The functions give the same results as the pure-Python code they replace, so a stage
+# can switch backends (--backend numpy) without changing the search.
+# NumPy is an optional dependency, only this module imports it.
+
+
+import numpy as np
+
+
+def _from_buffer(buffer, dtype):
+    """Returns a NumPy copy of an array('i')/array('q') without keeping its buffer
+    exported, so the array can still grow afterwards."""
+    if not len(buffer):
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(buffer, dtype=dtype).copy()
+
+
+class CSRFormula:
+    """The live clauses of a ClauseArena in compressed sparse row form.
+
+    Attributes:
+      lits: The literal codes of all clauses, int32.
+      indptr: Per clause, the position of its first literal in lits, with the total
+      number of literals appended, int64.
+      rows: Per literal position, the row (clause number in this formula) it belongs to.
+      clause_ids: Per row, the index of the clause in the arena.
+      num_codes: One more than the highest literal code, rounded up to a variable.
+    """
+
+    def __init__(self, arena, num_clauses=None):
+        if num_clauses is None:
+            num_clauses = len(arena)
+        offsets = _from_buffer(arena.offsets, np.int64)[:num_clauses]
+        sizes = _from_buffer(arena.sizes, np.int32)[:num_clauses].astype(np.int64)
+        self.clause_ids = np.flatnonzero(sizes)
+        sizes = sizes[self.clause_ids]
+        self.indptr = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self.indptr[1:])
+        total = int(self.indptr[-1])
+        # Position in the arena of every literal of the live clauses, in clause order
+        gather = np.repeat(offsets[self.clause_ids] - self.indptr[:-1], sizes) + np.arange(total)
+        self.lits = _from_buffer(arena.lits, np.int32)[gather]
+        self.rows = np.repeat(np.arange(len(sizes)), sizes)
+        self.num_codes = (int(self.lits.max()) | 1) + 1 if total else 2
+
+    def __len__(self):
+        return len(self.clause_ids)
+
+    def literal_values(self, value):
+        """Looks up the value of every literal of the formula.
+
+        Parameters:
+          value: Per literal code, 1 if true, -1 if false and 0 if unassigned
+          (PropagationEngine.value)
+
+        Returns:
+          int8 array with the value of each literal position
+        """
+        values = np.zeros(max(self.num_codes, len(value)), dtype=np.int8)
+        values[:len(value)] = value
+        return values[self.lits]
+
+    def clause_state(self, value):
+        """Counts the true and the unassigned literals of every clause.
+
+        Parameters:
+          value: Per literal code, 1 if true, -1 if false and 0 if unassigned
+
+        Returns:
+          (literal values, true literals per clause, unassigned literals per clause)
+        """
+        lit_values = self.literal_values(value)
+        starts = self.indptr[:-1]
+        if not len(starts):
+            empty = np.zeros(0, dtype=np.int64)
+            return lit_values, empty, empty
+        num_true = np.add.reduceat((lit_values == 1).astype(np.int64), starts)
+        num_free = np.add.reduceat((lit_values == 0).astype(np.int64), starts)
+        return lit_values, num_true, num_free
+
+
+def mom_counts(formula, value):
+    """Counts the unassigned literals in the unsatisfied clauses of minimum size, where the
+    size of a clause is its number of unassigned literals (the counters of MOMIndex).
+
+    Parameters:
+      formula: A CSRFormula
+      value: Per literal code, 1 if true, -1 if false and 0 if unassigned
+
+    Returns:
+      (min_size, the literal codes at the counted positions in clause order, occurrence
+      count per literal code), min_size is 0 if every clause is satisfied
+    """
+    lit_values, num_true, num_free = formula.clause_state(value)
+    open_sizes = num_free[(num_true == 0) & (num_free > 0)]
+    if not len(open_sizes):
+        return 0, None, None
+    min_size = int(open_sizes.min())
+    rows = formula.rows
+    in_min = (num_true[rows] == 0) & (num_free[rows] == min_size) & (lit_values == 0)
+    codes = formula.lits[in_min]
+    counts = np.bincount(codes, minlength=formula.num_codes)
+    return min_size, codes, counts
+
+
+def decide_literal(formula, value):
+    """The MOM decision of decide_literal in sat_solver_h_MOM.py (without rng), computed
+    from scratch for a formula that does not change, e.g. the original clauses of the
+    cube-and-conquer lookahead.
+
+    Parameters:
+      formula: A CSRFormula of the clauses the MOM counts are taken over
+      value: Per literal code, 1 if true, -1 if false and 0 if unassigned
+
+    Returns:
+      The positive literal code to branch on, None if every clause is satisfied
+    """
+    min_size, codes, counts = mom_counts(formula, value)
+    if not min_size:
+        return None
+    positive = counts[0::2]
+    negative = counts[1::2]
+    if min_size <= 30:
+        positive = positive.astype(np.int64)
+        negative = negative.astype(np.int64)
+    else:
+        # The scores could overflow int64, fall back to Python integers
+        positive = positive.astype(object)
+        negative = negative.astype(object)
+    scores = (positive + negative) * (2 ** min_size) + positive * negative
+    best = scores.max()
+    # Ties go to the variable that occurs first in the clauses of minimum size
+    candidates = scores == best
+    first = int(np.argmax(candidates[codes >> 1]))
+    return 2 * int(codes[first] >> 1)
+
+
+def pure_literals(clauses):
+    """find_pure_literals of sat_solver_without_heuristics.py on a list of clauses.
+
+    Parameters:
+      clauses: A list of lists of DIMACS literals
+
+    Returns:
+      The set of literals whose negation occurs in no clause
+    """
+    sizes = np.fromiter((len(clause) for clause in clauses), dtype=np.int64, count=len(clauses))
+    lits = np.fromiter((lit for clause in clauses for lit in clause), dtype=np.int64,
+                       count=int(sizes.sum()))
+    present = np.unique(lits)
+    return set(present[~np.isin(-present, present)].tolist())
+
+
+def verify_model(arena, model, num_clauses=None):
+    """verify_model of sat_solver_h_MOM.py: the first clause a model does not satisfy.
+
+    Parameters:
+      arena: The ClauseArena of the formula
+      model: The model as DIMACS literals
+      num_clauses: Only the first num_clauses clauses are checked, None checks all
+
+    Returns:
+      The arena index of the first clause the model does not satisfy, None if it
+      satisfies every clause
+    """
+    formula = CSRFormula(arena, num_clauses)
+    if not len(formula):
+        return None
+    model_lits = np.asarray(model, dtype=np.int64)
+    num_codes = max(formula.num_codes, 2 * int(np.abs(model_lits).max(initial=0)) + 2)
+    true_codes = np.zeros(num_codes, dtype=bool)
+    true_codes[2 * np.abs(model_lits) + (model_lits < 0)] = True
+    satisfied = np.logical_or.reduceat(true_codes[formula.lits], formula.indptr[:-1])
+    if satisfied.all():
+        return None
+    return int(formula.clause_ids[np.argmin(satisfied)])
+
+
+def generate_random_ksat(num_vars, num_clauses, k=3, seed=None, planted=False):
+    """Vectorized generate_random_ksat of sat_solver_h_MOM.py. Clauses are drawn in
+    batches, and rows with a repeated variable (or falsified by the hidden assignment
+    when planted) are drawn again. The formulas follow the same distribution, but a
+    seed gives other formulas than the pure-Python generator.
+
+    Parameters:
+      num_vars: Number of variables
+      num_clauses: Number of clauses
+      k: Number of literals per clause
+      seed: Seed of the generator, the same seed gives the same formula
+      planted: If True, only clauses satisfied by a hidden assignment are kept
+
+    Returns:
+      int64 array of shape (num_clauses, k) with the DIMACS literals of the clauses
+    """
+    if not 0 < k <= num_vars:
+        raise ValueError(f'k must be between 1 and the number of variables, got {k}')
+    rng = np.random.default_rng(seed)
+    hidden = rng.integers(0, 2, num_vars + 1).astype(bool) if planted else None
+    parts = []
+    missing = num_clauses
+    while missing > 0:
+        batch = missing + missing // 4 + 16
+        variables = rng.integers(1, num_vars + 1, size=(batch, k))
+        negative = rng.integers(0, 2, size=(batch, k)).astype(bool)
+        ordered = np.sort(variables, axis=1)
+        keep = (ordered[:, 1:] != ordered[:, :-1]).all(axis=1)
+        if hidden is not None:
+            keep &= (hidden[variables] != negative).any(axis=1)
+        clauses = np.where(negative, -variables, variables)[keep][:missing]
+        parts.append(clauses)
+        missing -= len(clauses)
+    return np.concatenate(parts) if parts else np.zeros((0, k), dtype=np.int64)
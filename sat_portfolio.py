@@ -0,0 +1,230 @@
+# Portfolio mode of the CDCL SAT solver in sat_solver_h_MOM.py.
+# N worker processes solve the same formula with different configurations (MOM or VSIDS
+# branching, restart policy, default phase and seed). The first worker to finish decides
+# the result and the others are terminated. While they run, the workers share their short
+# learned clauses (LBD <= 2) through a ring buffer in shared memory, so a clause learned by
+# one configuration can prune the search of the others.
+
+
+import multiprocessing
+import queue
+
+from sat_solver_h_MOM import Budget, Solver, decode_lit
+
+
+# Configurations of the first workers, later workers repeat them with other seeds
+PORTFOLIO_CONFIGS = [
+    {'heuristic': 'mom', 'restart': 'luby', 'phase': 'heuristic'},
+    {'heuristic': 'vsids', 'restart': 'luby', 'phase': 'heuristic'},
+    {'heuristic': 'vsids', 'restart': 'glucose', 'phase': 'false'},
+    {'heuristic': 'mom', 'restart': 'glucose', 'phase': 'true'},
+    {'heuristic': 'vsids', 'restart': 'luby', 'phase': 'random'},
+    {'heuristic': 'mom', 'restart': 'luby', 'phase': 'random'},
+    {'heuristic': 'vsids', 'restart': 'glucose', 'phase': 'true'},
+    {'heuristic': 'mom', 'restart': 'none', 'phase': 'heuristic'},
+]
+
+
+def portfolio_config(worker):
+    """Returns the solver configuration of a portfolio worker.
+
+    Parameters:
+      worker: Index of the worker, from 0
+
+    Returns:
+      Dictionary with heuristic, restart, phase and seed. Worker 0 runs the default
+      configuration without a seed, the others get their worker index as seed.
+    """
+    config = dict(PORTFOLIO_CONFIGS[worker % len(PORTFOLIO_CONFIGS)])
+    config['seed'] = worker or None
+    return config
+
+
+class ClauseRing:
+    """Ring buffer of clauses in shared memory, written and read by every worker.
+
+    Each clause is stored as a record [worker, size, lit1, ..., litN] of DIMACS
+    literals. head counts the integers ever written, so a reader remembers how far
+    it has read; a reader that fell more than a full buffer behind skips to the head
+    and loses the clauses in between. Reads and writes hold the lock.
+
+    Attributes:
+      data: The shared integer array holding the records.
+      head: Shared count of integers written so far.
+      lock: Lock guarding data and head.
+    """
+
+    def __init__(self, capacity=1 << 16):
+        self.capacity = capacity
+        self.data = multiprocessing.Array('i', capacity, lock=False)
+        self.head = multiprocessing.Value('q', 0, lock=False)
+        self.lock = multiprocessing.Lock()
+
+    def push(self, worker, lits):
+        """Appends a clause, overwriting the oldest records once the buffer is full.
+
+        Parameters:
+          worker: Index of the worker that learned the clause
+          lits: The clause as DIMACS literals
+
+        Returns:
+          None
+        """
+        record = [worker, len(lits)] + list(lits)
+        capacity = self.capacity
+        data = self.data
+        with self.lock:
+            head = self.head.value
+            for offset, value in enumerate(record):
+                data[(head + offset) % capacity] = value
+            self.head.value = head + len(record)
+
+    def read(self, position):
+        """Reads every record written after a position.
+
+        Parameters:
+          position: The head value of the previous read
+
+        Returns:
+          (records, new position) where records is a list of (worker, clause) pairs
+        """
+        capacity = self.capacity
+        data = self.data
+        with self.lock:
+            head = self.head.value
+            if head - position > capacity:
+                return [], head  # Overwritten before this reader got to it
+            values = [data[index % capacity] for index in range(position, head)]
+        records = []
+        index = 0
+        while index < len(values):
+            size = values[index + 1]
+            records.append((values[index], values[index + 2:index + 2 + size]))
+            index += 2 + size
+        return records, head
+
+
+class ClauseExchange:
+    """Connects the search of one worker to the ClauseRing. Learned clauses with an LBD
+    up to max_lbd (and at most max_size literals) are exported, and clauses of the
+    other workers are added as permanent clauses when the search restarts.
+
+    Attributes:
+      ring: The shared ClauseRing.
+      worker: Index of this worker.
+      position: How far this worker has read the ring.
+      exported: Number of clauses written to the ring.
+      imported: Number of clauses of other workers added to the solver.
+    """
+
+    def __init__(self, ring, worker, max_lbd=2, max_size=8):
+        self.ring = ring
+        self.worker = worker
+        self.max_lbd = max_lbd
+        self.max_size = max_size
+        self.position = 0
+        self.exported = 0
+        self.imported = 0
+
+    def export(self, engine, clause, lbd):
+        """Writes a learned clause (literal codes) to the ring if it is short enough."""
+        if lbd <= self.max_lbd and len(clause) <= self.max_size:
+            self.ring.push(self.worker, [decode_lit(code) for code in clause])
+            self.exported += 1
+
+    def import_clauses(self, engine):
+        """Adds the clauses other workers wrote since the last import. Must be called at
+        decision level 0.
+
+        Parameters:
+          engine: The PropagationEngine of this worker
+
+        Returns:
+          False if an added clause made the formula UNSAT, otherwise True
+        """
+        records, self.position = self.ring.read(self.position)
+        for worker, lits in records:
+            if worker == self.worker:
+                continue
+            self.imported += 1
+            if not engine.add_clause(lits):
+                return False
+        return True
+
+
+def portfolio_worker(worker, arena, num_vars, ring, results, budget_limits=None):
+    """Solves the formula with the configuration of one worker and reports the result.
+
+    Parameters:
+      worker: Index of the worker
+      arena: The ClauseArena of the formula (a copy in this process)
+      num_vars: Number of variables of the formula
+      ring: The shared ClauseRing
+      results: Queue the (worker, result, model, stats) tuple is put on
+      budget_limits: Keyword arguments of the Budget of this worker, None for no limits
+
+    Returns:
+      None
+    """
+    try:
+        config = portfolio_config(worker)
+        solver = Solver(num_vars, arena, **config)
+        solver.exchange = ClauseExchange(ring, worker)
+        budget = Budget(**budget_limits) if budget_limits else None
+        result = solver.solve(budget=budget)
+        stats = solver.stats()
+        stats['exported_clauses'] = solver.exchange.exported
+        stats['imported_clauses'] = solver.exchange.imported
+        stats['portfolio_worker'] = worker
+        stats['portfolio_config'] = ' '.join(f'{key}={value}' for key, value in config.items())
+        results.put((worker, result, solver.model(), stats))
+    except Exception as error:
+        results.put((worker, 'error', None, {'error': repr(error)}))
+
+
+def solve_portfolio(arena, num_vars, workers, budget_limits=None):
+    """Solves a formula with a portfolio of worker processes, the first one to finish wins.
+
+    Parameters:
+      arena: The ClauseArena of the formula
+      num_vars: Number of variables of the formula
+      workers: Number of worker processes
+      budget_limits: Keyword arguments of a Budget that every worker gets, None for no limits
+
+    Returns:
+      (result, model, stats) of the winning worker, see Solver.solve, model and stats.
+      The result is None (UNKNOWN) if every worker ran out of budget.
+    """
+    ring = ClauseRing()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=portfolio_worker,
+                                         args=(worker, arena, num_vars, ring, results, budget_limits),
+                                         daemon=True)
+                 for worker in range(max(1, workers))]
+    for process in processes:
+        process.start()
+    try:
+        errors = []
+        unknown = []
+        while len(errors) + len(unknown) < len(processes):
+            try:
+                worker, result, model, stats = results.get(timeout=1.0)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError('All portfolio workers exited without a result')
+                continue
+            if result == 'error':
+                errors.append(stats['error'])
+            elif result is None:
+                unknown.append(stats)  # Out of budget, another worker may still finish
+            else:
+                return result, model, stats
+        if unknown:
+            return None, None, unknown[0]
+        raise RuntimeError(f'All portfolio workers failed: {errors[0]}')
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
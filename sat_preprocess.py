@@ -0,0 +1,379 @@
+# CNF preprocessing for the CDCL SAT solver in sat_solver_h_MOM.py.
+# Before the search, the formula is simplified with unit propagation, pure literal
+# elimination, duplicate clause removal, subsumption and self-subsuming strengthening
+# (using occurrence lists and clause signatures) and SatELite-style bounded variable
+# elimination. Every step that changes the set of models is recorded on a reconstruction
+# stack, so a model of the simplified formula can be extended to a model of the original
+# formula and the ASSIGNMENT output stays correct for the original variables. With a
+# DratWriter the added and removed clauses are logged, so a DRAT proof of the search
+# on the simplified formula is also a proof for the original formula.
+
+
+from collections import defaultdict, deque
+
+from sat_solver_h_MOM import ClauseArena, encode_lit
+
+
+def clause_signature(clause):
+    """Computes the 64-bit signature of a clause, one bit per variable modulo 64. If a clause
+    C subsumes D then signature(C) & ~signature(D) is 0, so most candidates fail fast.
+
+    Parameters:
+      clause: A list of DIMACS literals
+
+    Returns:
+      The signature as an integer
+    """
+    signature = 0
+    for lit in clause:
+        signature |= 1 << (abs(lit) & 63)
+    return signature
+
+
+class Preprocessor:
+    """Simplifies a CNF formula before search and extends models back afterwards.
+    Variables keep their numbers, eliminated variables simply no longer occur.
+
+    Attributes:
+      num_vars: Number of variables of the original formula.
+      clauses: Per clause id, its sorted DIMACS literals or None if removed.
+      signatures: Per clause id, its signature (see clause_signature).
+      occurs: Per DIMACS literal, the set of ids of the clauses containing it.
+      keys: The literal sets of the clauses, to find duplicates.
+      value: Per fixed variable, its value (units and pure literals).
+      eliminated: The variables removed by variable elimination.
+      stack: The reconstruction stack, ('fix', lit) and ('elim', var, clauses) entries.
+      ok: False once the formula is known to be UNSAT.
+      stats: Counts of the simplifications done.
+      proof: A DratWriter the derived and removed clauses are logged to, or None.
+    """
+
+    def __init__(self, clauses, num_vars, resolvent_limit=20, occurrence_limit=400, proof=None):
+        self.num_vars = num_vars
+        self.proof = proof
+        self.resolvent_limit = resolvent_limit
+        self.occurrence_limit = occurrence_limit
+        self.clauses = []
+        self.signatures = []
+        self.occurs = defaultdict(set)
+        self.keys = {}
+        self.value = {}
+        self.eliminated = set()
+        self.stack = []
+        self.units = deque()
+        self.touched = []
+        self.ok = True
+        self.stats = {'pre_units': 0, 'pre_pure': 0, 'pre_duplicates': 0, 'pre_subsumed': 0,
+                      'pre_strengthened': 0, 'pre_eliminated_vars': 0, 'pre_clauses_in': 0,
+                      'pre_clauses_out': 0}
+        for clause in clauses:
+            self.stats['pre_clauses_in'] += 1
+            self.add(clause)
+
+    @classmethod
+    def from_arena(cls, arena, num_vars, **limits):
+        """Builds a Preprocessor from the clauses of a ClauseArena."""
+        clauses = (arena.literals(index) for index in range(len(arena)) if arena.sizes[index])
+        preprocessor = cls(clauses, num_vars, **limits)
+        if arena.empty:
+            preprocessor.ok = False
+        return preprocessor
+
+    def add(self, clause):
+        """Adds a clause. Tautologies and duplicates are dropped and unit clauses are queued
+        for propagation instead of being stored.
+
+        Parameters:
+          clause: An iterable of DIMACS literals
+
+        Returns:
+          None
+        """
+        lits = set(clause)
+        if any(-lit in lits for lit in lits):
+            self._log_delete(lits)
+            return
+        key = frozenset(lits)
+        if key in self.keys:
+            self.stats['pre_duplicates'] += 1
+            self._log_delete(lits)
+            return
+        if not lits:
+            self.ok = False
+            return
+        if len(lits) == 1:
+            self.units.append(next(iter(lits)))
+            return
+        cid = len(self.clauses)
+        self.clauses.append(sorted(lits, key=abs))
+        self.signatures.append(clause_signature(lits))
+        self.keys[key] = cid
+        for lit in lits:
+            self.occurs[lit].add(cid)
+        self.touched.append(cid)
+
+    def _log_add(self, lits):
+        if self.proof is not None:
+            self.proof.add([encode_lit(lit) for lit in lits])
+
+    def _log_delete(self, lits):
+        if self.proof is not None:
+            self.proof.delete([encode_lit(lit) for lit in lits])
+
+    def remove(self, cid):
+        """Removes a clause from the formula and the occurrence lists."""
+        clause = self.clauses[cid]
+        self._log_delete(clause)
+        for lit in clause:
+            self.occurs[lit].discard(cid)
+        del self.keys[frozenset(clause)]
+        self.clauses[cid] = None
+
+    def strengthen(self, cid, lit):
+        """Removes a false or redundant literal from a clause.
+
+        Parameters:
+          cid: The id of the clause
+          lit: The literal to remove
+
+        Returns:
+          None
+        """
+        clause = self.clauses[cid]
+        del self.keys[frozenset(clause)]
+        if self.proof is not None:
+            self._log_add([other for other in clause if other != lit])
+            self._log_delete(clause)
+        clause.remove(lit)
+        self.occurs[lit].discard(cid)
+        key = frozenset(clause)
+        if len(clause) == 1 or key in self.keys:
+            # Now a unit or a duplicate, the clause itself is not needed any more
+            for other in clause:
+                self.occurs[other].discard(cid)
+            self.clauses[cid] = None
+            if len(clause) == 1:
+                self.units.append(clause[0])
+            else:
+                self.stats['pre_duplicates'] += 1
+                self._log_delete(clause)
+            return
+        self.keys[key] = cid
+        self.signatures[cid] = clause_signature(clause)
+        self.touched.append(cid)
+
+    def assign(self, lit):
+        """Fixes a literal to true and simplifies the clauses it occurs in."""
+        var = abs(lit)
+        if var in self.value:
+            if self.value[var] != (lit > 0):
+                self.ok = False
+            return
+        self.value[var] = lit > 0
+        self.stack.append(('fix', lit))
+        for cid in list(self.occurs[lit]):
+            self.remove(cid)
+        for cid in list(self.occurs[-lit]):
+            self.strengthen(cid, -lit)
+            if not self.ok:
+                return
+
+    def propagate_units(self):
+        """Assigns the queued unit literals until there are none left."""
+        while self.units and self.ok:
+            self.stats['pre_units'] += 1
+            self.assign(self.units.popleft())
+
+    def eliminate_pure_literals(self):
+        """Fixes every literal whose negation does not occur in any clause.
+
+        Returns:
+          The number of pure literals found
+        """
+        found = 0
+        occurs = self.occurs
+        for var in range(1, self.num_vars + 1):
+            if var in self.value or var in self.eliminated:
+                continue
+            if occurs[var] and not occurs[-var]:
+                self._log_add([var])
+                self.assign(var)
+                found += 1
+            elif occurs[-var] and not occurs[var]:
+                self._log_add([-var])
+                self.assign(-var)
+                found += 1
+        self.stats['pre_pure'] += found
+        return found
+
+    def subsume(self):
+        """Removes clauses subsumed by a touched clause and strengthens clauses with a
+        touched clause by self-subsuming resolution: if C = A or l and D contains A
+        and -l, then -l is removed from D.
+
+        Returns:
+          True if any clause was removed or strengthened
+        """
+        changed = False
+        clauses = self.clauses
+        signatures = self.signatures
+        occurs = self.occurs
+        while self.touched and self.ok:
+            cid = self.touched.pop()
+            clause = clauses[cid]
+            if clause is None:
+                continue
+            signature = signatures[cid]
+            lits = set(clause)
+            # Subsumption, candidates must contain the rarest literal of the clause
+            best = min(clause, key=lambda lit: len(occurs[lit]))
+            for other in list(occurs[best]):
+                if other != cid and clauses[other] is not None \
+                        and signature & ~signatures[other] == 0 and lits.issubset(clauses[other]):
+                    self.remove(other)
+                    self.stats['pre_subsumed'] += 1
+                    changed = True
+            # Self-subsuming strengthening on every literal of the clause
+            for lit in clause:
+                rest = lits - {lit}
+                for other in list(occurs[-lit]):
+                    if clauses[other] is None or clauses[cid] is None:
+                        continue
+                    if signature & ~signatures[other] == 0 and rest.issubset(clauses[other]):
+                        self.strengthen(other, -lit)
+                        self.stats['pre_strengthened'] += 1
+                        changed = True
+            self.propagate_units()
+        return changed
+
+    def resolvents(self, var):
+        """Computes the non-tautological resolvents of the clauses of a variable.
+
+        Parameters:
+          var: The variable to resolve on
+
+        Returns:
+          The resolvents as sets of DIMACS literals, or None if eliminating the
+          variable would add more clauses than it removes or a resolvent is too long
+        """
+        positive = [self.clauses[cid] for cid in self.occurs[var]]
+        negative = [self.clauses[cid] for cid in self.occurs[-var]]
+        limit = len(positive) + len(negative)
+        resolvents = []
+        for pos_clause in positive:
+            for neg_clause in negative:
+                resolvent = set(pos_clause)
+                resolvent.discard(var)
+                tautology = False
+                for lit in neg_clause:
+                    if lit == -var:
+                        continue
+                    if -lit in resolvent:
+                        tautology = True
+                        break
+                    resolvent.add(lit)
+                if tautology:
+                    continue
+                if len(resolvent) > self.resolvent_limit or len(resolvents) == limit:
+                    return None
+                resolvents.append(resolvent)
+        return resolvents
+
+    def eliminate_variables(self):
+        """SatELite-style bounded variable elimination: a variable is replaced by all
+        resolvents of its clauses when that does not increase the number of clauses.
+        Cheap variables (few occurrences) are tried first.
+
+        Returns:
+          The number of eliminated variables
+        """
+        occurs = self.occurs
+        candidates = [var for var in range(1, self.num_vars + 1)
+                      if var not in self.value and var not in self.eliminated
+                      and occurs[var] and occurs[-var]
+                      and len(occurs[var]) * len(occurs[-var]) <= self.occurrence_limit]
+        candidates.sort(key=lambda var: len(occurs[var]) * len(occurs[-var]))
+        found = 0
+        for var in candidates:
+            if not self.ok:
+                break
+            if var in self.value or not occurs[var] or not occurs[-var]:
+                continue
+            resolvents = self.resolvents(var)
+            if resolvents is None:
+                continue
+            removed = [self.clauses[cid] for cid in occurs[var] | occurs[-var]]
+            for resolvent in resolvents:
+                self._log_add(resolvent)  # Before the clauses they are resolved from go
+            for cid in list(occurs[var] | occurs[-var]):
+                self.remove(cid)
+            self.stack.append(('elim', var, removed))
+            self.eliminated.add(var)
+            for resolvent in resolvents:
+                self.add(resolvent)
+            self.propagate_units()
+            found += 1
+        self.stats['pre_eliminated_vars'] += found
+        return found
+
+    def run(self, max_rounds=5):
+        """Runs the simplifications until nothing changes or max_rounds is reached.
+
+        Parameters:
+          max_rounds: The maximum number of rounds of the pipeline
+
+        Returns:
+          False if the formula was found UNSAT, otherwise True
+        """
+        self.propagate_units()
+        for _ in range(max_rounds):
+            if not self.ok:
+                break
+            changed = self.eliminate_pure_literals() > 0
+            self.propagate_units()
+            changed |= self.subsume()
+            if self.ok:
+                changed |= self.eliminate_variables() > 0
+            self.subsume()
+            if not changed:
+                break
+        self.stats['pre_clauses_out'] = sum(clause is not None for clause in self.clauses)
+        if not self.ok:
+            self._log_add([])
+        return self.ok
+
+    def to_arena(self):
+        """Returns the simplified formula as a ClauseArena, in original clause order."""
+        arena = ClauseArena()
+        if not self.ok:
+            arena.empty = True
+            return arena
+        for clause in self.clauses:
+            if clause is not None:
+                arena.add([encode_lit(lit) for lit in clause])
+        return arena
+
+    def extend_model(self, model):
+        """Extends a model of the simplified formula to the original formula by undoing the
+        reconstruction stack in reverse order: fixed literals are set, and an eliminated
+        variable is set true only if one of its removed positive clauses needs it.
+
+        Parameters:
+          model: DIMACS literals of the simplified formula's model (see Solver.model)
+
+        Returns:
+          The model as DIMACS literals, one per variable of the original formula
+        """
+        values = {abs(lit): lit > 0 for lit in model}
+        for entry in reversed(self.stack):
+            if entry[0] == 'fix':
+                values[abs(entry[1])] = entry[1] > 0
+                continue
+            _, var, removed = entry
+            values[var] = False
+            for clause in removed:
+                if var in clause and not any(values.get(abs(lit), False) == (lit > 0)
+                                             for lit in clause if lit != var):
+                    values[var] = True
+                    break
+        return [var if values.get(var, False) else -var for var in range(1, self.num_vars + 1)]
@@ -0,0 +1,318 @@
+# DRAT proofs for the CDCL SAT solver in sat_solver_h_MOM.py.
+# DratWriter streams the clauses the solver learns and deletes to a proof file, in the
+# text format ("1 -2 0", "d 1 -2 0") or the binary format of drat-trim, through an
+# in-memory buffer so the search loop only appends bytes. The DratChecker is a small
+# forward checker: it replays the proof against the CNF formula and checks every added
+# clause with reverse unit propagation (RUP), falling back to the resolution asymmetric
+# tautology (RAT) check on the first literal. A proof is verified when it derives the
+# empty clause.
+# Usage: python3 sat_proof.py formula.cnf proof.drat
+
+
+import sys
+
+from sat_solver_h_MOM import decode_lit, parse_dimacs_file
+
+
+class DratWriter:
+    """Buffered writer of DRAT proof lines. Clauses are given as literal codes
+    (2*var+sign, see encode_lit), which is also the literal encoding of binary DRAT.
+
+    Attributes:
+      binary: True for binary DRAT, False for text DRAT.
+      added: Number of clauses added to the proof.
+      deleted: Number of clauses deleted in the proof.
+    """
+
+    def __init__(self, path, binary=False, buffer_size=1 << 16):
+        self.file = open(path, 'wb')
+        self.binary = binary
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.added = 0
+        self.deleted = 0
+
+    def add(self, codes):
+        """Records a clause added to the formula (a learned or derived clause)."""
+        self.added += 1
+        self._write(b'a', b'', codes)
+
+    def delete(self, codes):
+        """Records a clause deleted from the formula."""
+        self.deleted += 1
+        self._write(b'd', b'd ', codes)
+
+    def _write(self, binary_tag, text_prefix, codes):
+        buffer = self.buffer
+        if self.binary:
+            buffer += binary_tag
+            for code in codes:
+                while code > 127:
+                    buffer.append(code & 127 | 128)
+                    code >>= 7
+                buffer.append(code)
+            buffer.append(0)
+        else:
+            buffer += text_prefix
+            buffer += ' '.join([str(decode_lit(code)) for code in codes] + ['0\n']).encode()
+        if len(buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered proof lines to the file."""
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        """Flushes and closes the proof file."""
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def read_drat(path):
+    """Reads a text or binary DRAT proof. The format is detected from the first bytes:
+    a text proof only contains digits, '-', 'd', 'c' and whitespace.
+
+    Parameters:
+      path: Path to the proof file
+
+    Returns:
+      List of (is_deletion, clause as DIMACS literals) steps
+    """
+    with open(path, 'rb') as proof_file:
+        data = proof_file.read()
+    text_bytes = set(b'0123456789-dc \t\r\n')
+    steps = []
+    if all(byte in text_bytes for byte in data[:256]):
+        for line in data.decode().splitlines():
+            tokens = line.split()
+            if not tokens or tokens[0] == 'c':
+                continue
+            deletion = tokens[0] == 'd'
+            lits = [int(token) for token in tokens[1 if deletion else 0:]]
+            if not lits or lits[-1] != 0:
+                raise ValueError(f"Proof line does not end with 0: '{line}'")
+            steps.append((deletion, lits[:-1]))
+        return steps
+    index = 0
+    while index < len(data):
+        tag = data[index]
+        if tag not in (0x61, 0x64):
+            raise ValueError(f'Unexpected byte {tag:#x} in binary proof at {index}')
+        index += 1
+        lits = []
+        while True:
+            code = 0
+            shift = 0
+            while True:
+                byte = data[index]
+                index += 1
+                code |= (byte & 127) << shift
+                shift += 7
+                if byte < 128:
+                    break
+            if code == 0:
+                break
+            lits.append(decode_lit(code))
+        steps.append((tag == 0x64, lits))
+    return steps
+
+
+class DratChecker:
+    """Forward DRAT checker with two watched literals. Root-level units stay assigned;
+    a RUP check assigns the negation of the candidate clause on top of them and
+    undoes it afterwards. Deletions of unit clauses are ignored (as drat-trim does).
+
+    Attributes:
+      clauses: Per clause id, its DIMACS literals or None if deleted.
+      keys: Per sorted clause, the ids of its live copies (to find deletions).
+      value: Per DIMACS literal, True if it is assigned true.
+      inconsistent: True once the clauses propagate to a conflict at root level.
+      checked: Number of added clauses checked.
+      rat_checks: Number of added clauses that needed the RAT check.
+    """
+
+    def __init__(self):
+        self.clauses = []
+        self.keys = {}
+        self.watches = {}
+        self.value = {}
+        self.trail = []
+        self.inconsistent = False
+        self.checked = 0
+        self.rat_checks = 0
+
+    def _assign(self, lit):
+        self.value[lit] = True
+        self.value[-lit] = False
+        self.trail.append(lit)
+
+    def _undo(self, length):
+        trail = self.trail
+        value = self.value
+        while len(trail) > length:
+            lit = trail.pop()
+            del value[lit]
+            del value[-lit]
+
+    def _propagate(self, head):
+        """Unit propagation from trail position head. Returns True on a conflict."""
+        trail = self.trail
+        value = self.value
+        clauses = self.clauses
+        watches = self.watches
+        while head < len(trail):
+            false_lit = -trail[head]
+            head += 1
+            watch_list = watches.get(false_lit)
+            if not watch_list:
+                continue
+            kept = []
+            for position, cid in enumerate(watch_list):
+                clause = clauses[cid]
+                if clause is None:
+                    continue  # Deleted, drop the watch
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], clause[0]
+                if value.get(clause[0]) is True:
+                    kept.append(cid)
+                    continue
+                for index in range(2, len(clause)):
+                    if value.get(clause[index]) is not False:
+                        clause[1], clause[index] = clause[index], clause[1]
+                        watches.setdefault(clause[1], []).append(cid)
+                        break
+                else:
+                    kept.append(cid)
+                    if value.get(clause[0]) is False:
+                        kept.extend(watch_list[position + 1:])
+                        watches[false_lit] = kept
+                        return True
+                    self._assign(clause[0])
+            watches[false_lit] = kept
+        return False
+
+    def add_clause(self, lits):
+        """Adds a clause (of the formula or a checked lemma) to the clause database."""
+        clause = list(dict.fromkeys(lits))
+        if self.inconsistent:
+            return
+        if not clause:
+            self.inconsistent = True
+            return
+        cid = len(self.clauses)
+        self.keys.setdefault(tuple(sorted(clause)), []).append(cid)
+        value = self.value
+        # Watch the literals that are not false at root level
+        clause.sort(key=lambda lit: value.get(lit) is False)
+        self.clauses.append(clause)
+        if len(clause) > 1:
+            self.watches.setdefault(clause[0], []).append(cid)
+            self.watches.setdefault(clause[1], []).append(cid)
+        if value.get(clause[0]) is False:
+            self.inconsistent = True
+        elif (len(clause) == 1 or value.get(clause[1]) is False) and clause[0] not in value:
+            head = len(self.trail)
+            self._assign(clause[0])
+            if self._propagate(head):
+                self.inconsistent = True
+
+    def delete_clause(self, lits):
+        """Deletes one copy of a clause, unit clauses are kept."""
+        key = tuple(sorted(set(lits)))
+        cids = self.keys.get(key)
+        if not cids or len(key) == 1:
+            return
+        self.clauses[cids.pop()] = None
+
+    def rup(self, lits):
+        """Returns True if the clause follows from the database by unit propagation."""
+        if self.inconsistent:
+            return True
+        length = len(self.trail)
+        value = self.value
+        conflict = False
+        for lit in lits:
+            current = value.get(lit)
+            if current is True:
+                conflict = True  # Already satisfied at root level
+                break
+            if current is None:
+                self._assign(-lit)
+        if not conflict:
+            conflict = self._propagate(length)
+        self._undo(length)
+        return conflict
+
+    def rat(self, lits):
+        """Returns True if the clause is a resolution asymmetric tautology on lits[0]."""
+        pivot = lits[0]
+        for clause in self.clauses:
+            if clause is not None and -pivot in clause:
+                resolvent = lits + [lit for lit in clause if lit != -pivot]
+                if not self.rup(resolvent):
+                    return False
+        return True
+
+    def check_lemma(self, lits):
+        """Checks an added clause and adds it. Returns False if it is neither RUP nor RAT."""
+        self.checked += 1
+        if not self.rup(lits):
+            self.rat_checks += 1
+            if not lits or not self.rat(lits):
+                return False
+        self.add_clause(lits)
+        return True
+
+
+def check_drat(clauses, steps):
+    """Checks a DRAT proof of unsatisfiability forward.
+
+    Parameters:
+      clauses: The clauses of the formula as lists of DIMACS literals
+      steps: The proof steps, see read_drat
+
+    Returns:
+      (verified, message) where verified is True if every lemma checks and the
+      empty clause is derived
+    """
+    checker = DratChecker()
+    for clause in clauses:
+        checker.add_clause(clause)
+    for number, (deletion, lits) in enumerate(steps, 1):
+        if deletion:
+            checker.delete_clause(lits)
+            continue
+        if not checker.check_lemma(lits):
+            return False, f'lemma {number} ({" ".join(map(str, lits + [0]))}) is not RUP or RAT'
+        if checker.inconsistent:
+            return True, f'VERIFIED ({checker.checked} lemmas, {checker.rat_checks} RAT)'
+    return False, 'the proof does not derive the empty clause'
+
+
+def check_proof_file(cnf_path, proof_path):
+    """Checks a DRAT proof file against a CNF file.
+
+    Parameters:
+      cnf_path: Path to the formula (.cnf, optionally compressed)
+      proof_path: Path to the text or binary DRAT proof
+
+    Returns:
+      (verified, message), see check_drat
+    """
+    arena, _ = parse_dimacs_file(cnf_path)
+    clauses = [arena.literals(index) for index in range(len(arena))]
+    if arena.empty:
+        clauses.append([])
+    return check_drat(clauses, read_drat(proof_path))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python3 sat_proof.py formula.cnf proof.drat")
+        sys.exit(2)
+    verified, message = check_proof_file(sys.argv[1], sys.argv[2])
+    print(f"s {'VERIFIED' if verified else 'NOT VERIFIED'}")
+    print(f"c {message}")
+    sys.exit(0 if verified else 1)
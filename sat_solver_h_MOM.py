@@ -1,171 +1,1457 @@
 # Program description: This program implements a SAT solver using dpll and heuristics.
 # Heuristics used are conflict driven learning, non-chrolological backtracking,
 # and MOM branching. It takes a formula in cnf format and prints if it is SAT or UNSAT.
-# If it is SAT, the assignments of the varibles are printed. 
+# If it is SAT, the assignments of the varibles are printed.
+# Propagation is done with two watched literals over a persistent clause arena,
+# so no clauses are copied while searching.
 
 
+import argparse
+import bz2
+import gzip
+import json
+import lzma
 import sys
 import time
 import random
 import os
+from array import array
+from collections import defaultdict, deque
 
+try:
+    import resource
+except ImportError:  # No RSS budget on platforms without the resource module
+    resource = None
 
-def parse_dimacs(file_content):
+
+class DimacsParser:
+    """Streaming DIMACS CNF parser. Text is fed in chunks of any size and clauses are
+    split on their 0 terminator, not on newlines, so a clause may span several lines
+    (and chunks). Comment lines are skipped and parsing stops at the SATLIB "%"
+    trailer. The "p cnf" header counts are checked against the clauses read.
+
+    Attributes:
+      clauses: A list of lists or a ClauseArena with the clauses read so far.
+      num_vars: The number of variables from the header (None before the header).
+      num_clauses: The number of clauses from the header (None before the header).
+      clauses_read: The number of clauses read, including tautologies left out of an arena.
+      max_var: The highest variable seen in a clause.
+      done: True once the "%" trailer was reached.
+    """
+
+    def __init__(self, as_arena=False):
+        self.as_arena = as_arena
+        self.clauses = ClauseArena() if as_arena else []
+        self.num_vars = None
+        self.num_clauses = None
+        self.clauses_read = 0
+        self.max_var = 0
+        self.done = False
+        self._current = []
+        self._carry = b''
+        self._partial = None
+
+    def feed(self, chunk):
+        """Parses the next chunk of the file. Complete lines are parsed, and of a line
+        that goes on in the next chunk the clause data is parsed up to its last
+        whitespace. Only the last, possibly cut, token is kept for the next chunk, so
+        a file with all clauses on one line is not held in memory.
+
+        Parameters:
+          chunk: The next bytes (or str) of the file.
+        """
+        if self.done:
+            return
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = self._carry + chunk
+        cut = data.rfind(b'\n') + 1
+        if cut:
+            self._parse_lines(data[:cut])
+            data = data[cut:]
+        self._carry = b'' if self.done else self._parse_partial(data)
+
+    def _parse_partial(self, tail):
+        """Parses what it can of a line without its newline and returns the rest."""
+        if self._partial is None:
+            head = tail.lstrip()[:1]
+            if head == b'':
+                return b''  # Leading whitespace does not change how the line is read
+            if head == b'c':
+                self._partial = 'skip'
+            elif head == b'p' or head == b'%':
+                return tail  # Short lines, parsed once they are complete
+            else:
+                self._partial = 'data'
+        if self._partial == 'skip':
+            return b''
+        cut = max(tail.rfind(b' '), tail.rfind(b'\t'), tail.rfind(b'\r')) + 1
+        if cut:
+            self._parse_tokens(tail[:cut])
+        return tail[cut:]
+
+    def finish(self):
+        """Parses what is left after the last chunk and validates the header.
+
+        Returns:
+          clauses: A list of lists (or a ClauseArena) that represents the cnf formula.
+          num_vars: The number of variables in the cnf formula.
+        """
+        if self._carry and not self.done:
+            self._parse_lines(self._carry)
+        self._carry = b''
+        if self._current:
+            self._end_clause(self._current)  # Last clause without its 0 terminator
+            self._current = []
+        if self.num_vars is None:
+            return self.clauses, self.max_var
+        if self.max_var > self.num_vars:
+            raise ValueError(f"header declares {self.num_vars} variables but variable "
+                             f"{self.max_var} is used")
+        if self.clauses_read != self.num_clauses:
+            raise ValueError(f"header declares {self.num_clauses} clauses but "
+                             f"{self.clauses_read} were read")
+        return self.clauses, self.num_vars
+
+    def _parse_lines(self, block):
+        body = []
+        lines = block.split(b'\n')
+        if self._partial is not None:
+            # The first line continues a line of the last chunk, a comment or clause data
+            first = lines.pop(0)
+            if self._partial == 'data':
+                body.append(first)
+            self._partial = None
+        for line in lines:
+            head = line.lstrip()[:1]
+            if head == b'c' or head == b'':
+                continue
+            if head == b'p':
+                self._header(line)
+            elif head == b'%':
+                self.done = True  # SATLIB trailer, the "0" after it is not an empty clause
+                break
+            else:
+                body.append(line)
+        self._parse_tokens(b' '.join(body))
+
+    def _parse_tokens(self, data):
+        current = self._current
+        try:
+            for lit in map(int, data.split()):
+                if lit:
+                    current.append(lit)
+                else:
+                    self._end_clause(current)
+                    current = []
+        except ValueError:
+            raise ValueError("invalid literal in DIMACS clause data") from None
+        self._current = current
+
+    def _header(self, line):
+        fields = line.split()
+        if len(fields) != 4 or fields[1] != b'cnf':
+            raise ValueError(f"invalid DIMACS header: {line.decode(errors='replace').strip()}")
+        self.num_vars = int(fields[2])
+        self.num_clauses = int(fields[3])
+
+    def _end_clause(self, clause):
+        self.clauses_read += 1
+        if clause:
+            var = max(max(clause), -min(clause))
+            if var > self.max_var:
+                self.max_var = var
+        if not self.as_arena:
+            self.clauses.append(clause)
+            return
+        codes = [2 * lit if lit > 0 else 1 - 2 * lit for lit in clause]
+        if len({abs(lit) for lit in clause}) != len(clause):
+            codes = normalize_clause(codes)  # Repeated variable, duplicate or tautology
+            if codes is None:
+                return
+        self.clauses.add(codes)
+
+
+def parse_dimacs(file_content, as_arena=False):
     # Note: ChatGPT was used to assist with parsing of DIMACS CNF file
     """Parser for DIMACS input
 
     Parameters:
       file_content: The content of the cnf file.
+      as_arena: If True, the clauses are stored in a ClauseArena instead of a list
+      of lists. Duplicate literals are merged and tautologies are left out, which
+      does not change the formula, and the arena can be handed to PropagationEngine.
 
     Returns:
-      clauses: A list of lists that represents the cnf formula.
+      clauses: A list of lists (or a ClauseArena) that represents the cnf formula.
       num_vars: The number of variables in the cnf formula.
     """
-    clauses = []
-    num_vars = 0
-    for line in file_content.strip().split('\n'):
-        line = line.strip()
-        if line == '' or line.startswith('c') or line.startswith('%'):
-            continue
-        if line.startswith('p'):
-            _, _, num_vars, _ = line.split()
-            num_vars = int(num_vars)
-        else:
-            clause = list(map(int, line.split()))
-            clause = [lit for lit in clause if lit != 0]
-            clauses.append(clause)
-    return clauses, num_vars
+    parser = DimacsParser(as_arena)
+    parser.feed(file_content)
+    return parser.finish()
 
 
-def unit_propagate(clauses, assignment):
-    """Implements unit propagation. This simplifies the unit clauses by
-     assigning unate clauses to true.
+def open_cnf(filepath):
+    """Opens a CNF file for binary reading. Files compressed with gzip, xz or bzip2
+    are decompressed on the fly, recognized by their first bytes so the file
+    extension does not matter.
 
     Parameters:
-      clauses: A list of lists that represents the current state of the cnf formula.
-      assignment: A set showing the variables that have been currently assigned.
+      filepath: The path of the (possibly compressed) CNF file.
 
     Returns:
-      clauses: A list of lists that represents the cnf formula.
-      assignment: A set showing the variables that have been currently assigned.
+      A binary file object.
     """
-    while True:
-        unit_clauses = [c for c in clauses if len(c) == 1]
-        if not unit_clauses:
-            break
-        for clause in unit_clauses:
-            lit = clause[0]
-            if -lit in assignment:
-                return None
-            assignment.add(lit)
-            clauses = simplify(clauses, lit)
-            if clauses is None:
-                return None
-    return clauses, assignment
+    with open(filepath, 'rb') as f:
+        magic = f.read(6)
+    if magic.startswith(b'\x1f\x8b'):
+        return gzip.open(filepath, 'rb')
+    if magic.startswith(b'\xfd7zXZ\x00'):
+        return lzma.open(filepath, 'rb')
+    if magic.startswith(b'BZh'):
+        return bz2.open(filepath, 'rb')
+    return open(filepath, 'rb')
 
 
-def simplify(clauses, lit):
-    """Implements clause simplification. Once a literal is assigned to true, 
-    the clauses already assigned are removed.
+def parse_dimacs_file(filepath, as_arena=True, chunk_size=1 << 20):
+    """Streaming parser for DIMACS files. The file is read in chunks, so the whole
+    text is never held in memory, and .gz/.xz/.bz2 files are read transparently.
 
     Parameters:
-      clauses: A list of lists that represents the current state of the cnf formula.
-      lit: The literal being simplified.
-      
+      filepath: The path of the cnf file.
+      as_arena: If True the clauses are returned as a ClauseArena, see parse_dimacs.
+      chunk_size: The number of bytes read at once.
+
     Returns:
-      new_clauses: A list of lists without the clauses that contain the literal
-      and with all instances of the complement of the variable removed.
+      clauses: A ClauseArena (or a list of lists) that represents the cnf formula.
+      num_vars: The number of variables in the cnf formula.
     """
-    new_clauses = []
-    for clause in clauses:
-        if lit in clause:
-            continue
-        if -lit in clause:
-            new_clause = [l for l in clause if l != -lit]
-            if not new_clause:
-                return None
-            new_clauses.append(new_clause)
+    parser = DimacsParser(as_arena)
+    with open_cnf(filepath) as f:
+        while not parser.done:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+    return parser.finish()
+
+
+def encode_lit(lit):
+    """Encodes a DIMACS literal as 2*var+sign (sign is 1 for a negative literal),
+    so the two literals of a variable are next to each other and the negation
+    of a code is code ^ 1.
+
+    Parameters:
+      lit: A non-zero DIMACS literal.
+
+    Returns:
+      The literal code.
+    """
+    return 2 * lit if lit > 0 else 1 - 2 * lit
+
+
+def decode_lit(code):
+    """Turns a literal code from encode_lit back into a DIMACS literal."""
+    return -(code >> 1) if code & 1 else code >> 1
+
+
+class ClauseArena:
+    """Flat storage for clauses. The literal codes (see encode_lit) of all clauses are
+    stored one after another in a single array('i'), and a clause is only the
+    offset and size of its literals in that array. A clause is referred to by its
+    index, which never changes, even when the arena is compacted.
+
+    Attributes:
+      lits: The literal codes of all clauses.
+      offsets: Per clause, the position of its first literal in lits.
+      sizes: Per clause, the number of literals, 0 for a deleted clause.
+      wasted: The number of positions in lits that belong to deleted clauses.
+      empty: True once an empty clause was added (the formula is UNSAT).
+    """
+
+    def __init__(self):
+        self.lits = array('i')
+        self.offsets = array('q')
+        self.sizes = array('i')
+        self.wasted = 0
+        self.empty = False
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add(self, codes):
+        """Appends a clause.
+
+        Parameters:
+          codes: The literal codes of the clause.
+
+        Returns:
+          The index of the new clause, None for an empty clause which is not stored.
+        """
+        if not codes:
+            self.empty = True
+            return None
+        self.offsets.append(len(self.lits))
+        self.sizes.append(len(codes))
+        self.lits.extend(codes)
+        return len(self.offsets) - 1
+
+    def clause(self, index):
+        """Returns the literal codes of a clause (empty for a deleted clause)."""
+        start = self.offsets[index]
+        return self.lits[start:start + self.sizes[index]]
+
+    def literals(self, index):
+        """Returns a clause as a list of DIMACS literals."""
+        return [decode_lit(code) for code in self.clause(index)]
+
+    def delete(self, index):
+        """Marks a clause as deleted, its space is reclaimed by compact()."""
+        self.wasted += self.sizes[index]
+        self.sizes[index] = 0
+
+    def compact(self):
+        """Moves the literals of the remaining clauses together and drops the space of
+        deleted clauses. Clause indices stay the same."""
+        lits = array('i')
+        old_lits = self.lits
+        offsets = self.offsets
+        sizes = self.sizes
+        for index in range(len(offsets)):
+            start = offsets[index]
+            offsets[index] = len(lits)
+            lits.extend(old_lits[start:start + sizes[index]])
+        self.lits = lits
+        self.wasted = 0
+
+    def copy(self):
+        """Returns an independent copy, e.g. to keep the original formula while a
+        solver adds learned clauses to this arena."""
+        other = ClauseArena()
+        other.lits = array('i', self.lits)
+        other.offsets = array('q', self.offsets)
+        other.sizes = array('i', self.sizes)
+        other.wasted = self.wasted
+        other.empty = self.empty
+        return other
+
+
+def normalize_clause(codes):
+    """Removes duplicate literals from a clause of literal codes.
+
+    Parameters:
+      codes: The literal codes of a clause.
+
+    Returns:
+      The codes without duplicates in their first order, or None for a tautology.
+    """
+    unique = []
+    for code in codes:
+        if code ^ 1 in unique:
+            return None
+        if code not in unique:
+            unique.append(code)
+    return unique
+
+
+class PropagationEngine:
+    """Persistent clause database with two watched literals and an assignment trail.
+
+    Clauses are stored once in a ClauseArena and never copied or simplified. All
+    literals inside the engine are literal codes (see encode_lit). Every clause
+    with two or more literals watches two of them, and a clause is only visited
+    when one of its watched literals becomes false. The literal order inside a
+    clause is never changed, the watched pair is stored next to the clause instead.
+
+    Backtracking only pops the trail and clears the value/level/reason entries of
+    the popped variables. The watches stay valid after backtracking, so nothing has
+    to be undone in the clause database.
+
+    Attributes:
+      arena: The ClauseArena with every clause of the formula (and learned clauses).
+      watch_a, watch_b: Per clause, its two watched literal codes.
+      watches: Per literal code, the indices of the clauses watching it.
+      value: Per literal code, 1 if true, -1 if false and 0 if unassigned.
+      level: Per variable, the decision level it was assigned at.
+      reason: Per variable, the index of the clause that implied it (None for decisions).
+      phase: Per variable, the sign of its last value (phase saving), 0 if never assigned.
+      trail: The assigned literal codes in assignment order.
+      trail_lim: The trail position where each decision level starts.
+      qhead: The trail position of the next literal to propagate.
+      ok: False once the clause database is known to be UNSAT at level 0.
+      propagations: The number of trail literals propagated so far.
+      proof: A DratWriter (see sat_proof.py) logging learned and deleted clauses, or None.
+    """
+
+    def __init__(self, num_vars=0, arena=None):
+        self.num_vars = 0
+        self.arena = ClauseArena()
+        self.watch_a = array('i')
+        self.watch_b = array('i')
+        self.watches = [[], []]
+        self.value = [0, 0]
+        self.level = [0]
+        self.reason = [None]
+        self.phase = [0]
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.ok = True
+        self.propagations = 0
+        self.proof = None
+        self.ensure_vars(num_vars)
+        if arena is not None:
+            # Take over a parsed arena instead of copying its clauses
+            self.arena = arena
+            self.ok = not arena.empty
+            self.ensure_vars(max(arena.lits, default=0) >> 1)
+            for index in range(len(arena)):
+                if not self.ok or not self._attach(index):
+                    break
+
+    def ensure_vars(self, num_vars):
+        """Grows the per-variable arrays so variables up to num_vars can be assigned.
+
+        Parameters:
+          num_vars: The highest variable that has to be available.
+        """
+        if num_vars <= self.num_vars:
+            return
+        extra = num_vars - self.num_vars
+        self.value.extend([0] * (2 * extra))
+        self.watches.extend([] for _ in range(2 * extra))
+        self.level.extend([0] * extra)
+        self.reason.extend([None] * extra)
+        self.phase.extend([0] * extra)
+        self.num_vars = num_vars
+
+    def decision_level(self):
+        """Returns the current decision level."""
+        return len(self.trail_lim)
+
+    def lit_value(self, lit):
+        """Returns 1 if the DIMACS literal is true, -1 if it is false and 0 if unassigned."""
+        return self.value[encode_lit(lit)]
+
+    def add_clause(self, clause):
+        """Adds a clause of the original formula. Must be called at decision level 0.
+
+        Parameters:
+          clause: A list of DIMACS literals.
+
+        Returns:
+          False if the clause database became UNSAT, otherwise True.
+        """
+        if not self.ok:
+            return False
+        codes = normalize_clause([encode_lit(lit) for lit in clause])
+        if codes is None:
+            return True  # Tautology, always satisfied
+        if not codes:
+            self.ok = False
+            return False
+        self.ensure_vars(max(codes) >> 1)
+        return self._attach(self.arena.add(codes))
+
+    def _attach(self, index):
+        """Sets up the watches of a clause of the original formula at level 0."""
+        arena = self.arena
+        codes = arena.clause(index)
+        value = self.value
+        if len(codes) == 1:
+            self.watch_a.append(0)
+            self.watch_b.append(0)
+            return self._assert_at_root(codes[0], index)
+
+        # Watch literals that are not already false when possible
+        order = sorted(codes, key=lambda code: value[code] == -1)
+        self.watch_a.append(order[0])
+        self.watch_b.append(order[1])
+        self.watches[order[0]].append(index)
+        self.watches[order[1]].append(index)
+        if value[order[1]] == -1:
+            return self._assert_at_root(order[0], index)
+        return True
+
+    def _assert_at_root(self, code, index):
+        """Enqueues a literal implied at level 0 and propagates it."""
+        val = self.value[code]
+        if val == -1:
+            self.ok = False
+        elif val == 0:
+            self.enqueue(code, index)
+            if self.propagate() is not None:
+                self.ok = False
+        return self.ok
+
+    def enqueue(self, code, reason=None):
+        """Assigns a literal to true at the current decision level.
+
+        Parameters:
+          code: The literal code to assign.
+          reason: The index of the clause that implied the literal, None for decisions.
+        """
+        var = code >> 1
+        self.value[code] = 1
+        self.value[code ^ 1] = -1
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(code)
+
+    def decide(self, code):
+        """Opens a new decision level and assigns the decision literal."""
+        self.trail_lim.append(len(self.trail))
+        self.enqueue(code)
+
+    def new_decision_level(self):
+        """Opens a new decision level without assigning a literal."""
+        self.trail_lim.append(len(self.trail))
+
+    def learn(self, clause):
+        """Adds a learned clause after backjumping and assigns its asserting literal.
+
+        Parameters:
+          clause: A list of literal codes where clause[0] is the only unassigned
+          literal and clause[1] (if present) has the highest level of the false literals.
+
+        Returns:
+          The index of the learned clause in the clause database.
+        """
+        index = self.arena.add(clause)
+        if self.proof is not None:
+            self.proof.add(clause)
+        if len(clause) == 1:
+            self.watch_a.append(0)
+            self.watch_b.append(0)
         else:
-            new_clauses.append(clause)
-    return new_clauses
+            self.watch_a.append(clause[0])
+            self.watch_b.append(clause[1])
+            self.watches[clause[0]].append(index)
+            self.watches[clause[1]].append(index)
+        self.enqueue(clause[0], index)
+        return index
 
+    def locked_clauses(self):
+        """Returns the set of clause indices that are the reason of an assigned literal."""
+        reason = self.reason
+        locked = {reason[code >> 1] for code in self.trail}
+        locked.discard(None)
+        return locked
+
+    def delete_clauses(self, indices):
+        """Removes clauses from the database and from the watch lists. Clauses that are
+        the reason of an assigned literal must not be deleted. The arena is compacted
+        once more than half of it belongs to deleted clauses.
+
+        Parameters:
+          indices: The indices of the clauses to delete.
+        """
+        deleted = set(indices)
+        watched_lits = set()
+        arena = self.arena
+        for index in deleted:
+            if self.proof is not None:
+                self.proof.delete(arena.clause(index))
+            if arena.sizes[index] > 1:
+                watched_lits.add(self.watch_a[index])
+                watched_lits.add(self.watch_b[index])
+            arena.delete(index)
+        for code in watched_lits:
+            self.watches[code] = [index for index in self.watches[code] if index not in deleted]
+        if arena.wasted * 2 > len(arena.lits):
+            arena.compact()
+
+    def propagate(self):
+        """Implements unit propagation with two watched literals. Only clauses that
+        watch a literal that became false are visited.
+
+        Returns:
+          The index of a conflicting clause, or None if no conflict was found.
+        """
+        trail = self.trail
+        value = self.value
+        watches = self.watches
+        watch_a = self.watch_a
+        watch_b = self.watch_b
+        lits = self.arena.lits
+        offsets = self.arena.offsets
+        sizes = self.arena.sizes
+        start_head = self.qhead
+        while self.qhead < len(trail):
+            false_lit = trail[self.qhead] ^ 1
+            self.qhead += 1
+            watch_list = watches[false_lit]
+            if not watch_list:
+                continue
+            kept = []
+            i = 0
+            n = len(watch_list)
+            while i < n:
+                index = watch_list[i]
+                i += 1
+                first = watch_a[index]
+                other = watch_b[index] if first == false_lit else first
+                other_val = value[other]
+                if other_val == 1:
+                    kept.append(index)
+                    continue
 
-def decide_literal(clauses, assignment):
+                # Look for a literal that is not false to watch instead
+                new_watch = 0
+                start = offsets[index]
+                for code in lits[start:start + sizes[index]]:
+                    if code != other and code != false_lit and value[code] != -1:
+                        new_watch = code
+                        break
+                if new_watch:
+                    if first == false_lit:
+                        watch_a[index] = new_watch
+                    else:
+                        watch_b[index] = new_watch
+                    watches[new_watch].append(index)
+                    continue
+
+                # Clause is unit or conflicting, it keeps watching false_lit
+                kept.append(index)
+                if other_val == -1:
+                    kept.extend(watch_list[i:])
+                    watches[false_lit] = kept
+                    self.propagations += self.qhead - start_head
+                    self.qhead = len(trail)
+                    return index
+                self.enqueue(other, index)
+            watches[false_lit] = kept
+        self.propagations += self.qhead - start_head
+        return None
+
+    def backtrack(self, level):
+        """Undoes every assignment above the given decision level. The watches do not
+        need to be touched. The value of every undone variable is kept as its phase.
+
+        Parameters:
+          level: The decision level to return to.
+        """
+        if len(self.trail_lim) <= level:
+            return
+        start = self.trail_lim[level]
+        value = self.value
+        for code in self.trail[start:]:
+            var = code >> 1
+            self.phase[var] = -1 if code & 1 else 1
+            value[code] = 0
+            value[code ^ 1] = 0
+            self.reason[var] = None
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+
+    def model_value(self, var):
+        """Returns 1 if the variable is true, -1 if it is false and 0 if unassigned."""
+        return self.value[2 * var]
+
+
+class MOMIndex:
+    """Occurrence index used by the MOM heuristic.
+
+    Every literal has an occurrence list of the clauses it is in. For each clause
+    the index keeps the number of true literals and of unassigned literals, and
+    for every clause size k (counted in unassigned literals) it keeps the set of
+    unsatisfied clauses of that size. The counters are updated incrementally from
+    the trail of the engine: an assignment only touches the clauses of the literal
+    and its negation, and moves each of them to another size bucket without looking
+    at its other literals. The MOM occurrence counts are computed at decision time
+    from the bucket of the minimum size alone.
+    Literals are literal codes and clauses are indices into the engine arena.
+
+    Attributes:
+      occurs: Per literal code, the sorted indices of its clauses.
+      value: Per variable, the value the counters were computed with.
+      num_true: Per clause, the number of true literals.
+      num_free: Per clause, the number of unassigned literals.
+      buckets: Per clause size, the set of unsatisfied clauses of that size.
+      indexed: The number of clauses of the engine already in the index.
+      synced: The number of trail literals the counters include.
+    """
+
+    def __init__(self, engine):
+        self.occurs = [[], []]
+        self.value = [0]
+        self.num_true = array('i')
+        self.num_free = array('i')
+        self.buckets = [set()]
+        self.indexed = 0
+        self.synced = 0
+        self.sync(engine)
+
+    def sync(self, engine):
+        """Adds new clauses of the engine and applies new trail literals."""
+        if len(self.value) <= engine.num_vars:
+            self.value.extend([0] * (engine.num_vars + 1 - len(self.value)))
+            self.occurs.extend([] for _ in range(2 * engine.num_vars + 2 - len(self.occurs)))
+        arena = engine.arena
+        while self.indexed < len(arena):
+            self._index_clause(self.indexed, arena.clause(self.indexed))
+            self.indexed += 1
+        trail = engine.trail
+        while self.synced < len(trail):
+            self._assign(trail[self.synced])
+            self.synced += 1
+
+    def backtrack(self, engine, level):
+        """Unapplies the trail literals above a decision level, in reverse order."""
+        if engine.decision_level() <= level:
+            return
+        start = engine.trail_lim[level]
+        trail = engine.trail
+        while self.synced > start:
+            self.synced -= 1
+            self._unassign(trail[self.synced])
+
+    def remove_clauses(self, engine, indices):
+        """Takes clauses out of the counters and occurrence lists before they are
+        deleted from the engine."""
+        deleted = set()
+        codes = set()
+        for index in indices:
+            if index >= self.indexed:
+                continue  # Not indexed yet, sync() will see an empty clause
+            if self.num_true[index] == 0:
+                self.buckets[self.num_free[index]].discard(index)
+            self.num_true[index] = self.num_free[index] = 0
+            deleted.add(index)
+            codes.update(engine.arena.clause(index))
+        occurs = self.occurs
+        for code in codes:
+            occurs[code] = [index for index in occurs[code] if index not in deleted]
+
+    def min_size(self):
+        """Returns the smallest size of an unsatisfied clause, 0 if there is none."""
+        buckets = self.buckets
+        for size in range(1, len(buckets)):
+            if buckets[size]:
+                return size
+        return 0
+
+    def literal_counts(self, engine, size):
+        """Returns a dictionary from every unassigned literal code to its number of
+        occurrences in the unsatisfied clauses of the given size."""
+        counts = defaultdict(int)
+        value = self.value
+        clause = engine.arena.clause
+        for index in self.buckets[size]:
+            for code in clause(index):
+                if not value[code >> 1]:
+                    counts[code] += 1
+        return counts
+
+    def first_occurrence(self, engine, var, size):
+        """Returns (clause index, literal position) of the first occurrence of a
+        variable in an unsatisfied clause of the given size."""
+        best = None
+        for code in (2 * var, 2 * var + 1):
+            for index in self.occurs[code]:
+                if self.num_true[index] == 0 and self.num_free[index] == size:
+                    key = (index, engine.arena.clause(index).index(code))
+                    if best is None or key < best:
+                        best = key
+                    break
+        return best
+
+    def _index_clause(self, index, clause):
+        occurs = self.occurs
+        for code in clause:
+            occurs[code].append(index)
+        value = self.value
+        num_true = 0
+        num_free = 0
+        for code in clause:
+            val = value[code >> 1]
+            if val == 0:
+                num_free += 1
+            elif (val == 1) != (code & 1):
+                num_true += 1
+        self.num_true.append(num_true)
+        self.num_free.append(num_free)
+        buckets = self.buckets
+        while len(buckets) <= len(clause):
+            buckets.append(set())  # Backtracking can free every literal of the clause
+        if num_true == 0:
+            buckets[num_free].add(index)
+
+    def _assign(self, code):
+        num_true = self.num_true
+        num_free = self.num_free
+        buckets = self.buckets
+        for index in self.occurs[code]:
+            if num_true[index] == 0:
+                buckets[num_free[index]].discard(index)  # Satisfied now
+            num_true[index] += 1
+            num_free[index] -= 1
+        for index in self.occurs[code ^ 1]:
+            size = num_free[index]
+            num_free[index] = size - 1
+            if num_true[index] == 0:
+                buckets[size].discard(index)
+                buckets[size - 1].add(index)
+        self.value[code >> 1] = -1 if code & 1 else 1
+
+    def _unassign(self, code):
+        num_true = self.num_true
+        num_free = self.num_free
+        buckets = self.buckets
+        self.value[code >> 1] = 0
+        for index in self.occurs[code ^ 1]:
+            size = num_free[index]
+            num_free[index] = size + 1
+            if num_true[index] == 0:
+                buckets[size].discard(index)
+                buckets[size + 1].add(index)
+        for index in self.occurs[code]:
+            num_true[index] -= 1
+            num_free[index] += 1
+            if num_true[index] == 0:
+                buckets[num_free[index]].add(index)  # Unsatisfied again
+
+
+def decide_literal(engine, index, rng=None):
     """Implements the MOM (Maximum Occurrence of clauses of Minimum size) heuristic
-    to decide the literal to branch on.
-    
+    to decide the literal to branch on. Satisfied clauses are skipped and false
+    literals are left out, so the sizes are those of the simplified formula.
+    The occurrence counts are taken over the clauses of minimum size kept by a
+    MOMIndex, so a decision only looks at those clauses. Ties go to the variable
+    that occurs first in the clauses of minimum size, or to a random one of them
+    if rng is given.
+
     Parameters:
-      clauses: A list of lists that represents the current state of the cnf formula.
-      assignment: A set showing the variables that have been currently assigned.
-      
+      engine: The PropagationEngine holding the clauses and the current assignment.
+      index: The MOMIndex kept in step with the engine.
+      rng: A random.Random used to break ties, None for the first occurrence.
+
     Returns:
-      lit_choice: The chosen literal to branch on.
-    """
-    literal_assignments = [abs(l) for l in assignment]
-    min_size = min((len(c) for c in clauses if c), default=0)
-    counts = {}
-
-    for clause in clauses:
-        if len(clause) == min_size:
-            for lit in clause:
-                if abs(lit) not in literal_assignments:
-                    if lit not in counts and -lit not in counts:
-                        counts[lit] = 0
-                        counts[-lit] = 0
-                    elif lit not in counts:
-                        counts[lit] = 0
-                    counts[lit] += 1
-
-    if not counts:
+      lit_choice: The chosen literal code (the positive literal) to branch on.
+    """
+    index.sync(engine)
+    min_size = index.min_size()
+    if not min_size:
         return None
+    counts = index.literal_counts(engine, min_size)
+
+    best_score = -1
+    best_vars = []
+    for code, count in counts.items():
+        if not count or (code & 1 and counts.get(code ^ 1)):
+            continue  # Not in a clause of minimum size or scored with the positive literal
+        var = code >> 1
+        num_uncomp = counts.get(2 * var, 0)
+        num_comp = counts.get(2 * var + 1, 0)
+        score = ((num_uncomp + num_comp)) * (2 ** min_size) + (num_uncomp * num_comp)
+        if score > best_score:
+            best_score = score
+            best_vars = [var]
+        elif score == best_score:
+            best_vars.append(var)
+
+    if len(best_vars) == 1:
+        return 2 * best_vars[0]
+    if rng is not None:
+        return 2 * rng.choice(best_vars)
+    lit_choice = min(best_vars, key=lambda var: index.first_occurrence(engine, var, min_size))
+    return 2 * lit_choice
+
+
+# Decision heuristics. The search loop only talks to the DecisionHeuristic
+# interface, so MOM and VSIDS can be swapped with the --heuristic flag.
+
+class DecisionHeuristic:
+    """Interface of a branching heuristic used by dpll_cdcl.
+
+    The search loop calls pick() for every decision, on_conflict() after a clause
+    has been learned, and on_backtrack() before the trail is cut back to a lower
+    decision level.
+    """
+
+    def pick(self, engine):
+        """Returns the literal code to branch on, or None if every clause is satisfied."""
+        raise NotImplementedError
+
+    def on_conflict(self, engine, learned_clause):
+        """Called with the clause (literal codes) learned from a conflict."""
+
+    def on_backtrack(self, engine, level):
+        """Called before the engine backtracks to the given decision level."""
+
+    def on_delete(self, engine, indices):
+        """Called before clauses are deleted from the engine."""
+
+    def on_rewrite(self, engine, eliminated=()):
+        """Called at level 0 after clauses of the engine were rewritten in place
+        (see sat_inprocess.py). The eliminated variables no longer occur in any clause
+        and must not be branched on."""
+
+    def on_new_vars(self, engine):
+        """Called before a search when variables may have been added to the engine."""
+
+
+class MOMHeuristic(DecisionHeuristic):
+    """MOM branching, see decide_literal and MOMIndex. With a seed, ties between
+    equally scored variables are broken randomly."""
+
+    def __init__(self, engine, seed=None):
+        self.index = MOMIndex(engine)
+        self.rng = None if seed is None else random.Random(seed)
+
+    def pick(self, engine):
+        return decide_literal(engine, self.index, self.rng)
+
+    def on_backtrack(self, engine, level):
+        self.index.backtrack(engine, level)
 
-    vars = [abs(lit) for lit in counts]
-    score_vals = []
+    def on_delete(self, engine, indices):
+        self.index.remove_clauses(engine, indices)
+
+    def on_rewrite(self, engine, eliminated=()):
+        # The counters of rewritten clauses are stale. The new index only counts the
+        # literals of the clauses, so eliminated variables are never picked.
+        self.index = MOMIndex(engine)
+
+
+class VarHeap:
+    """Indexed binary max-heap of variables ordered by activity. The position of
+    every variable is stored so an activity increase can sift it up in place.
+
+    Attributes:
+      activity: The activity list the heap is ordered by (shared, not copied).
+      heap: The variables in heap order.
+      indices: Per variable, its position in heap or -1 if it is not in the heap.
+    """
+
+    def __init__(self, activity):
+        self.activity = activity
+        self.heap = []
+        self.indices = [-1] * len(activity)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, var):
+        return var < len(self.indices) and self.indices[var] >= 0
+
+    def insert(self, var):
+        """Adds a variable if it is not in the heap yet. O(log n)."""
+        if var >= len(self.indices):
+            self.indices.extend([-1] * (var + 1 - len(self.indices)))
+        if self.indices[var] >= 0:
+            return
+        self.indices[var] = len(self.heap)
+        self.heap.append(var)
+        self._sift_up(len(self.heap) - 1)
+
+    def increase(self, var):
+        """Restores the heap order after the activity of a variable went up. O(log n)."""
+        if var in self:
+            self._sift_up(self.indices[var])
+
+    def remove(self, var):
+        """Takes a variable out of the heap if it is in it. O(log n)."""
+        if var not in self:
+            return
+        heap = self.heap
+        pos = self.indices[var]
+        last = heap.pop()
+        self.indices[var] = -1
+        if pos < len(heap):
+            heap[pos] = last
+            self.indices[last] = pos
+            self._sift_up(pos)
+            self._sift_down(self.indices[last])
+
+    def pop(self):
+        """Removes and returns the variable with the highest activity. O(log n)."""
+        heap = self.heap
+        top = heap[0]
+        last = heap.pop()
+        self.indices[top] = -1
+        if heap:
+            heap[0] = last
+            self.indices[last] = 0
+            self._sift_down(0)
+        return top
+
+    def _sift_up(self, pos):
+        heap = self.heap
+        activity = self.activity
+        indices = self.indices
+        var = heap[pos]
+        act = activity[var]
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if activity[heap[parent]] >= act:
+                break
+            heap[pos] = heap[parent]
+            indices[heap[pos]] = pos
+            pos = parent
+        heap[pos] = var
+        indices[var] = pos
+
+    def _sift_down(self, pos):
+        heap = self.heap
+        activity = self.activity
+        indices = self.indices
+        var = heap[pos]
+        act = activity[var]
+        size = len(heap)
+        while True:
+            child = 2 * pos + 1
+            if child >= size:
+                break
+            if child + 1 < size and activity[heap[child + 1]] > activity[heap[child]]:
+                child += 1
+            if activity[heap[child]] <= act:
+                break
+            heap[pos] = heap[child]
+            indices[heap[pos]] = pos
+            pos = child
+        heap[pos] = var
+        indices[var] = pos
+
+
+class VSIDSHeuristic(DecisionHeuristic):
+    """Activity-based branching (VSIDS with exponential bumping, EVSIDS).
+
+    Every variable of a learned clause gets its activity increased by an increment
+    that grows by 1/decay after each conflict, which is the same as decaying all
+    other activities. When activities get too large they are all scaled down.
+    Unassigned variables are kept in a VarHeap so a branch pick costs O(log n).
+    With a seed, the variables start with small random activities instead of 0, so
+    the order of the first decisions differs per seed.
+    """
+
+    def __init__(self, engine, seed=None, decay=0.95):
+        self.decay = decay
+        self.increment = 1.0
+        self.activity = [0.0] * (engine.num_vars + 1)
+        if seed is not None:
+            rng = random.Random(seed)
+            for var in range(1, engine.num_vars + 1):
+                self.activity[var] = rng.random() * 1e-5
+        self.heap = VarHeap(self.activity)
+        for var in range(1, engine.num_vars + 1):
+            self.heap.insert(var)
+
+    def pick(self, engine):
+        value = engine.value
+        heap = self.heap
+        while heap:
+            var = heap.pop()
+            if value[2 * var] == 0:
+                return 2 * var + 1
+        return None
+
+    def on_conflict(self, engine, learned_clause):
+        activity = self.activity
+        for code in learned_clause:
+            var = code >> 1
+            activity[var] += self.increment
+            if activity[var] > 1e100:
+                self._rescale()
+            self.heap.increase(var)
+        self.increment /= self.decay
+
+    def on_backtrack(self, engine, level):
+        if engine.decision_level() <= level:
+            return
+        for code in engine.trail[engine.trail_lim[level]:]:
+            self.heap.insert(code >> 1)
+
+    def on_rewrite(self, engine, eliminated=()):
+        # Eliminated variables are never assigned again, so on_backtrack never puts
+        # them back
+        for var in eliminated:
+            self.heap.remove(var)
+
+    def on_new_vars(self, engine):
+        activity = self.activity
+        for var in range(len(activity), engine.num_vars + 1):
+            activity.append(0.0)
+            self.heap.insert(var)
+
+    def _rescale(self):
+        """Scales all activities and the increment down, the heap order is unchanged."""
+        activity = self.activity
+        for var in range(len(activity)):
+            activity[var] *= 1e-100
+        self.increment *= 1e-100
+
+
+HEURISTICS = {
+    'mom': MOMHeuristic,
+    'vsids': VSIDSHeuristic,
+}
+
+
+# Restart policies. A restart backtracks to level 0 but keeps the learned
+# clauses, the heuristic scores and the saved phases.
+
+class RestartPolicy:
+    """Interface of a restart scheduler used by dpll_cdcl."""
+
+    def on_conflict(self, lbd):
+        """Called for every learned clause with its LBD (literal block distance)."""
+
+    def should_restart(self):
+        """Returns True if the search should restart now."""
+        return False
+
+    def on_restart(self):
+        """Called after every restart."""
+
+
+class NoRestarts(RestartPolicy):
+    """Never restarts."""
+
+
+def luby(index):
+    """Returns element index (starting at 0) of the Luby sequence 1 1 2 1 1 2 4 1 ...
+
+    Parameters:
+      index: The position in the sequence.
+
+    Returns:
+      The Luby value at that position.
+    """
+    size = 1
+    power = 0
+    while size < index + 1:
+        power += 1
+        size = 2 * size + 1
+    while size - 1 != index:
+        size = (size - 1) >> 1
+        power -= 1
+        index = index % size
+    return 1 << power
 
-    for lit in vars:
-        num_uncomp = counts[lit]
-        num_comp = counts[-lit]
-        score_vals.append(((num_uncomp + num_comp)) * (2 ** min_size) + (num_uncomp * num_comp))
 
-    lit_choice = vars[score_vals.index(max(score_vals))]
-    return lit_choice
+class LubyRestarts(RestartPolicy):
+    """Restarts after unit * luby(i) conflicts for the i-th restart interval."""
+
+    def __init__(self, unit=100):
+        self.unit = unit
+        self.restarts = 0
+        self.conflicts = 0
+        self.limit = unit * luby(0)
+
+    def on_conflict(self, lbd):
+        self.conflicts += 1
+
+    def should_restart(self):
+        return self.conflicts >= self.limit
+
+    def on_restart(self):
+        self.restarts += 1
+        self.conflicts = 0
+        self.limit = self.unit * luby(self.restarts)
+
+
+class GlucoseRestarts(RestartPolicy):
+    """Glucose-style dynamic restarts. The search restarts when the average LBD of
+    the last window learned clauses is larger than the overall average LBD by the
+    factor 1/margin, meaning recent clauses are worse than usual.
+    """
+
+    def __init__(self, window=50, margin=0.8):
+        self.window = window
+        self.margin = margin
+        self.recent = deque()
+        self.recent_sum = 0
+        self.total_sum = 0
+        self.total_count = 0
+
+    def on_conflict(self, lbd):
+        self.recent.append(lbd)
+        self.recent_sum += lbd
+        if len(self.recent) > self.window:
+            self.recent_sum -= self.recent.popleft()
+        self.total_sum += lbd
+        self.total_count += 1
+
+    def should_restart(self):
+        if len(self.recent) < self.window:
+            return False
+        recent_avg = self.recent_sum / self.window
+        total_avg = self.total_sum / self.total_count
+        return recent_avg * self.margin > total_avg
+
+    def on_restart(self):
+        self.recent.clear()
+        self.recent_sum = 0
+
+
+RESTART_POLICIES = {
+    'none': NoRestarts,
+    'luby': LubyRestarts,
+    'glucose': GlucoseRestarts,
+}
+
+
+# Learned clause database. Learned clauses are kept in the engine like the
+# original clauses, the store only keeps their scores and decides which to delete.
+
+class LearnedClauseStore:
+    """Scores of the learned clauses and the schedule of clause database reductions.
+
+    Every learned clause has its LBD from when it was learned and an activity that
+    is bumped whenever the clause takes part in conflict analysis. Every reduction
+    deletes the worse half of the learned clauses, ordered by LBD and then by
+    activity. Clauses with an LBD up to keep_lbd, binary clauses and clauses that
+    are the reason of an assigned literal (locked clauses) are never deleted.
+
+    Attributes:
+      lbd: A dictionary from the index of a learned clause to its LBD.
+      activity: A dictionary from the index of a learned clause to its activity.
+      next_reduce: The conflict count at which the next reduction happens.
+      reductions: The number of reductions done.
+      deleted: The number of learned clauses deleted.
+    """
+
+    def __init__(self, first_reduce=2000, reduce_increment=300, keep_lbd=2, decay=0.999):
+        self.reduce_increment = reduce_increment
+        self.keep_lbd = keep_lbd
+        self.decay = decay
+        self.increment = 1.0
+        self.lbd = {}
+        self.activity = {}
+        self.next_reduce = first_reduce
+        self.reductions = 0
+        self.deleted = 0
+
+    def __len__(self):
+        return len(self.lbd)
+
+    def add(self, index, lbd):
+        """Records a new learned clause and decays the activity of the others."""
+        self.lbd[index] = lbd
+        self.activity[index] = self.increment
+        self.increment /= self.decay
+
+    def bump(self, index):
+        """Increases the activity of a clause used in conflict analysis."""
+        activity = self.activity
+        if index in activity:
+            activity[index] += self.increment
+            if activity[index] > 1e20:
+                for key in activity:
+                    activity[key] *= 1e-20
+                self.increment *= 1e-20
+
+    def should_reduce(self, conflicts):
+        """Returns True if the clause database should be reduced now."""
+        return conflicts >= self.next_reduce
+
+    def reduce(self, engine, heuristic):
+        """Deletes the worse half of the deletable learned clauses.
+
+        Parameters:
+          engine: The PropagationEngine holding the clauses.
+          heuristic: The DecisionHeuristic, told about the deleted clauses.
+
+        Returns:
+          The number of deleted clauses.
+        """
+        locked = engine.locked_clauses()
+        lbd = self.lbd
+        candidates = [index for index in lbd
+                      if lbd[index] > self.keep_lbd and index not in locked
+                      and engine.arena.sizes[index] > 2]
+        candidates.sort(key=lambda index: (-lbd[index], self.activity[index]))
+        deleted = candidates[:len(candidates) // 2]
+
+        heuristic.on_delete(engine, deleted)
+        engine.delete_clauses(deleted)
+        for index in deleted:
+            del lbd[index]
+            del self.activity[index]
+        self.reductions += 1
+        self.deleted += len(deleted)
+        self.next_reduce += self.reduce_increment * (self.reductions + 1)
+        return len(deleted)
 
 
 # Conflict Clause analysis and backtracking (heuristics)
 # Pure Literal Elimination from regular DPLL removed due to clause learning implementation
 
-def analyze_conflict(decision_stack):
-    """Conflict analysis to compute the learned clause.
-    
+def analyze_conflict(engine, conflict, learned_store=None):
+    """Conflict analysis to compute the learned clause with the first UIP scheme.
+    The implication graph is given by the reason clause of every propagated
+    literal. Starting from the conflicting clause, literals of the current decision
+    level are resolved away in reverse trail order until a single one is left
+    (the first unique implication point). The clause is then minimized.
+
     Parameters:
-      decision_stack: The stack of free decisions.
-      
+      engine: The PropagationEngine holding the trail and the reasons.
+      conflict: The index of the clause that became false.
+      learned_store: The LearnedClauseStore whose clauses used here are bumped.
+
     Returns:
-      The learned clause from the conflict.
+      The learned clause (literal codes) from the conflict. The first literal is the
+      negated UIP and the second literal has the highest level of the remaining literals.
     """
-    if decision_stack:
-        return [-decision_stack[-1]]  # Block last decision
-    return []
+    arena = engine.arena
+    level = engine.level
+    reason = engine.reason
+    trail = engine.trail
+    current_level = engine.decision_level()
+
+    seen = set()
+    learned_clause = [0]  # Position 0 is filled with the asserting literal
+    pending = 0  # Literals of the current level that are not resolved yet
+    index = len(trail) - 1
+    uip = 0
+    clause_index = conflict
+    while True:
+        if learned_store is not None:
+            learned_store.bump(clause_index)
+        for code in arena.clause(clause_index):
+            var = code >> 1
+            if code == uip or var in seen or level[var] == 0:
+                continue
+            seen.add(var)
+            if level[var] == current_level:
+                pending += 1
+            else:
+                learned_clause.append(code)
 
+        # Next literal of the current level to resolve on
+        while trail[index] >> 1 not in seen:
+            index -= 1
+        uip = trail[index]
+        index -= 1
+        pending -= 1
+        if pending == 0:
+            break
+        clause_index = reason[uip >> 1]
+    learned_clause[0] = uip ^ 1
+
+    learned_clause = minimize_clause(engine, learned_clause, seen)
+
+    # Watch the literal that becomes false last, the asserting level is its level
+    if len(learned_clause) > 1:
+        best = max(range(1, len(learned_clause)), key=lambda i: level[learned_clause[i] >> 1])
+        learned_clause[1], learned_clause[best] = learned_clause[best], learned_clause[1]
+    return learned_clause
 
-def backtrack(decision_stack, assignment, decision_levels, learned_clause):
-    """Decides how far to backtrack based on the decision levels of the literals 
-    present in the learned clause. The function jumps back to the second-highest 
+
+def analyze_final(engine, code):
+    """Computes the failed assumptions when an assumption is false before it could be
+    decided. The implication graph is followed back from the false assumption to the
+    assumption decisions it was implied by.
+
+    Parameters:
+      engine: The PropagationEngine holding the trail and the reasons.
+      code: The literal code of the assumption that is false.
+
+    Returns:
+      The literal codes of the assumptions that together contradict the formula,
+      code included.
+    """
+    arena = engine.arena
+    level = engine.level
+    reason = engine.reason
+    core = [code]
+    if level[code >> 1] == 0:
+        return core
+    seen = {code >> 1}
+    for assigned in reversed(engine.trail[engine.trail_lim[0]:]):
+        var = assigned >> 1
+        if var not in seen:
+            continue
+        if reason[var] is None:
+            if assigned != code:
+                core.append(assigned)  # An assumption decision
+        else:
+            for other in arena.clause(reason[var]):
+                if level[other >> 1] > 0:
+                    seen.add(other >> 1)
+    return core
+
+
+def minimize_clause(engine, learned_clause, seen):
+    """Implements recursive learned-clause minimization. A literal is removed when
+    it is implied by the other literals of the clause, found by following its
+    reasons in the implication graph until only clause literals (or level 0
+    literals) are reached.
+
+    Parameters:
+      engine: The PropagationEngine holding the reasons and levels.
+      learned_clause: The learned clause, the asserting literal first.
+      seen: The set of variables that occur in the clause (extended in place with
+      variables shown to be implied by the clause).
+
+    Returns:
+      The minimized learned clause.
+    """
+    level = engine.level
+    reason = engine.reason
+    # Bit signature of the levels in the clause, a path leaving them cannot succeed
+    levels = 0
+    for code in learned_clause[1:]:
+        levels |= 1 << (level[code >> 1] & 63)
+
+    minimized = [learned_clause[0]]
+    for code in learned_clause[1:]:
+        if reason[code >> 1] is None or not lit_redundant(engine, code, levels, seen):
+            minimized.append(code)
+    return minimized
+
+
+def lit_redundant(engine, code, levels, seen):
+    """Checks if a literal of the learned clause is implied by the other literals.
+
+    Parameters:
+      engine: The PropagationEngine holding the reasons and levels.
+      code: A literal code of the learned clause that has a reason.
+      levels: The bit signature of the decision levels in the learned clause.
+      seen: The set of variables in the clause or already shown to be implied by it.
+
+    Returns:
+      True if the literal can be removed from the learned clause.
+    """
+    arena = engine.arena
+    level = engine.level
+    reason = engine.reason
+    stack = [code >> 1]
+    added = []
+    while stack:
+        var = stack.pop()
+        for other in arena.clause(reason[var]):
+            other_var = other >> 1
+            if other_var == var or other_var in seen or level[other_var] == 0:
+                continue
+            if reason[other_var] is not None and levels & (1 << (level[other_var] & 63)):
+                seen.add(other_var)
+                stack.append(other_var)
+                added.append(other_var)
+            else:
+                for added_var in added:
+                    seen.discard(added_var)
+                return False
+    return True
+
+
+def backtrack(engine, learned_clause):
+    """Decides how far to backtrack based on the decision levels of the literals
+    present in the learned clause. The function jumps back to the second-highest
     level from where an issue has occurred.
-    
+
     Parameters:
-      decision_stack: The stack of free decisions.
-      assignment: A set showing the variables that have been currently assigned.
-      decision_levels: A dictionary that shows the decsion level where each free
-      decision was made.
+      engine: The PropagationEngine holding the decision level of every variable.
       learned_clause: The clause learned from conflict analysis.
-      
+
     Returns:
       The second-highest level from where an issue has occurred.
     """
     levels = []
-    for l in learned_clause:
-        level = decision_levels.get(abs(l), 0)
+    for code in learned_clause:
+        level = engine.level[code >> 1]
         levels.append(level)
 
     if len(levels) <= 1:
@@ -175,156 +1461,874 @@ def backtrack(decision_stack, assignment, decision_levels, learned_clause):
     return max(levels[:-1])  # second-highest level
 
 
+def clause_lbd(engine, clause):
+    """Computes the LBD (literal block distance) of a clause, the number of
+    different decision levels among its literals.
+
+    Parameters:
+      engine: The PropagationEngine holding the decision levels.
+      clause: A list of assigned literal codes.
+
+    Returns:
+      The LBD of the clause.
+    """
+    level = engine.level
+    return len({level[code >> 1] for code in clause})
+
+
+# Instrumentation. Counters are plain additions in the search loop. Timers wrap the
+# hot functions and are only installed when turned on, so they cost nothing when off.
+
+def timed(function, stats, key):
+    """Wraps a function so the time spent in it is added to stats[key].
+
+    Parameters:
+      function: The function to time.
+      stats: The statistics dictionary.
+      key: The key the seconds are added to.
+
+    Returns:
+      The wrapped function.
+    """
+    perf_counter = time.perf_counter
+    stats.setdefault(key, 0.0)
+
+    def timed_function(*args):
+        start = perf_counter()
+        try:
+            return function(*args)
+        finally:
+            stats[key] += perf_counter() - start
+    return timed_function
+
+
+class ProgressReporter:
+    """Writes a "c progress" line with the search counters at most every interval
+    seconds. It is checked every 256 conflicts, so it costs nothing in between.
+
+    Attributes:
+      interval: The seconds between two progress lines.
+      stream: The file the lines are written to (stderr by default).
+    """
+
+    def __init__(self, interval=5.0, stream=None):
+        self.interval = interval
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.next_report = self.start + interval
+
+    def check(self, engine, stats):
+        """Writes a progress line if the interval has passed."""
+        now = time.perf_counter()
+        if now < self.next_report:
+            return
+        self.next_report = now + self.interval
+        elapsed = now - self.start
+        print(f"c progress: {elapsed:.1f}s conflicts={stats['conflicts']} "
+              f"decisions={stats['decisions']} propagations={engine.propagations} "
+              f"({engine.propagations / elapsed:.0f}/s) restarts={stats['restarts']} "
+              f"learned={stats['learned_clauses']} level={engine.decision_level()}",
+              file=self.stream or sys.stderr, flush=True)
+
+
+class Budget:
+    """Limits on one search: wall-clock seconds, conflicts, propagations and peak RSS.
+    The counters are compared on every conflict and every 1024 decisions; the clock
+    and the RSS are only read on every 64th check, so an unlimited or far-away budget
+    costs a few comparisons.
+
+    Attributes:
+      time_limit: Seconds of search, None for no limit.
+      conflict_limit: Conflicts, None for no limit.
+      propagation_limit: Propagated literals, None for no limit.
+      memory_limit: Peak resident set size in MB, None for no limit.
+      exhausted: The name of the budget that ran out ('time', 'conflicts',
+      'propagations' or 'memory'), None while the search may go on.
+    """
+
+    def __init__(self, time_limit=None, conflict_limit=None, propagation_limit=None,
+                 memory_limit=None):
+        self.time_limit = time_limit
+        self.conflict_limit = conflict_limit
+        self.propagation_limit = propagation_limit
+        self.memory_limit = memory_limit if resource is not None else None
+        self.exhausted = None
+        self.checks = 0
+        self.deadline = None
+        self.max_conflicts = None
+        self.max_propagations = None
+
+    def start(self, engine, stats):
+        """Turns the limits into absolute values from the current counters. Called at
+        the start of a search, the limits hold for that search only."""
+        self.exhausted = None
+        self.checks = 0
+        if self.time_limit is not None:
+            self.deadline = time.perf_counter() + self.time_limit
+        if self.conflict_limit is not None:
+            self.max_conflicts = stats.get('conflicts', 0) + self.conflict_limit
+        if self.propagation_limit is not None:
+            self.max_propagations = engine.propagations + self.propagation_limit
+
+    def check(self, engine, stats):
+        """Returns True (and sets exhausted) if a budget has run out."""
+        if self.max_conflicts is not None and stats['conflicts'] >= self.max_conflicts:
+            self.exhausted = 'conflicts'
+        elif self.max_propagations is not None and engine.propagations >= self.max_propagations:
+            self.exhausted = 'propagations'
+        else:
+            self.checks += 1
+            if self.checks & 63:
+                return False
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                self.exhausted = 'time'
+            elif self.memory_limit is not None and peak_rss_mb() >= self.memory_limit:
+                self.exhausted = 'memory'
+            else:
+                return False
+        return True
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MB, 0 if unknown."""
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+
 # CDCL-based DPLL solver with conflict-driven clause learning and non-chronological backtracking
 
-def dpll_cdcl(clauses, assignment, decision_stack=[], decision_levels={}, level=0,
-              learned_clauses=set()):
+def dpll_cdcl(engine, heuristic=None, restart_policy=None, stats=None, learned_store=None,
+              assumptions=(), exchange=None, budget=None, timers=False, progress=None,
+              inprocessor=None):
     """Implements the dpll algorithm using a cdcl approach with conflict-driven clause learning
-    and non-chronological backtracking.
-    
+    and non-chronological backtracking. The search is an iterative loop over the trail of
+    the propagation engine: a decision opens a new level on the trail and a conflict
+    backjumps by truncating the trail, so no state is copied per decision and the
+    search depth is not limited by the recursion limit.
+
     Parameters:
-      clauses: A list of lists that represents the current state of the cnf formula.
-      assignment: A set showing the variables that have been currently assigned.
-      decision_stack: A stack of the free decisions made, implemented using a list.
-      decision_levels: A dictionary that shows the decision level where each free
-      decision was made.
-      level: An integer that shows the current decision level.
-      learned_clauses: A set of the clauses that have been learned through 
-      conflict-driven learning.
-      
+      engine: The PropagationEngine with the clauses and the current assignment.
+      heuristic: The DecisionHeuristic used to branch, MOM if not given.
+      restart_policy: The RestartPolicy deciding when to restart, never if not given.
+      stats: A dictionary where the decisions, conflicts, restarts and the learned
+      clause database size and reductions are counted.
+      learned_store: The LearnedClauseStore scoring and reducing the learned clauses.
+      assumptions: Literal codes that are decided first, one decision level each.
+      exchange: An optional clause exchange (see sat_portfolio.ClauseExchange) that is
+      offered every learned clause with export(engine, clause, lbd) and may add
+      clauses from other solvers with import_clauses(engine) after a restart.
+      budget: An optional Budget (already started), the search gives up once it is exhausted.
+      timers: If True, the seconds spent in propagate, decide and analyze are added
+      to stats as time_propagate, time_decide and time_analyze.
+      progress: An optional ProgressReporter checked every 256 conflicts.
+      inprocessor: An optional Inprocessor (see sat_inprocess.py) that may simplify the
+      clauses at level 0 after a restart.
+
     Returns:
-      assignment: A set showing the variables that satisfy the cnf formula.
-      If none is returned, then the formula is UNSAT.
+      True if the engine holds a satisfying assignment, False if the formula is UNSAT
+      under the assumptions, None if the search gave up.
     """
-    # Perform unit propagation on the current clause set and assignment
-    result = unit_propagate(clauses, assignment.copy())
+    if heuristic is None:
+        heuristic = MOMHeuristic(engine)
+    if restart_policy is None:
+        restart_policy = NoRestarts()
+    if learned_store is None:
+        learned_store = LearnedClauseStore()
+    if stats is None:
+        stats = {}
+    for key in ('decisions', 'conflicts', 'restarts', 'learned_clauses', 'reductions',
+                'deleted_clauses', 'backjump_levels', 'backjump_max'):
+        stats.setdefault(key, 0)
+    phase = engine.phase
+    propagate = engine.propagate
+    pick = heuristic.pick
+    analyze = analyze_conflict
+    if timers:
+        propagate = timed(propagate, stats, 'time_propagate')
+        pick = timed(pick, stats, 'time_decide')
+        analyze = timed(analyze, stats, 'time_analyze')
+    while True:
+        # Perform unit propagation of the newest assignments
+        conflict = propagate()
+
+        # If conflict detected during propagation
+        if conflict is not None:
+            stats['conflicts'] += 1
+            if engine.decision_level() == 0:
+                engine.ok = False
+                return False  # No more decisions to backtrack then UNSAT
 
-    # If conflict detected during propagation
-    if result is None:
-        if not decision_stack:
-            return None  # No more decisions to backtrack then UNSAT
+            learned_clause = analyze(engine, conflict, learned_store)
+            lbd = clause_lbd(engine, learned_clause)
+            heuristic.on_conflict(engine, learned_clause)
+            restart_policy.on_conflict(lbd)
+            bj_level = backtrack(engine, learned_clause)
+            distance = engine.decision_level() - bj_level
+            stats['backjump_levels'] += distance
+            if distance > stats['backjump_max']:
+                stats['backjump_max'] = distance
+            heuristic.on_backtrack(engine, bj_level)
+            engine.backtrack(bj_level)
+            learned_store.add(engine.learn(learned_clause), lbd)
+            if exchange is not None:
+                exchange.export(engine, learned_clause, lbd)
 
-        learned_clause = analyze_conflict(decision_stack)
-        clause_key = tuple(sorted(learned_clause))
+            if learned_store.should_reduce(stats['conflicts']):
+                stats['deleted_clauses'] += learned_store.reduce(engine, heuristic)
+                stats['reductions'] += 1
+            stats['learned_clauses'] = len(learned_store)
+            if budget is not None and budget.check(engine, stats):
+                return None
+            if progress is not None and not stats['conflicts'] & 255:
+                progress.check(engine, stats)
+            continue
 
-        # Avoid looping on the same learned clause
-        if clause_key in learned_clauses:
+        if restart_policy.should_restart():
+            heuristic.on_backtrack(engine, 0)
+            engine.backtrack(0)
+            restart_policy.on_restart()
+            stats['restarts'] += 1
+            if exchange is not None and not exchange.import_clauses(engine):
+                return False  # A shared clause made the formula UNSAT at level 0
+            if inprocessor is not None and inprocessor.should_run(stats) \
+                    and not inprocessor.run(engine, heuristic, learned_store, stats, assumptions):
+                return False  # Probing or substitution derived the empty clause
+            continue
+
+        # Decide the assumptions first, an assumption that is already true gets an empty level
+        level = engine.decision_level()
+        if level < len(assumptions):
+            code = assumptions[level]
+            if engine.value[code] == -1:
+                return False  # The assumptions contradict the formula
+            if engine.value[code] == 1:
+                engine.new_decision_level()
+            else:
+                engine.decide(code)
+            continue
+
+        # Choose an unassigned literal, the opposite value is forced by learning on conflict
+        code = pick(engine)
+        if code is None:
+            return True  # All clauses satisfied
+        saved = phase[code >> 1]
+        if saved:
+            code = (code & ~1) | (saved < 0)  # Phase saving, reuse the last value
+        stats['decisions'] += 1
+        if budget is not None and not stats['decisions'] & 1023 and budget.check(engine, stats):
             return None
+        engine.decide(code)
 
-        learned_clauses.add(clause_key)
-        clauses.append(learned_clause)
-        bj_level = backtrack(decision_stack, assignment, decision_levels, learned_clause)
-
-        # Backtrack state
-        new_assignment = set()
-        new_decision_stack = []
-        new_decision_levels = {}
-        for lit in assignment:
-            level_lit = decision_levels.get(abs(lit), 0)
-            if level_lit <= bj_level:
-                new_assignment.add(lit)
-                new_decision_levels[abs(lit)] = level_lit
-
-        for lit in decision_stack:
-            if decision_levels.get(abs(lit), 0) <= bj_level:
-                new_decision_stack.append(lit)
-
-        # Try assigning learned clause
-        if not learned_clause:
-            return None  # return none if there is nothing to learn
-
-        new_lit = learned_clause[0]
-        new_assignment.add(new_lit)
-        new_decision_stack.append(new_lit)
-        new_decision_levels[abs(new_lit)] = bj_level + 1
-
-        # Recurse with updated state
-        return dpll_cdcl(clauses, new_assignment, new_decision_stack, new_decision_levels,
-                         bj_level + 1, learned_clauses)
-
-    clauses, assignment = result
-
-    if not clauses:
-        return assignment  # All clauses satisfied
-
-    # Choose an unassigned literal and try both True and False assignments (decision branching)
-    lit = decide_literal(clauses, assignment)
-
-
-    if lit == None:
-        return assignment
-    if lit not in assignment and -lit not in assignment:
-        for val in [lit, -lit]:
-            new_assignment = set(assignment)
-            new_assignment.add(val)
-            new_clauses = simplify(clauses, val)
-            if new_clauses is None:
-                continue
-            new_stack = decision_stack + [val]
-            new_levels = dict(decision_levels)
-            new_levels[abs(val)] = level + 1
-            result = dpll_cdcl(new_clauses, new_assignment, new_stack, new_levels,
-                               level + 1, learned_clauses.copy())
-            if result is not None:
-                return result
-        return None
-    return assignment
+
+PHASES = ('heuristic', 'true', 'false', 'random')
+
+
+class Solver:
+    """In-process SAT solver. Clauses are added with add_clause (or taken over from a
+    parsed ClauseArena), solve() runs the CDCL search and model() and stats() read
+    the result, so many formulas can be solved in one process without going through
+    the command line and stdout.
+
+    The solver is incremental: clauses can be added between solve() calls, the
+    assumptions only hold for one call, and the learned clauses, heuristic scores,
+    saved phases and restart schedule are kept from one call to the next. When a
+    call is UNSAT because of its assumptions, core() returns the assumptions that
+    were needed for the contradiction.
+
+    Example:
+      solver = Solver()
+      solver.add_clause([1, -2])
+      solver.add_clause([2, 3])
+      if solver.solve(assumptions=[-1]):
+          print(solver.model())
+      if not solver.solve(assumptions=[-2, -3]):
+          print(solver.core())  # [-3, -2] or a subset
+
+    Attributes:
+      engine: The PropagationEngine with the clauses.
+      heuristic_name: The name of the decision heuristic, a key of HEURISTICS.
+      restart_name: The name of the restart policy, a key of RESTART_POLICIES.
+      phase: The first value tried for a variable that was never assigned, one of
+      PHASES ('heuristic' leaves it to the decision heuristic).
+      seed: Seed for random tie-breaking, initial activities and 'random' phases.
+      exchange: Clause exchange passed to dpll_cdcl, None when solving alone.
+      timers: If True, the time spent in propagate, decide and analyze is measured.
+      progress: A ProgressReporter for long solves, None for no progress lines.
+      proof: A DratWriter the learned and deleted clauses are logged to, None for no proof.
+      inprocessor: The Inprocessor of sat_inprocess.py if inprocess (its share of the
+      search time, e.g. 0.1) is given, None otherwise. It rewrites the clauses of the
+      arena, so pass a copy of an arena that is still needed.
+    """
+
+    def __init__(self, num_vars=0, arena=None, heuristic='mom', restart='luby',
+                 phase='heuristic', seed=None, timers=False, progress=None, proof=None,
+                 inprocess=None):
+        if heuristic not in HEURISTICS:
+            raise ValueError(f"Unknown heuristic '{heuristic}'")
+        if restart not in RESTART_POLICIES:
+            raise ValueError(f"Unknown restart policy '{restart}'")
+        if phase not in PHASES:
+            raise ValueError(f"Unknown phase '{phase}'")
+        self.engine = PropagationEngine(num_vars, arena)
+        self.engine.proof = proof
+        self.proof = proof
+        self.heuristic_name = heuristic
+        self.restart_name = restart
+        self.phase = phase
+        self.seed = seed
+        self.timers = timers
+        self.progress = progress
+        self.exchange = None
+        self.inprocessor = None
+        if inprocess:
+            from sat_inprocess import Inprocessor
+            self.inprocessor = Inprocessor(inprocess)
+        self.heuristic = None
+        self.restart_policy = RESTART_POLICIES[restart]()
+        self.learned_store = LearnedClauseStore()
+        self._stats = {}
+        self._model = None
+        self._core = None
+
+    @property
+    def num_vars(self):
+        """The highest variable of the formula."""
+        return self.engine.num_vars
+
+    def add_clause(self, clause):
+        """Adds a clause to the formula.
+
+        Parameters:
+          clause: An iterable of DIMACS literals (non-zero integers).
+
+        Returns:
+          False if the formula is now known to be UNSAT, otherwise True.
+        """
+        self._backtrack_to_root()
+        clause = list(clause)
+        if self.inprocessor is not None:
+            substituted = self.inprocessor.substitute_lits(clause)
+            if substituted != clause and self.proof is not None:
+                codes = normalize_clause([encode_lit(lit) for lit in substituted])
+                if codes is not None:
+                    self.proof.add(codes)  # RUP through the implications of the equivalences
+            clause = substituted
+        return self.engine.add_clause(clause)
+
+    def _backtrack_to_root(self):
+        """Undoes the assignment of the last solve() call down to decision level 0."""
+        if self.heuristic is not None:
+            self.heuristic.on_backtrack(self.engine, 0)
+        self.engine.backtrack(0)
+
+    def solve(self, assumptions=None, conflict_limit=None, budget=None):
+        """Searches for a satisfying assignment.
+
+        Parameters:
+          assumptions: DIMACS literals that must be true in the model, for this call only.
+          conflict_limit: The number of conflicts after which this call gives up. With a
+          budget the smaller of the two conflict limits applies, the budget is not changed.
+          budget: A Budget for this call, stats() names the exhausted budget as
+          'budget_exhausted' when the call gives up.
+
+        Returns:
+          True if the formula is SAT under the assumptions, False if it is UNSAT, None
+          if the conflict limit or the budget ran out first (UNKNOWN).
+        """
+        engine = self.engine
+        self._backtrack_to_root()
+        self._model = None
+        self._core = []
+        if not engine.ok:
+            self._log_empty_clause()
+            return False
+        assumptions = assumptions or ()
+        if self.inprocessor is not None:
+            assumptions = self.inprocessor.substitute_lits(assumptions)
+            self.inprocessor.start()
+        codes = [encode_lit(lit) for lit in assumptions]
+        engine.ensure_vars(max(codes, default=0) >> 1)
+        if self.heuristic is None:
+            self.heuristic = HEURISTICS[self.heuristic_name](engine, self.seed)
+        else:
+            self.heuristic.on_new_vars(engine)
+        self._init_phases()
+        start = time.perf_counter()
+        self._stats['solves'] = self._stats.get('solves', 0) + 1
+        if conflict_limit is not None:
+            if budget is None:
+                budget = Budget(conflict_limit=conflict_limit)
+            else:
+                # A local Budget, so the caller's can be reused with its own limits
+                if budget.conflict_limit is not None:
+                    conflict_limit = min(conflict_limit, budget.conflict_limit)
+                budget = Budget(budget.time_limit, conflict_limit, budget.propagation_limit,
+                                budget.memory_limit)
+        if budget is not None:
+            budget.start(engine, self._stats)
+        self._stats.pop('budget_exhausted', None)
+        result = dpll_cdcl(engine, self.heuristic, self.restart_policy, self._stats,
+                           self.learned_store, codes, self.exchange, budget,
+                           self.timers, self.progress, self.inprocessor)
+        self._stats['propagations'] = engine.propagations
+        self._stats['time_solve'] = self._stats.get('time_solve', 0.0) + time.perf_counter() - start
+        if result:
+            self._model = [var if engine.model_value(var) == 1 else -var
+                           for var in range(1, engine.num_vars + 1)]
+            if self.inprocessor is not None:
+                self._model = self.inprocessor.extend_model(self._model)
+        elif result is None:
+            self._core = None
+            self._stats['budget_exhausted'] = budget.exhausted
+        elif not engine.ok:
+            self._log_empty_clause()
+        elif engine.decision_level() < len(codes):
+            # The search stopped at the assumption of the current level, it was false
+            failed = codes[engine.decision_level()]
+            self._core = [decode_lit(code) for code in analyze_final(engine, failed)]
+        return result
+
+    def _log_empty_clause(self):
+        """Ends the DRAT proof with the empty clause once the formula is UNSAT."""
+        if self.proof is not None:
+            self.proof.add([])
+
+    def _init_phases(self):
+        """Sets the phase of every variable that was never assigned from self.phase."""
+        if self.phase == 'heuristic':
+            return
+        phase = self.engine.phase
+        rng = random.Random(self.seed)
+        for var in range(1, len(phase)):
+            if not phase[var]:
+                if self.phase == 'random':
+                    phase[var] = rng.choice((1, -1))
+                else:
+                    phase[var] = 1 if self.phase == 'true' else -1
+
+    def model(self):
+        """Returns the model of the last successful solve() as a list of DIMACS
+        literals, one per variable in order, or None if the last call was not SAT.
+        Variables left unassigned by the search are reported as false."""
+        return self._model
+
+    def core(self):
+        """Returns the failed assumptions of the last solve() call as DIMACS literals:
+        a subset of its assumptions that cannot all be true. It is empty if the
+        formula is UNSAT without assumptions, and None if the last call was not UNSAT.
+        With inprocessing, an assumption on a substituted variable is reported as its
+        representative literal."""
+        return None if self._model is not None else self._core
+
+    def stats(self):
+        """Returns a copy of the search statistics, summed over every solve() call.
+        Counters are always kept, the time_propagate/decide/analyze timers only with
+        timers=True."""
+        return dict(self._stats)
 
 
-def solve_dimacs_cnf(dimacs_text):
+def solve_dimacs_cnf(dimacs_text, heuristic='mom', restart='luby', show_stats=False):
     """Solving dimacs formatted input
-    
+
     Parameters:
       dimacs_text: The content of the cnf file.
-      
+      heuristic: The name of the decision heuristic, a key of HEURISTICS.
+      restart: The name of the restart policy, a key of RESTART_POLICIES.
+      show_stats: If True, the search statistics are printed as "c" comment lines.
+
+    Returns:
+      True if the formula is SAT, otherwise False.
+    """
+    arena, num_vars = parse_dimacs(dimacs_text, as_arena=True)
+    solver = Solver(num_vars, arena, heuristic, restart)
+    result = solver.solve()
+    print_result(result, solver.model(), solver.stats() if show_stats else None)
+    return result
+
+
+BACKENDS = ('python', 'numpy')
+
+
+def verify_model(arena, model, num_clauses=None, backend='python'):
+    """Checks a model against the clauses of a formula in time linear in its size.
+
+    Parameters:
+      arena: The ClauseArena of the formula.
+      model: The model as DIMACS literals (see Solver.model).
+      num_clauses: Only the first num_clauses clauses are checked, e.g. the original
+      clauses of an arena a solver has added learned clauses to. None checks all.
+      backend: 'python', or 'numpy' for the vectorized check of sat_numpy.py.
+
+    Returns:
+      The index of the first clause the model does not satisfy, None if it satisfies
+      every clause.
+    """
+    if backend == 'numpy':
+        import sat_numpy
+        return sat_numpy.verify_model(arena, model, num_clauses)
+    if num_clauses is None:
+        num_clauses = len(arena)
+    lits = arena.lits
+    true_codes = bytearray(max(max(lits, default=0) + 1, 2 * len(model) + 2))
+    for lit in model:
+        code = encode_lit(lit)
+        if code < len(true_codes):
+            true_codes[code] = 1
+    # One byte per literal position, 1 where the literal is true in the model
+    truth = bytes(map(true_codes.__getitem__, lits))
+    for index, start, size in zip(range(num_clauses), arena.offsets, arena.sizes):
+        if size and 1 not in truth[start:start + size]:
+            return index
+    return None
+
+
+OUTPUT_FORMATS = ('ece', 'competition', 'json')
+RESULT_WORDS = {True: ('SAT', 'SATISFIABLE'), False: ('UNSAT', 'UNSATISFIABLE'),
+                None: ('UNKNOWN', 'UNKNOWN')}
+
+
+def print_result(result, model, stats=None, output_format='ece', stream=None, chunk_size=1 << 14):
+    """Printing the result of a solve. The model is written in chunks of chunk_size
+    variables, so the output of a formula with millions of variables is never built
+    as one string.
+
+    Formats:
+      ece: RESULT:SAT and ASSIGNMENT:1=0 2=1 ... (the ECE51216 output format).
+      competition: SAT competition "s SATISFIABLE" and "v 1 -2 ... 0" lines.
+      json: One object {"result": ..., "model": [...], "stats": {...}}.
+
+    Parameters:
+      result: True if the formula is SAT, False if UNSAT, None if a budget ran out.
+      model: The model as DIMACS literals, one per variable (see Solver.model).
+      stats: If given, the search statistics are printed ("c" comment lines or a
+      "stats" member for json).
+      output_format: One of OUTPUT_FORMATS.
+      stream: The file to write to, sys.stdout by default.
+      chunk_size: The number of variables formatted per write.
+
     Returns:
       None
     """
-    clauses, num_vars = parse_dimacs(dimacs_text)
-    result = dpll_cdcl(clauses, set())
-    if result is None:
-        print("RESULT:UNSAT")
+    if stream is None:
+        stream = sys.stdout
+    short_word, long_word = RESULT_WORDS[result]
+    model = model if result else ()
+    if output_format == 'json':
+        stream.write(f'{{"result": "{short_word}"')
+        if result:
+            stream.write(', "model": [')
+            for start in range(0, len(model), chunk_size):
+                values = ', '.join(map(str, model[start:start + chunk_size]))
+                stream.write((', ' if start else '') + values)
+            stream.write(']')
+        if stats is not None:
+            stream.write(', "stats": ' + json.dumps(stats))
+        stream.write('}\n')
+        return
+    if output_format == 'competition':
+        stream.write(f"s {long_word}\n")
+        chunk_size = max(10, chunk_size - chunk_size % 10)  # Whole v lines of 10 literals
+        for start in range(0, len(model), chunk_size):
+            chunk = model[start:start + chunk_size]
+            stream.write(''.join('v ' + ' '.join(map(str, chunk[line:line + 10])) + '\n'
+                                 for line in range(0, len(chunk), 10)))
+        if result:
+            stream.write("v 0\n")
     else:
-        print("RESULT:SAT")
-        assignment_output = []
-        for var in range(1, num_vars + 1):
-            value = 1 if var in result else 0
-            assignment_output.append(f"{var}={value}")
-        print("ASSIGNMENT:" + " ".join(assignment_output))
+        stream.write(f"RESULT:{short_word}\n")
+        if result:
+            stream.write("ASSIGNMENT:")
+            for start in range(0, len(model), chunk_size):
+                stream.write((' ' if start else '') + ' '.join(
+                    [f"{abs(lit)}={1 if lit > 0 else 0}" for lit in model[start:start + chunk_size]]))
+            stream.write("\n")
+    if stats is not None:
+        print_stats(stats, stream)
+
+
+def print_stats(stats, stream=None):
+    """Printing the statistics as a block of "c" comment lines, seconds with 6 decimals
+
+    Parameters:
+      stats: The statistics dictionary (see Solver.stats).
+      stream: The file to write to, sys.stdout by default.
+
+    Returns:
+      None
+    """
+    print("c ---- statistics ----", file=stream)
+    for key, value in stats.items():
+        if isinstance(value, float):
+            value = f"{value:.6f}"
+        print(f"c {key}: {value}", file=stream)
 
 
 # --- Main Entry Point ---
 # Random CNF Generator
-def generate_random_3sat(num_vars=50, num_clauses=200):
+def generate_random_ksat(num_vars, num_clauses, k=3, seed=None, planted=False):
+    """Generates a uniform random k-SAT formula: every clause has k distinct variables
+    with random signs. With planted=True a hidden assignment is drawn first and clauses
+    it falsifies are redrawn, so the formula is satisfiable at any clause/variable ratio.
+    sat_numpy.generate_random_ksat is a vectorized version for large formulas.
+
+    Parameters:
+      num_vars: The number of variables.
+      num_clauses: The number of clauses.
+      k: The number of literals per clause.
+      seed: Seed of the random generator, the same seed gives the same formula.
+      planted: If True, only clauses satisfied by a hidden assignment are kept.
+
+    Returns:
+      The clauses as lists of DIMACS literals.
+    """
+    if not 0 < k <= num_vars:
+        raise ValueError(f"k must be between 1 and the number of variables, got {k}")
+    rng = random.Random(seed)
+    hidden = [rng.getrandbits(1) for _ in range(num_vars + 1)] if planted else None
+    population = range(1, num_vars + 1)
+    sample = rng.sample
+    getrandbits = rng.getrandbits
     clauses = []
-    for _ in range(num_clauses):
-        clause = set()
-        while len(clause) < 3:
-            var = random.randint(1, num_vars)
-            lit = var if random.random() < 0.5 else -var
-            clause.add(lit)
-        clauses.append(" ".join(map(str, clause)) + " 0")
+    while len(clauses) < num_clauses:
+        signs = getrandbits(k)
+        clause = [-var if signs >> i & 1 else var for i, var in enumerate(sample(population, k))]
+        if hidden is not None and all(hidden[abs(lit)] == (lit < 0) for lit in clause):
+            continue  # Falsified by the hidden assignment
+        clauses.append(clause)
+    return clauses
+
+
+def generate_random_3sat(num_vars=50, num_clauses=200, seed=None):
+    """Generates a random 3-SAT formula (see generate_random_ksat) as DIMACS text."""
+    clauses = generate_random_ksat(num_vars, num_clauses, 3, seed)
     header = f"p cnf {num_vars} {num_clauses}"
-    return "\n".join(["c Random 3-SAT benchmark"] + [header] + clauses)
+    return "\n".join(["c Random 3-SAT benchmark", header]
+                     + [" ".join(map(str, clause)) + " 0" for clause in clauses])
 
 if __name__ == "__main__":
     start = time.time()
 
-    if len(sys.argv) == 2:
-        filepath = sys.argv[1]
+    parser = argparse.ArgumentParser(description="CDCL SAT solver for DIMACS CNF files.")
+    parser.add_argument('cnf_file', nargs='?',
+                        help="DIMACS CNF file (optionally .gz/.xz/.bz2), a random 3-SAT "
+                             "instance is used if omitted")
+    parser.add_argument('--heuristic', choices=sorted(HEURISTICS), default='mom',
+                        help="decision heuristic (default: mom)")
+    parser.add_argument('--restart', choices=sorted(RESTART_POLICIES), default='luby',
+                        help="restart policy (default: luby)")
+    parser.add_argument('--phase', choices=PHASES, default='heuristic',
+                        help="first value tried for a variable (default: heuristic)")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed for random tie-breaking, activities and phases")
+    parser.add_argument('--portfolio', type=int, default=0, metavar='N',
+                        help="solve with N worker processes using different configurations, "
+                             "the first result wins")
+    parser.add_argument('--cube-and-conquer', type=int, default=0, metavar='N',
+                        help="split the formula into cubes with a MOM lookahead and solve them "
+                             "with N worker processes")
+    parser.add_argument('--initial-cubes', type=int, default=None, metavar='K',
+                        help="number of cubes of the first split (default: 8 per worker)")
+    parser.add_argument('--resplit-conflicts', type=int, default=5000, metavar='C',
+                        help="conflicts spent on a cube before it is split again (default: 5000)")
+    parser.add_argument('--preprocess', action='store_true',
+                        help="simplify the formula before search (units, pure literals, "
+                             "subsumption, strengthening, variable elimination)")
+    parser.add_argument('--inprocess', action='store_true',
+                        help="simplify the clauses at level 0 between restarts (equivalent-literal "
+                             "substitution, failed-literal probing)")
+    parser.add_argument('--inprocess-fraction', type=float, default=0.1, metavar='F',
+                        help="share of the search time inprocessing may use (default: 0.1)")
+    parser.add_argument('--stats', action='store_true',
+                        help="print search statistics and timers as 'c' comment lines")
+    parser.add_argument('--stats-json', metavar='FILE',
+                        help="write search statistics and timers as JSON to FILE ('-' for stdout)")
+    parser.add_argument('--progress', type=float, default=None, metavar='SECONDS',
+                        help="write a 'c progress' line to stderr every SECONDS during the search")
+    parser.add_argument('--time-limit', type=float, default=None, metavar='SECONDS',
+                        help="give up with RESULT:UNKNOWN after SECONDS of search")
+    parser.add_argument('--conflict-limit', type=int, default=None, metavar='N',
+                        help="give up with RESULT:UNKNOWN after N conflicts")
+    parser.add_argument('--propagation-limit', type=int, default=None, metavar='N',
+                        help="give up with RESULT:UNKNOWN after N propagated literals")
+    parser.add_argument('--memory-limit', type=float, default=None, metavar='MB',
+                        help="give up with RESULT:UNKNOWN once the peak RSS reaches MB")
+    parser.add_argument('--output', choices=OUTPUT_FORMATS, default='ece',
+                        help="output format: ece (RESULT/ASSIGNMENT lines), competition (s/v lines) "
+                             "or json (default: ece)")
+    parser.add_argument('--backend', choices=BACKENDS, default='python',
+                        help="evaluation backend of the model check and the cube lookahead, "
+                             "numpy needs NumPy (default: python)")
+    parser.add_argument('--verify', action='store_true',
+                        help="check a SAT model against the original clauses before printing it")
+    parser.add_argument('--proof', metavar='FILE',
+                        help="write a DRAT proof of unsatisfiability to FILE")
+    parser.add_argument('--binary-proof', action='store_true',
+                        help="write the proof in binary DRAT instead of text DRAT")
+    parser.add_argument('--check-proof', action='store_true',
+                        help="check the proof with the forward checker of sat_proof.py after an "
+                             "UNSAT result")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="do not look up or store the verdict in the result cache of sat_cache.py")
+    parser.add_argument('--cache-dir', default=None, metavar='DIR',
+                        help="result cache directory (default: $SAT_CACHE_DIR or "
+                             "~/.cache/sat_solver_h_MOM)")
+    parser.add_argument('--cache-size', type=float, default=512, metavar='MB',
+                        help="size limit of the result cache, least recently used entries go first "
+                             "(default: 512)")
+    args = parser.parse_args()
+    if args.proof and (args.portfolio or args.cube_and_conquer):
+        parser.error("--proof only works with the sequential solver")
+    if args.inprocess and (args.portfolio or args.cube_and_conquer):
+        parser.error("--inprocess only works with the sequential solver")
+    if args.inprocess and not 0 < args.inprocess_fraction < 1:
+        parser.error("--inprocess-fraction must be between 0 and 1")
+    if args.check_proof and not args.proof:
+        parser.error("--check-proof needs --proof")
+    if args.backend == 'numpy':
+        try:
+            import sat_numpy
+        except ImportError:
+            parser.error("--backend numpy needs NumPy (pip install numpy)")
+    timers = args.stats or args.stats_json is not None
+    budget_limits = {'time_limit': args.time_limit, 'conflict_limit': args.conflict_limit,
+                     'propagation_limit': args.propagation_limit, 'memory_limit': args.memory_limit}
+    budget = Budget(**budget_limits) if any(v is not None for v in budget_limits.values()) else None
+
+    cache = cache_key = cached = None
+    if args.cnf_file is not None and not args.no_cache:
+        from sat_cache import ResultCache, canonical_key, file_key
+        if ResultCache.enabled():
+            try:
+                cache = ResultCache(args.cache_dir, args.cache_size)
+            except OSError as error:
+                # stderr, so --output json stays valid
+                print(f"c cache: disabled, {error}", file=sys.stderr)
+
+    if args.cnf_file is not None:
+        filepath = args.cnf_file
         if not os.path.exists(filepath):
             print(f"Error: File '{filepath}' not found.")
             sys.exit(1)
-        with open(filepath, 'r') as f:
-            dimacs_text = f.read()
+        parse_start = time.perf_counter()
+        arena = None
+        if cache is not None:
+            # A file seen before is found by its bytes, without parsing it
+            content_key = file_key(filepath)
+            cache_key = cache.resolve(content_key)
+            if cache_key is not None:
+                cached = cache.lookup(cache_key, args.proof)
+                formula = cache.load_formula(cache_key)
+                if formula is not None:
+                    arena, num_vars = formula
+        if arena is None:
+            try:
+                arena, num_vars = parse_dimacs_file(filepath)
+            except (ValueError, OSError, EOFError) as error:
+                print(f"Error: Could not parse '{filepath}': {error}")
+                sys.exit(1)
+            if cache is not None:
+                # A renamed or reordered copy of a cached formula is found by its clause set
+                cache_key = canonical_key(arena, num_vars)
+                cache.link(content_key, cache_key)
+                cached = cached or cache.lookup(cache_key, args.proof)
+                cache.store_formula(cache_key, arena, num_vars)
     else:
         print("[Info] Using random generated variables, no CNF file")
         dimacs_text = generate_random_3sat(200, 800)
+        parse_start = time.perf_counter()
+        arena, num_vars = parse_dimacs(dimacs_text, as_arena=True)
+    time_parse = time.perf_counter() - parse_start
+    # The solver only appends learned clauses, the first num_clauses stay the original ones
+    original_arena, num_clauses = arena, len(arena)
 
-    solve_dimacs_cnf(dimacs_text)
+    proof = None
+    if args.proof and cached is None:
+        from sat_proof import DratWriter
+        proof = DratWriter(args.proof, binary=args.binary_proof)
+
+    preprocessor = None
+    if args.preprocess and cached is None:
+        from sat_preprocess import Preprocessor
+        preprocess_start = time.perf_counter()
+        preprocessor = Preprocessor.from_arena(arena, num_vars, proof=proof)
+        preprocessor.run()
+        arena = preprocessor.to_arena()
+        preprocessor.stats['time_preprocess'] = time.perf_counter() - preprocess_start
+
+    if cached is not None:
+        result, model = cached  # Neither parsed nor solved again
+        stats = {}
+    elif args.cube_and_conquer:
+        from sat_cube import solve_cubes
+        result, model, stats = solve_cubes(arena, num_vars, args.cube_and_conquer,
+                                           args.initial_cubes, args.resplit_conflicts,
+                                           budget_limits=budget_limits, backend=args.backend)
+    elif args.portfolio:
+        from sat_portfolio import solve_portfolio
+        result, model, stats = solve_portfolio(arena, num_vars, args.portfolio, budget_limits)
+    else:
+        progress = ProgressReporter(args.progress) if args.progress else None
+        if args.inprocess and arena is original_arena:
+            arena = arena.copy()  # Inprocessing rewrites clauses, the checks need the originals
+        solver = Solver(num_vars, arena, args.heuristic, args.restart, args.phase, args.seed,
+                        timers, progress, proof, args.inprocess_fraction if args.inprocess else None)
+        result = solver.solve(budget=budget)
+        model, stats = solver.model(), solver.stats()
+    stats['time_parse'] = time_parse
+    if cache is not None:
+        stats['cache'] = 'hit' if cached is not None else 'miss'
+    proof_message = None
+    if proof is not None:
+        proof.close()
+        stats['proof_added'] = proof.added
+        stats['proof_deleted'] = proof.deleted
+    if args.check_proof and result is False:
+        from sat_proof import check_drat, read_drat
+        check_start = time.perf_counter()
+        # The solver only appended learned clauses to the original ones
+        original_clauses = [original_arena.literals(index) for index in range(num_clauses)]
+        if original_arena.empty:
+            original_clauses.append([])
+        verified, proof_message = check_drat(original_clauses, read_drat(args.proof))
+        stats['time_proof_check'] = time.perf_counter() - check_start
+        stats['proof_verified'] = verified
+        if not verified:
+            proof_message = f'NOT VERIFIED, {proof_message}'
+    if preprocessor is not None:
+        stats.update(preprocessor.stats)
+        if result:
+            model = preprocessor.extend_model(model)
+    model_message = None
+    if args.verify and result:
+        verify_start = time.perf_counter()
+        falsified = verify_model(original_arena, model, num_clauses, args.backend)
+        stats['time_verify'] = time.perf_counter() - verify_start
+        stats['model_verified'] = falsified is None
+        model_message = 'VERIFIED' if falsified is None else \
+            f'NOT VERIFIED, clause {falsified + 1} is not satisfied'
+    if cache is not None and cached is None and result is not None \
+            and stats.get('model_verified') is not False and stats.get('proof_verified') is not False:
+        cache.store_result(cache_key, result, model, args.proof if proof is not None else None)
+    stats['time_total'] = time.time() - start
+    # Partial statistics are always shown when a budget ran out
+    print_result(result, model, stats if args.stats or result is None else None, args.output)
+    if args.output != 'json':
+        if model_message is not None:
+            print(f"c model: {model_message}")
+        if proof_message is not None:
+            print(f"c proof: {proof_message}")
+    if args.stats_json == '-':
+        print(json.dumps(stats))
+    elif args.stats_json:
+        with open(args.stats_json, 'w') as stats_file:
+            json.dump(stats, stats_file, indent=2)
+
+    if stats.get('model_verified') is False or stats.get('proof_verified') is False:
+        sys.exit(1)
 
     end = time.time()
 
     #Uncomment line below to output runtime
     #print(f"Runtime: {end - start:.6f} seconds")
-
@@ -91,17 +91,21 @@ def simplify(clauses, lit):
     return new_clauses
 
 
-def find_pure_literals(clauses):
+def find_pure_literals(clauses, backend='python'):
     """Implements pure literal elimination. Pure literals are assigned to true.
     Pure literals are those that occur only in complemented or only in 
     uncomplemented form.
     
     Parameters:
       clauses: A list of lists that represents the current state of the cnf formula.
+      backend: 'python', or 'numpy' to find them with the vectorized code of sat_numpy.py.
       
     Returns:
       pure: The set of pure literals
     """
+    if backend == 'numpy':
+        import sat_numpy
+        return sat_numpy.pure_literals(clauses)
     counts = {}
     for clause in clauses:
         for lit in clause:
@@ -113,12 +117,13 @@ def find_pure_literals(clauses):
     return pure
 
 
-def dpll(clauses, assignment):
+def dpll(clauses, assignment, backend='python'):
     """Implements the dpll algorithm.
     
     Parameters:
       clauses: A list of lists that represents the current state of the cnf formula.
       assignment: A set showing the variables that have been currently assigned.
+      backend: The backend of find_pure_literals, 'python' or 'numpy'.
       
     Returns:
       assignment: A set showing the variables that satisfy the cnf formula.
@@ -132,7 +137,7 @@ def dpll(clauses, assignment):
     if not clauses:
         return assignment
 
-    pure_literals = find_pure_literals(clauses)
+    pure_literals = find_pure_literals(clauses, backend)
     for lit in pure_literals:
         assignment.add(lit)
         clauses = simplify(clauses, lit)
@@ -147,24 +152,25 @@ def dpll(clauses, assignment):
                     new_assignment.add(value)
                     new_clauses = simplify(clauses, value)
                     if new_clauses is not None:
-                        result = dpll(new_clauses, new_assignment)
+                        result = dpll(new_clauses, new_assignment, backend)
                         if result is not None:
                             return result
                 return None
     return assignment
 
 
-def solve_dimacs_cnf(dimacs_text):
+def solve_dimacs_cnf(dimacs_text, backend='python'):
     """Solving dimacs formatted input
     
     Parameters:
       dimacs_text: The content of the cnf file.
+      backend: The backend of find_pure_literals, 'python' or 'numpy'.
       
     Returns:
       None
     """
     clauses, num_vars = parse_dimacs(dimacs_text)
-    result = dpll(clauses, set())
+    result = dpll(clauses, set(), backend)
     if result is None:
         print("RESULT:UNSAT")
     else:
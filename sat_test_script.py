@@ -1,77 +1,531 @@
 # This program is used to test if a SAT solver works correctly and how efficient it is.
-# To run this test script, the runtime must be uncommented in the sat solver file code.
-# The test_folder variable should be changed to the name of the folder, 
-# the correct_result variable should be changed to SAT or UNSAT, and the test_solver variable 
-# should be changed to the file name of the sat solver being tested. All cnf flies in the folder
-# should have the same satisfiability. This program prints the number of cases tested,
-# average runtime, max runtime, min runtime, and any cases that produced an incorrect result.
+# Every cnf file in the given folders is solved by the sat solver in its own subprocess,
+# with up to --jobs instances running in parallel, each under a wall-time timeout and an
+# optional memory limit. The expected result of a folder can be given as FOLDER=SAT or
+# FOLDER=UNSAT; otherwise it is inferred per file from the uf/uuf prefix of its name.
+# This program prints the number of cases tested, p50/p90/max runtimes, the PAR-2 score
+# and the cases that produced an incorrect result, timed out or failed, per folder and
+# overall. The same data can be written as JSON and CSV for further analysis.
+# A solver that gives up with RESULT:UNKNOWN (e.g. --time-limit) counts as a timeout.
+# With --in-process the pool workers call the Solver class of sat_solver_h_MOM.py directly
+# instead of starting a new interpreter per instance.
+# Every SAT answer is checked against the clauses of the cnf file (in linear time, outside
+# of the measured runtime), a model that falsifies a clause counts as an invalid model;
+# --no-verify turns the check off. The result cache of the solver is turned off
+# (SAT_CACHE=off) so every instance is really solved.
+# With --check-proofs every UNSAT answer must come with a DRAT proof that the forward
+# checker of sat_proof.py verifies, otherwise the case counts as an unverified proof.
+# If --parse-benchmark is given, the parse time of that (large, possibly compressed) CNF
+# file is measured in-process as well.
 
 
+import argparse
+import csv
+import json
+import os
+import signal
 import subprocess
-from pathlib import Path
+import sys
+import tempfile
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Memory limits are only available on POSIX systems
+    resource = None
+
+from sat_proof import DratWriter, check_proof_file
+from sat_solver_h_MOM import Budget, Solver, parse_dimacs_file, verify_model
+
+
+# Default configurations
+default_folders = ['UUF50.218.1000']  # Folders with the files in cnf format used for testing
+default_solver = 'sat_solver_h_MOM.py'  # File name of the sat solver being tested
+default_timeout = 60.0  # Seconds per instance; timeouts count as 2 * timeout for PAR-2
+CNF_SUFFIXES = ('.cnf', '.cnf.gz', '.cnf.xz', '.cnf.bz2')
+
+
+def infer_expected(name):
+    """Infers the expected result from a SATLIB style file or folder name.
+
+    Parameters:
+      name: File or folder name, e.g. uf50-01.cnf or UUF50.218.1000
+
+    Returns:
+      'UNSAT' for uuf names, 'SAT' for uf names, None if unknown
+    """
+    name = name.lower()
+    if name.startswith('uuf'):
+        return 'UNSAT'
+    if name.startswith('uf'):
+        return 'SAT'
+    return None
+
+
+def collect_instances(folder_specs):
+    """Lists the cnf files of each folder together with their expected result.
+
+    Parameters:
+      folder_specs: Folder names, optionally suffixed with =SAT or =UNSAT
+
+    Returns:
+      List of (folder, file path, expected result or None) tuples
+    """
+    instances = []
+    for spec in folder_specs:
+        folder, _, expected = spec.partition('=')
+        expected = expected.upper() or None
+        if expected not in (None, 'SAT', 'UNSAT'):
+            raise ValueError(f"Expected result for '{folder}' must be SAT or UNSAT, got '{expected}'")
+        path = Path(folder)
+        if not path.is_dir():
+            raise ValueError(f"Folder '{folder}' not found")
+        for file_path in sorted(path.iterdir()):
+            if file_path.is_file() and file_path.name.lower().endswith(CNF_SUFFIXES):
+                file_expected = expected or infer_expected(file_path.name) or infer_expected(path.name)
+                instances.append((folder, file_path, file_expected))
+    return instances
+
+
+def memory_limiter(memory_limit_mb):
+    """Builds a preexec function that caps the address space of a solver subprocess.
+
+    Parameters:
+      memory_limit_mb: Limit in megabytes, or None for no limit
+
+    Returns:
+      Function to run in the child before exec, or None
+    """
+    if not memory_limit_mb or resource is None:
+        return None
+    limit = int(memory_limit_mb * 1024 * 1024)
+
+    def limit_memory():
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    return limit_memory
+
+
+def limit_worker_memory(memory_limit_mb):
+    """Caps the address space of an in-process pool worker, run once when the worker starts.
+
+    Parameters:
+      memory_limit_mb: Limit in megabytes, or None for no limit
+
+    Returns:
+      None
+    """
+    limit_memory = memory_limiter(memory_limit_mb)
+    if limit_memory is not None:
+        limit_memory()
+
+
+def raise_timeout(signum, frame):
+    raise TimeoutError
+
+
+def new_proof_path():
+    """Creates an empty temporary file for a DRAT proof and returns its path."""
+    handle, proof_path = tempfile.mkstemp(suffix='.drat')
+    os.close(handle)
+    return proof_path
+
+
+def parse_solver_output(output):
+    """Reads the result and model from the output of the solver script, in the ECE51216
+    format (RESULT/ASSIGNMENT), the SAT competition format (s/v lines) or as json.
+
+    Parameters:
+      output: The stdout of the solver
+
+    Returns:
+      (result, model) where result is 'SAT', 'UNSAT', 'UNKNOWN' or None if there was no
+      result line, and model is a list of DIMACS literals or None
+    """
+    actual_result = None
+    model = None
+    competition_words = {'SATISFIABLE': 'SAT', 'UNSATISFIABLE': 'UNSAT', 'UNKNOWN': 'UNKNOWN'}
+    for line in output.splitlines():
+        if line.startswith('RESULT:'):
+            actual_result = line[len('RESULT:'):].strip()
+        elif line.startswith('ASSIGNMENT:'):
+            model = []
+            for token in line[len('ASSIGNMENT:'):].split():
+                var, _, value = token.partition('=')
+                model.append(int(var) if value == '1' else -int(var))
+        elif line.startswith('s '):
+            actual_result = competition_words.get(line[2:].strip())
+        elif line.startswith('v '):
+            model = model or []
+            model.extend(int(token) for token in line[2:].split() if token != '0')
+        elif line.startswith('{'):
+            report = json.loads(line)
+            if 'result' in report:
+                actual_result = report['result']
+                model = report.get('model')
+    return actual_result, model
+
+
+def model_status(file_path, model, status, actual_result, arena=None, num_clauses=None):
+    """Checks the model of a SAT answer against the clauses of the cnf file.
+
+    Parameters:
+      file_path: Path to the cnf file
+      model: The model as DIMACS literals, None if the solver did not print one
+      status: Status of the instance so far
+      actual_result: Result the solver gave
+      arena: The parsed ClauseArena if already available, otherwise the file is parsed
+      num_clauses: Number of original clauses in arena, see verify_model
+
+    Returns:
+      The status, 'bad_model' if a SAT answer has no model or a model that falsifies a clause
+    """
+    if status != 'solved' or actual_result != 'SAT':
+        return status
+    if model is None:
+        return 'bad_model'
+    if arena is None:
+        arena, _ = parse_dimacs_file(file_path)
+    return 'solved' if verify_model(arena, model, num_clauses) is None else 'bad_model'
+
+
+def proof_status(file_path, proof_path, status, actual_result):
+    """Checks the DRAT proof of an UNSAT answer and deletes the proof file.
+
+    Parameters:
+      file_path: Path to the cnf file
+      proof_path: Path to the proof written by the solver, or None if not checking proofs
+      status: Status of the instance so far
+      actual_result: Result the solver gave
+
+    Returns:
+      The status, 'bad_proof' if a correct UNSAT answer has no valid proof
+    """
+    if proof_path is None:
+        return status
+    try:
+        if status == 'solved' and actual_result == 'UNSAT':
+            verified, _ = check_proof_file(file_path, proof_path)
+            if not verified:
+                status = 'bad_proof'
+    except (ValueError, IndexError):
+        status = 'bad_proof'  # Truncated or malformed proof file
+    finally:
+        os.remove(proof_path)
+    return status
+
+
+def solve_in_process(solver_args, folder, file_path, expected, timeout, check_proofs=False, verify=True):
+    """Solves one cnf file with the Solver class inside the pool worker and classifies
+    the outcome. The timeout is a time Budget of the search, with a real-time
+    interval timer as a backstop that also covers parsing.
+
+    Parameters:
+      solver_args: Solver command line arguments, --heuristic and --restart are used
+      folder: Folder the file was collected from
+      file_path: Path to the cnf file
+      expected: Expected result ('SAT', 'UNSAT' or None)
+      timeout: Wall-time limit in seconds
+      check_proofs: If True, an UNSAT answer is only solved if its DRAT proof checks
+      verify: If True, a SAT answer is only solved if its model satisfies the formula
+
+    Returns:
+      Dictionary with the instance's folder, file, expected and actual result, status and time
+    """
+    option_parser = argparse.ArgumentParser(add_help=False)
+    option_parser.add_argument('--heuristic', default='mom')
+    option_parser.add_argument('--restart', default='luby')
+    option_parser.add_argument('--binary-proof', action='store_true')
+    options, _ = option_parser.parse_known_args(solver_args)
+
+    actual_result = None
+    arena = num_clauses = model = None
+    proof_path = new_proof_path() if check_proofs else None
+    proof = None
+    start = time.perf_counter()
+    signal.signal(signal.SIGALRM, raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout + 1.0)
+    try:
+        arena, num_vars = parse_dimacs_file(file_path)
+        num_clauses = len(arena)
+        if proof_path is not None:
+            proof = DratWriter(proof_path, binary=options.binary_proof)
+        solver = Solver(num_vars, arena, options.heuristic, options.restart, proof=proof)
+        remaining = timeout - (time.perf_counter() - start)
+        result = solver.solve(budget=Budget(time_limit=max(remaining, 0.0)))
+        if result is None:
+            raise TimeoutError
+        actual_result = 'SAT' if result else 'UNSAT'
+        model = solver.model()
+        status = 'wrong' if expected is not None and actual_result != expected else 'solved'
+    except TimeoutError:
+        status = 'timeout'
+    except MemoryError:
+        status = 'memout'
+    except Exception:
+        status = 'error'
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    file_time = time.perf_counter() - start
+    if status == 'timeout' or file_time > timeout:
+        status, file_time = 'timeout', timeout  # The budget is only checked now and then
+    if proof is not None:
+        proof.close()
+    status = proof_status(file_path, proof_path, status, actual_result)
+    if verify:
+        status = model_status(file_path, model, status, actual_result, arena, num_clauses)
+    return {'folder': folder, 'file': str(file_path), 'expected': expected, 'result': actual_result,
+            'status': status, 'time': file_time}
+
+
+def run_instance(solver, solver_args, folder, file_path, expected, timeout, memory_limit_mb,
+                 check_proofs=False, verify=True):
+    """Solves one cnf file in a subprocess and classifies the outcome.
+
+    Parameters:
+      solver: Sat solver script
+      solver_args: Extra command line arguments for the solver
+      folder: Folder the file was collected from
+      file_path: Path to the cnf file
+      expected: Expected result ('SAT', 'UNSAT' or None)
+      timeout: Wall-time limit in seconds
+      memory_limit_mb: Memory limit in megabytes, or None
+      check_proofs: If True, the solver writes a DRAT proof (--proof) that is checked
+      after an UNSAT answer, outside of the measured time
+      verify: If True, the model of a SAT answer is checked against the cnf file
+
+    Returns:
+      Dictionary with the instance's folder, file, expected and actual result, status and time
+    """
+    cmd_input = [sys.executable, solver, str(file_path)] + solver_args
+    proof_path = new_proof_path() if check_proofs else None
+    if proof_path is not None:
+        cmd_input += ['--proof', proof_path]
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(cmd_input, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                text=True, timeout=timeout, preexec_fn=memory_limiter(memory_limit_mb),
+                                env=dict(os.environ, SAT_CACHE='off'))
+    except subprocess.TimeoutExpired:
+        proof_status(file_path, proof_path, 'timeout', None)
+        return {'folder': folder, 'file': str(file_path), 'expected': expected, 'result': None,
+                'status': 'timeout', 'time': timeout}
+    file_time = time.perf_counter() - start
+
+    try:
+        actual_result, model = parse_solver_output(result.stdout)
+    except ValueError:
+        actual_result, model = None, None  # Garbled output, reported as a failure
+
+    if actual_result == 'UNKNOWN':
+        status = 'timeout'  # The solver ran out of its own budget
+    elif result.returncode != 0 or actual_result not in ('SAT', 'UNSAT'):
+        status = 'memout' if 'MemoryError' in result.stderr else 'error'
+    elif expected is not None and actual_result != expected:
+        status = 'wrong'
+    else:
+        status = 'solved'
+    status = proof_status(file_path, proof_path, status, actual_result)
+    if verify:
+        status = model_status(file_path, model, status, actual_result)
+    return {'folder': folder, 'file': str(file_path), 'expected': expected, 'result': actual_result,
+            'status': status, 'time': file_time}
+
+
+def percentile(values, fraction):
+    """Computes a percentile by linear interpolation between the closest ranks.
+
+    Parameters:
+      values: List of numbers
+      fraction: Percentile as a fraction in [0, 1]
+
+    Returns:
+      The percentile, or None if values is empty
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(records, timeout):
+    """Aggregates instance records into runtime and failure statistics.
+
+    Parameters:
+      records: Instance records from run_instance
+      timeout: Wall-time limit in seconds, used for PAR-2
+
+    Returns:
+      Dictionary with counts, p50/p90/max of solved runtimes, PAR-2 and failure lists
+    """
+    solved_times = [r['time'] for r in records if r['status'] == 'solved']
+    par2 = [r['time'] if r['status'] == 'solved' else 2 * timeout for r in records]
+    failures = {status: sorted(r['file'] for r in records if r['status'] == status)
+                for status in ('wrong', 'bad_model', 'bad_proof', 'timeout', 'memout', 'error')}
+    return {
+        'cases': len(records),
+        'solved': len(solved_times),
+        'p50': percentile(solved_times, 0.5),
+        'p90': percentile(solved_times, 0.9),
+        'max': max(solved_times) if solved_times else None,
+        'min': min(solved_times) if solved_times else None,
+        'par2': sum(par2) / len(par2) if par2 else None,
+        'failures': failures,
+    }
+
+
+def print_summary(title, summary):
+    """Prints a human readable summary.
+
+    Parameters:
+      title: Heading for the summary
+      summary: Dictionary from summarize
+
+    Returns:
+      None
+    """
+    def seconds(value):
+        return 'n/a' if value is None else f'{value:.4f} seconds'
+
+    print(f'== {title} ==')
+    print(f"There were {summary['cases']} cases tested, {summary['solved']} solved correctly")
+    print(f"The p50 runtime was {seconds(summary['p50'])}")
+    print(f"The p90 runtime was {seconds(summary['p90'])}")
+    print(f"The highest runtime was {seconds(summary['max'])}")
+    print(f"The lowest runtime was {seconds(summary['min'])}")
+    print(f"The PAR-2 score was {seconds(summary['par2'])}")
+    failures = summary['failures']
+    if not any(failures.values()):
+        print('All cases produced correct output')
+    for status, label in (('wrong', 'Incorrect'), ('bad_model', 'Invalid model'),
+                          ('bad_proof', 'Unverified proof'), ('timeout', 'Timed out'),
+                          ('memout', 'Out of memory'), ('error', 'Failed')):
+        if failures[status]:
+            print(f'{label} cases at the following file paths:')
+            for test_file in failures[status]:
+                print(f' {test_file},')
+
+
+def write_csv(csv_path, records):
+    """Writes one row per instance to a CSV file.
+
+    Parameters:
+      csv_path: Output file path
+      records: Instance records from run_instance
+
+    Returns:
+      None
+    """
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file,
+                                fieldnames=['folder', 'file', 'expected', 'result', 'status', 'time'])
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def benchmark_parse(parse_path):
+    """Measures in-process parse time and throughput of a CNF file.
+
+    Parameters:
+      parse_path: Path to a .cnf/.cnf.gz/.cnf.xz/.cnf.bz2 file
+
+    Returns:
+      Dictionary with the file, its size, variable and clause counts, parse time and MB/s
+    """
+    parse_path = Path(parse_path)
+    parse_start = time.perf_counter()
+    parsed_clauses, parsed_vars = parse_dimacs_file(parse_path)
+    parse_time = time.perf_counter() - parse_start
+    file_mb = parse_path.stat().st_size / 1e6
+    return {'file': str(parse_path), 'mb': file_mb, 'variables': parsed_vars,
+            'clauses': len(parsed_clauses), 'time': parse_time, 'mb_per_s': file_mb / parse_time}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parallel SAT solver benchmark runner')
+    parser.add_argument('folders', nargs='*', default=default_folders,
+                        help='Folders of cnf files, optionally as FOLDER=SAT or FOLDER=UNSAT')
+    parser.add_argument('--solver', default=default_solver, help='Sat solver script to benchmark')
+    parser.add_argument('--solver-args', default='',
+                        help="Extra solver arguments, e.g. '--heuristic vsids'")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Number of instances solved in parallel')
+    parser.add_argument('--timeout', type=float, default=default_timeout, help='Seconds per instance')
+    parser.add_argument('--memory-limit', type=float, default=None, help='Megabytes per instance')
+    parser.add_argument('--json', dest='json_path', help='Write summary and instance results as JSON')
+    parser.add_argument('--csv', dest='csv_path', help='Write instance results as CSV')
+    parser.add_argument('--in-process', action='store_true',
+                        help='Call the Solver class in worker processes instead of starting the '
+                             'solver script')
+    parser.add_argument('--no-verify', dest='verify', action='store_false',
+                        help='Do not check the model of SAT answers against the cnf file')
+    parser.add_argument('--check-proofs', action='store_true',
+                        help='Verify the DRAT proof of every UNSAT answer with the checker of '
+                             'sat_proof.py')
+    parser.add_argument('--parse-benchmark', help='Also time the parser on this (large) CNF file')
+    args = parser.parse_args()
+
+    if args.memory_limit and resource is None:
+        print('[Warning] Memory limits are not supported on this platform and are ignored.')
+    try:
+        instances = collect_instances(args.folders)
+    except ValueError as error:
+        print(f'Error: {error}')
+        sys.exit(1)
+
+    # Solve all instances in parallel. By default each instance runs the solver script in its
+    # own subprocess, so timeouts and memory limits apply to that instance only and threads
+    # are enough to wait on them; in-process solving needs worker processes instead
+    solver_args = args.solver_args.split()
+    records = []
+    if args.in_process:
+        pool = ProcessPoolExecutor(max_workers=max(1, args.jobs), initializer=limit_worker_memory,
+                                   initargs=(args.memory_limit,))
+    else:
+        pool = ThreadPoolExecutor(max_workers=max(1, args.jobs))
+    with pool:
+        if args.in_process:
+            futures = [pool.submit(solve_in_process, solver_args, folder, file_path, expected,
+                                   args.timeout, args.check_proofs, args.verify)
+                       for folder, file_path, expected in instances]
+        else:
+            futures = [pool.submit(run_instance, args.solver, solver_args, folder, file_path, expected,
+                                   args.timeout, args.memory_limit, args.check_proofs, args.verify)
+                       for folder, file_path, expected in instances]
+        for future in as_completed(futures):
+            records.append(future.result())
+    records.sort(key=lambda record: (record['folder'], record['file']))
+
+    # Print summary per folder and overall
+    folder_summaries = {}
+    for folder in dict.fromkeys(folder for folder, _, _ in instances):
+        folder_summaries[folder] = summarize([r for r in records if r['folder'] == folder], args.timeout)
+        print_summary(folder, folder_summaries[folder])
+    overall = summarize(records, args.timeout)
+    if len(folder_summaries) > 1:
+        print_summary('Overall', overall)
 
+    # Measure parse time of a large CNF file
+    parse_stats = None
+    if args.parse_benchmark:
+        parse_stats = benchmark_parse(args.parse_benchmark)
+        print(f"Parsed {parse_stats['file']} ({parse_stats['mb']:.1f} MB on disk, "
+              f"{parse_stats['variables']} variables, {parse_stats['clauses']} clauses) "
+              f"in {parse_stats['time']:.3f} seconds")
+        print(f"The parse throughput was {parse_stats['mb_per_s']:.2f} MB/s")
 
-# Configurations
-test_folder = 'UUF50.218.1000'  # Change to folder with the files in cnf format used for testing
-correct_result = 'UNSAT'  # Change to SAT or UNSAT
-test_solver = 'sat_solver_h_MOM.py' # Change to the file name of the sat solver being tested and uncomment 
-# the runtime in the sat solver code at the bottom of the file
-
-
-# Initialization
-folder = Path(test_folder)
-track = 0
-runtimes = []
-min_time = float('inf')
-max_time = 0
-incorrect_cases = []
-
-# Loop through each test file and run the solver
-for file_path in folder.iterdir():
-    track += 1
-    if file_path.is_file():
-        cmd_input = ['python3', test_solver, file_path]
-        result = subprocess.run(cmd_input, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        sat_output = result.stdout
-
-        # Parse runtime from output 
-        if correct_result == 'SAT':
-            if len(result.stdout.split('\n')) != 4:
-                file_time = float(result.stdout.split('\n')[1].split(' ')[-2])
-                incorrect_cases.append(file_time)
-            else:
-                file_time = float(result.stdout.split('\n')[2].split(' ')[-2])
-        if correct_result == 'UNSAT':
-            if len(result.stdout.split('\n')) != 3:
-                file_time = float(result.stdout.split('\n')[2].split(' ')[-2])
-                incorrect_cases.append(file_time)
-            else:
-                file_time = float(result.stdout.split('\n')[1].split(' ')[-2])
-
-        runtimes.append(file_time)
-
-        # Check correctness of solver result
-        actual_result = result.stdout.split('\n')[0].split(' ')[-1]
-        if actual_result != 'RESULT:' + correct_result:
-            incorrect_cases.append(file_path)
-
-        # Update runtime statistics
-        max_time = max(max_time, file_time)
-        min_time = min(min_time, file_time)
-
-# Compute average runtime
-average_runtime = sum(runtimes) / len(runtimes)
-
-# Print summary
-print(f'There were {track} cases tested')
-print(f'The average_runtime was {average_runtime}')
-print(f'The highest runtime was {max_time}')
-print(f'The lowest runtime was {min_time}')
-
-if not incorrect_cases:
-    print('All cases produced correct output')
-else:
-    print('Incorrect cases at the following file paths:')
-    for test_idx in incorrect_cases:
-        print(f' {test_idx},')
+    if args.csv_path:
+        write_csv(args.csv_path, records)
+    if args.json_path:
+        report = {'solver': 'Solver (in-process)' if args.in_process else args.solver,
+                  'solver_args': solver_args, 'jobs': args.jobs,
+                  'timeout': args.timeout, 'memory_limit_mb': args.memory_limit,
+                  'folders': folder_summaries, 'overall': overall, 'parse': parse_stats,
+                  'instances': records}
+        with open(args.json_path, 'w') as json_file:
+            json.dump(report, json_file, indent=2)